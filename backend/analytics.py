@@ -0,0 +1,331 @@
+"""
+分析引擎：把楼盘明细加载为内存中的 NumPy 矩阵（楼盘 × 快照），各类分析用向量运算完成
+
+- 每行一个楼盘（同名楼盘的多条记录按快照求和），每列一次快照（默认每天一次，开启日内采样时一天可有多列），缺失为 NaN
+- save_record 成功后增量追加（或替换当天的）一列，不重新读库
+- 其他进程保存数据后（查询缓存代数变化）或超过有效期时整体重新加载
+- 按周/月的汇总（backend/rollups.py）随矩阵一起计算，追加快照时只重算最后一个桶；
+  全市历史记录（property_records）单独加载为一个两行的矩阵，同样维护汇总
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.rollups import PRECOMPUTED, RESOLUTIONS, Rollup
+
+# top_sellers 支持的排序字段
+RANK_KEYS = ('sold', 'speed', 'ratio')
+
+# 历史记录矩阵的两行（行名即记录中的字段）
+RECORD_FIELDS = ('available_units', 'total_projects')
+
+
+def _record_rows(records: List[Dict]) -> List[Dict]:
+    """把历史记录转换为明细的格式，每条记录对应 RECORD_FIELDS 两行"""
+    return [
+        {'property_name': field, 'timestamp': record['timestamp'], 'available_units': record.get(field) or 0}
+        for record in records for field in RECORD_FIELDS
+    ]
+
+
+class _Matrix:
+    """一份不可变的矩阵快照；更新时整体替换，查询中途不会被修改"""
+
+    __slots__ = ('names', 'index', 'timestamps', 'dates', 'seconds', 'units', 'rollups')
+
+    def __init__(self, names: List[str], timestamps: List[str], units: np.ndarray,
+                 rollups: Optional[Dict[str, Rollup]] = None):
+        self.names = names  # 行：楼盘名称（升序）
+        self.index = {name: i for i, name in enumerate(names)}
+        self.timestamps = timestamps  # 列：快照时间（升序）
+        self.dates = np.array([ts[:10] for ts in timestamps], dtype='<U10')
+        self.seconds = np.array([datetime.fromisoformat(ts).timestamp() for ts in timestamps], dtype=np.float64)
+        self.units = units  # (楼盘数, 快照数) 的 float64 矩阵
+        # 预先计算的按周/月汇总
+        self.rollups = rollups if rollups is not None else {
+            resolution: Rollup.build(units, self.dates, resolution) for resolution in PRECOMPUTED
+        }
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict]) -> '_Matrix':
+        """rows 为 select_details 的结果（property_name, timestamp, available_units）"""
+        names = sorted({row['property_name'] for row in rows})
+        timestamps = sorted({row['timestamp'] for row in rows})
+        name_index = {name: i for i, name in enumerate(names)}
+        column_index = {ts: j for j, ts in enumerate(timestamps)}
+
+        rows_idx = np.fromiter((name_index[row['property_name']] for row in rows), dtype=np.intp, count=len(rows))
+        cols_idx = np.fromiter((column_index[row['timestamp']] for row in rows), dtype=np.intp, count=len(rows))
+        values = np.fromiter((row['available_units'] for row in rows), dtype=np.float64, count=len(rows))
+
+        units = np.zeros((len(names), len(timestamps)), dtype=np.float64)
+        seen = np.zeros(units.shape, dtype=bool)
+        np.add.at(units, (rows_idx, cols_idx), values)
+        seen[rows_idx, cols_idx] = True
+        units[~seen] = np.nan
+        return cls(names, timestamps, units)
+
+    def with_snapshot(self, timestamp: str, detail_rows: List[Dict], replace_day: bool = True) -> '_Matrix':
+        """返回追加了一次快照的新矩阵；replace_day 时同一天已有的列被替换（与 save_record 一致）"""
+        keep = self.dates != timestamp[:10] if replace_day else np.ones(len(self.timestamps), dtype=bool)
+        timestamps = [ts for ts, kept in zip(self.timestamps, keep) if kept] + [timestamp]
+
+        column = {}
+        for row in detail_rows:
+            column[row['property_name']] = column.get(row['property_name'], 0) + row['available_units']
+        new_names = sorted(set(column) - set(self.index))
+        names = self.names + new_names
+        if new_names:
+            # 新楼盘追加在末尾后重新按名称排序
+            order = sorted(range(len(names)), key=names.__getitem__)
+            names = [names[i] for i in order]
+        else:
+            order = None
+
+        units = np.full((len(names), len(timestamps)), np.nan, dtype=np.float64)
+        units[:len(self.names), :-1] = self.units[:, keep]
+        for offset, name in enumerate(new_names):
+            units[len(self.names) + offset, -1] = column[name]
+        for name, value in column.items():
+            if name in self.index:
+                units[self.index[name], -1] = value
+        if order is not None:
+            units = units[order]
+        # 被替换掉的当天快照中独有的楼盘不再有任何数据
+        present = ~np.isnan(units).all(axis=1)
+        if not present.all():
+            names = [name for name, kept in zip(names, present) if kept]
+            units = units[present]
+        matrix = _Matrix(names, timestamps, units, rollups={})
+        # 之前的桶不变，只重算最后一个桶
+        row_map = np.fromiter((self.index.get(name, -1) for name in names), dtype=np.intp, count=len(names))
+        matrix.rollups = {
+            resolution: rollup.extend(units, matrix.dates, row_map) for resolution, rollup in self.rollups.items()
+        }
+        return matrix
+
+    def columns(self, start: Optional[str], end: Optional[str]) -> slice:
+        """日期闭区间 [start, end]（YYYY-MM-DD，None 表示不限）对应的列范围"""
+        lo = int(np.searchsorted(self.dates, start, side='left')) if start else 0
+        hi = int(np.searchsorted(self.dates, end, side='right')) if end else len(self.timestamps)
+        return slice(lo, hi)
+
+
+def _first_last(block: np.ndarray):
+    """每行第一个和最后一个非 NaN 值所在的列号，以及该行是否有值"""
+    valid = ~np.isnan(block)
+    has = valid.any(axis=1)
+    first = valid.argmax(axis=1)
+    last = block.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    return first, last, has
+
+
+def _to_int(value) -> Optional[int]:
+    return None if value is None or math.isnan(value) else int(value)
+
+
+class AnalyticsEngine:
+    """线程安全的内存分析引擎，首次查询时加载"""
+
+    def __init__(self, load_rows: Callable[[], List[Dict]], generation: Callable[[], object], ttl: float = 600,
+                 load_records: Optional[Callable[[], List[Dict]]] = None):
+        self.load_rows = load_rows  # 读取全部楼盘明细，如 storage.select_details
+        self.load_records = load_records  # 读取全部历史记录，如 storage.select_records（全市历史的汇总使用）
+        self.generation = generation  # 读取共享代数，如 cache.current_generation
+        self.ttl = ttl
+        self._matrix: Optional[_Matrix] = None
+        self._generation = None
+        self._loaded_at = 0.0
+        self._records: Optional[_Matrix] = None
+        self._records_generation = None
+        self._records_loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self, matrix: Optional[_Matrix], loaded_generation, loaded_at: float, generation) -> bool:
+        return (matrix is None or generation != loaded_generation
+                or time.monotonic() - loaded_at > self.ttl)
+
+    def _current(self) -> _Matrix:
+        with self._lock:
+            generation = self.generation()
+            if self._expired(self._matrix, self._generation, self._loaded_at, generation):
+                started = time.perf_counter()
+                self._matrix = _Matrix.from_rows(self.load_rows())
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+                print(f"分析引擎已加载: {len(self._matrix.names)} 个楼盘 × {len(self._matrix.timestamps)} 次快照，"
+                      f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+            return self._matrix
+
+    def _current_records(self) -> _Matrix:
+        with self._lock:
+            generation = self.generation()
+            if self._expired(self._records, self._records_generation, self._records_loaded_at, generation):
+                self._records = _Matrix.from_rows(_record_rows(self.load_records()))
+                self._records_generation = generation
+                self._records_loaded_at = time.monotonic()
+            return self._records
+
+    def apply_snapshot(self, timestamp: str, detail_rows: List[Dict], replace_day: bool = True,
+                       record: Optional[Dict] = None):
+        """save_record 成功后增量更新（尚未加载时什么都不做，下次查询再加载）；record 为同时保存的历史记录"""
+        with self._lock:
+            generation = self.generation()
+            matrix = self._matrix
+            if matrix is not None:
+                if matrix.timestamps and timestamp < matrix.timestamps[-1]:
+                    # 不是最新的快照，交给下次查询整体重新加载
+                    self._matrix = None
+                else:
+                    self._matrix = matrix.with_snapshot(timestamp, detail_rows, replace_day)
+                    self._generation = generation
+            records = self._records
+            if records is not None:
+                if record is None or (records.timestamps and timestamp < records.timestamps[-1]):
+                    self._records = None
+                else:
+                    self._records = records.with_snapshot(timestamp, _record_rows([record]), replace_day)
+                    self._records_generation = generation
+
+    def mark_stale(self):
+        with self._lock:
+            self._matrix = None
+            self._records = None
+
+    def totals(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """日期范围内每次快照的全市待售总数、楼盘数及与上一次快照相比的变化"""
+        matrix = self._current()
+        columns = matrix.columns(start, end)
+        totals = np.nansum(matrix.units, axis=0)
+        projects = (~np.isnan(matrix.units)).sum(axis=0)
+        change = np.concatenate(([np.nan], np.diff(totals)))
+        return [
+            {
+                'date': matrix.dates[j],
+                'timestamp': matrix.timestamps[j],
+                'available_units': int(totals[j]),
+                'projects': int(projects[j]),
+                'change': _to_int(change[j])
+            }
+            for j in range(columns.start, columns.stop)
+        ]
+
+    def _deltas(self, matrix: _Matrix, start: Optional[str], end: Optional[str]):
+        """每个楼盘在区间内首末两次记录的套数、卖出量、天数、速度和卖出比例（向量）"""
+        columns = matrix.columns(start, end)
+        block = matrix.units[:, columns]
+        if block.shape[1] == 0:
+            return None
+        first, last, has = _first_last(block)
+        rows = np.arange(block.shape[0])
+        start_units = block[rows, first]
+        end_units = block[rows, last]
+        seconds = matrix.seconds[columns]
+        # 与卖出速度排名一致：天数向上取整，至少 1 天；速度四舍五入取整
+        days = np.maximum(1, np.ceil((seconds[last] - seconds[first]) / 86400))
+        sold = start_units - end_units
+        speed = np.floor(sold / days + 0.5)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(start_units > 0, sold / start_units, 0.0)
+        valid = has & (last > first)
+        return {
+            'start_units': start_units, 'end_units': end_units, 'sold': sold,
+            'days': days, 'speed': speed, 'ratio': ratio, 'valid': valid
+        }
+
+    @staticmethod
+    def _delta_item(matrix: _Matrix, deltas: Dict, i: int) -> Dict:
+        return {
+            'name': matrix.names[i],
+            'start_units': int(deltas['start_units'][i]),
+            'end_units': int(deltas['end_units'][i]),
+            'sold': int(deltas['sold'][i]),
+            'days': int(deltas['days'][i]),
+            'speed': int(deltas['speed'][i]),
+            'ratio': round(float(deltas['ratio'][i]), 4)
+        }
+
+    def deltas(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+        """区间内至少有两次记录的楼盘的套数变化（按楼盘名称排序）"""
+        matrix = self._current()
+        deltas = self._deltas(matrix, start, end)
+        if deltas is None:
+            return []
+        return [self._delta_item(matrix, deltas, i) for i in np.flatnonzero(deltas['valid'])]
+
+    def top_sellers(self, start: Optional[str] = None, end: Optional[str] = None,
+                    limit: int = 25, by: str = 'sold') -> List[Dict]:
+        """区间内卖出最多（by=sold）、最快（speed）或卖出比例最高（ratio）的前 limit 个楼盘"""
+        if by not in RANK_KEYS:
+            raise ValueError(f"未知的排序字段: {by}（可选 {' / '.join(RANK_KEYS)}）")
+        matrix = self._current()
+        deltas = self._deltas(matrix, start, end)
+        if deltas is None:
+            return []
+        candidates = np.flatnonzero(deltas['valid'] & (deltas['sold'] > 0))
+        # 稳定排序，同值时按名称排列
+        order = candidates[np.argsort(-deltas[by][candidates], kind='stable')][:limit]
+        return [self._delta_item(matrix, deltas, i) for i in order]
+
+    def velocity(self, name: Optional[str] = None, start: Optional[str] = None,
+                 end: Optional[str] = None, window: int = 7) -> Optional[List[Dict]]:
+        """滚动去化速度：每次快照相对 window 天前（窗口内最早一次快照）的每天卖出套数
+
+        name 为 None 时按全市总数计算；楼盘不存在时返回 None。
+        """
+        matrix = self._current()
+        if name is None:
+            series = np.nansum(matrix.units, axis=0)
+            series[(np.isnan(matrix.units)).all(axis=0)] = np.nan
+        else:
+            i = matrix.index.get(name)
+            if i is None:
+                return None
+            series = matrix.units[i]
+
+        columns = matrix.columns(start, end)
+        seconds = matrix.seconds
+        # 每列对应窗口起点：时间不早于 (当前时间 - window 天) 的第一列
+        base = np.searchsorted(seconds, seconds - timedelta(days=window).total_seconds(), side='left')
+        days = np.maximum(1, np.ceil((seconds - seconds[base]) / 86400))
+        velocity = (series[base] - series) / days
+        velocity[base == np.arange(len(seconds))] = np.nan  # 窗口内没有更早的快照
+        return [
+            {
+                'date': matrix.dates[j],
+                'available_units': _to_int(series[j]),
+                'velocity': None if math.isnan(velocity[j]) else round(float(velocity[j]), 2)
+            }
+            for j in range(columns.start, columns.stop)
+        ]
+
+    def rollup(self, name: Optional[str], resolution: str) -> Optional[List[Dict]]:
+        """按天/周/月汇总的历史曲线：每个桶最后一次的待售套数、最小值、最大值、变化量和快照数
+
+        name 为 None 时为全市历史记录（每个桶另附最后一次的 total_projects），
+        否则为该楼盘（同名楼盘按快照求和）；楼盘不存在时返回 None。
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"未知的分辨率: {resolution}（可选 {' / '.join(RESOLUTIONS)}）")
+        if name is None:
+            matrix = self._current_records()
+            if not matrix.names:
+                return []
+            rows = [matrix.index[field] for field in RECORD_FIELDS]
+        else:
+            matrix = self._current()
+            if name not in matrix.index:
+                return None
+            rows = [matrix.index[name]]
+
+        rollup = matrix.rollups.get(resolution)
+        if rollup is None:
+            # 按天的汇总不预先计算，只为需要的行计算
+            rollup = Rollup.build(matrix.units[rows], matrix.dates, resolution)
+            rows = list(range(len(rows)))
+        extra = {'total_projects': rows[1]} if name is None else None
+        return rollup.row(rows[0], matrix.timestamps, extra)
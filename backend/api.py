@@ -1,45 +1,160 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
 import os
 import threading
+import time
 import urllib.parse
 from datetime import datetime
-from typing import Dict
-from backend.database import Database
-from backend.scraper import PropertyScraper
+from backend import metrics, profiling
+from backend.database import Database, next_cursor, parse_cursor
+from backend.events import format_sse
+from backend.http_cache import HttpCache
+from backend.jobs import create_registry, job_status
+from backend.publish import SnapshotPublisher
 
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
 CORS(app)
 
+# 不连接数据库：SQLite 首次打开连接时建表，Supabase 首次查询时创建客户端，表结构验证见 /health?deep=1
 db = Database()
-scraper = PropertyScraper()
-
-# 用于跟踪刷新任务状态
-refresh_lock = threading.Lock()
-refresh_status = {
-    'is_running': False,
-    'start_time': None,
-    'end_time': None,
-    'error': None,
-    'result': None,  # {'projects': int, 'units': int}
-    'current_step': None,  # 当前步骤描述
-    'logs': []  # 日志信息
-}
+
+# 每次刷新后发布的静态数据，读接口优先直接返回这些文件
+publisher = SnapshotPublisher()
+
+# 按需性能剖析（PROFILE_REQUESTS / PROFILE_TOKEN），先于响应压缩注册，使总耗时包含压缩
+profiling.init_app(app)
+
+# 读接口的 ETag/304、Cache-Control 和响应压缩，验证器取自已发布的版本（未发布时取自最新快照）
+http_cache = HttpCache(lambda: publisher.version() or db.get_latest_record())
+http_cache.init_app(app)
+
+# 每个请求的耗时（Prometheus 指标，见 /metrics）
+metrics.init_app(app)
+
+# 刷新任务登记表和队列：所有进程共享任务状态和进度事件（步骤、分页进度、日志），保证同一时间只有一个刷新
+jobs = create_registry(db)
+# 刷新任务的执行方式：worker（只入队，由 backend/worker.py 执行）、inline（在 Web 进程的线程中执行）
+# 或 auto（默认，有在线的后台 worker 时交给 worker，否则 inline）
+REFRESH_EXECUTOR = os.environ.get('REFRESH_EXECUTOR', 'auto')
+WORKER_STALE_AFTER = float(os.environ.get('WORKER_STALE_AFTER', 60))  # worker 心跳超时秒数
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))  # 没有事件时发送心跳的间隔（秒）
+SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', 25))  # 单个连接的最长时间，之后由客户端续传
+SSE_RECONNECT_MS = 1000  # 连接到期后浏览器重连前等待的毫秒数
+# 每个事件流连接占用一个 gthread 线程：限制每个 worker 同时打开的连接数，超出时返回 503 让客户端改为轮询
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 2))
+sse_slots = threading.BoundedSemaphore(max(1, SSE_MAX_STREAMS))
 
 @app.route('/')
 def index():
     """返回前端页面"""
     return send_from_directory(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'frontend'), 'index.html')
 
+def _published_response(section, key):
+    """已发布的静态文件（客户端支持 gzip 时返回预压缩版本），未发布时返回 None"""
+    path = publisher.artifact_path(section, key)
+    if path is None:
+        return None
+    try:
+        if request.accept_encodings['gzip'] and os.path.exists(path + '.gz'):
+            with open(path + '.gz', 'rb') as f:
+                response = Response(f.read(), mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            with open(path, 'rb') as f:
+                response = Response(f.read(), mimetype='application/json')
+        return response
+    except OSError as e:
+        # 文件可能刚被清理掉，改为查询数据库
+        print(f"读取静态数据失败: {e}")
+        return None
+
+def _series_params():
+    """历史曲线可选的 resolution（day/week/month）和 max_points 参数，返回 (resolution, max_points, 错误响应)"""
+    resolution = request.args.get('resolution') or None
+    max_points = request.args.get('max_points')
+    if resolution not in (None, 'day', 'week', 'month'):
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'resolution 应为 day / week / month'
+        }), 400)
+    if max_points is not None:
+        if not max_points.isdigit() or int(max_points) < 3:
+            return None, None, (jsonify({
+                'success': False,
+                'error': 'max_points 应为不小于 3 的整数'
+            }), 400)
+        max_points = int(max_points)
+    return resolution, max_points, None
+
+def _page_params():
+    """历史接口可选的分页参数 limit（每页条数）和 cursor（上一页返回的 next_cursor），返回 (limit, cursor, 错误响应)"""
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor') or None
+    try:
+        if limit is not None:
+            if not limit.isdigit() or int(limit) <= 0:
+                raise ValueError(limit)
+            limit = int(limit)
+        if cursor:
+            parse_cursor(cursor)
+    except ValueError:
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'limit 应为正整数，cursor 应为上一页返回的 next_cursor'
+        }), 400)
+    return limit, cursor, None
+
+def _history_params():
+    """历史接口的全部可选参数，返回 (参数字典, 错误响应)；参数字典为空时返回完整历史（可直接使用已发布的文件）"""
+    resolution, max_points, error = _series_params()
+    if error:
+        return None, error
+    start_date, end_date, error = _analytics_date_range()
+    if error:
+        return None, error
+    limit, cursor, error = _page_params()
+    if error:
+        return None, error
+    if (resolution or max_points) and (limit or cursor):
+        return None, (jsonify({
+            'success': False,
+            'error': 'limit/cursor 不能与 resolution/max_points 同时使用'
+        }), 400)
+    params = {'resolution': resolution, 'max_points': max_points, 'start': start_date, 'end': end_date,
+              'limit': limit, 'cursor': cursor}
+    return {key: value for key, value in params.items() if value is not None}, None
+
+def _history_response(data, params):
+    """分页时附带 next_cursor（没有更多数据时为 null）"""
+    payload = {
+        'success': True,
+        'data': data
+    }
+    if 'limit' in params:
+        payload['next_cursor'] = next_cursor(data, params['limit'], params.get('cursor'))
+    return jsonify(payload)
+
 @app.route('/api/records', methods=['GET'])
+@http_cache.conditional
 def get_records():
-    """获取所有历史记录"""
+    """获取所有历史记录
+
+    可选参数：start/end（YYYY-MM-DD，闭区间），limit/cursor（分页），
+    resolution=day|week|month（按桶汇总）和 max_points（降采样到最多 N 个点）。
+    """
+    params, error = _history_params()
+    if error:
+        return error
+    if not params:
+        published = _published_response('files', '/records')
+        if published is not None:
+            return published
     try:
-        records = db.get_all_records()
-        return jsonify({
-            'success': True,
-            'data': records
-        })
+        if 'resolution' in params or 'max_points' in params:
+            records = db.get_records_series(**params)
+        else:
+            records = db.get_all_records(**params)
+        return _history_response(records, params)
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -51,10 +166,16 @@ def get_records():
         }), 500
 
 @app.route('/api/latest', methods=['GET'])
+@http_cache.conditional
 def get_latest():
-    """获取最新记录"""
+    """获取最新记录（?include=details 时附带完整快照内容）"""
+    include = {part.strip() for part in request.args.get('include', '').split(',')}
+    if 'details' not in include:
+        published = _published_response('files', '/latest')
+        if published is not None:
+            return published
     try:
-        record = db.get_latest_record()
+        record = db.get_latest_record(include_details='details' in include)
         return jsonify({
             'success': True,
             'data': record
@@ -70,8 +191,12 @@ def get_latest():
         }), 500
 
 @app.route('/api/properties', methods=['GET'])
+@http_cache.conditional
 def get_properties():
     """获取所有楼盘列表"""
+    published = _published_response('files', '/properties')
+    if published is not None:
+        return published
     try:
         properties = db.get_property_list()
         return jsonify({
@@ -88,17 +213,48 @@ def get_properties():
             'error': f'获取数据失败: {error_msg}'
         }), 500
 
-@app.route('/api/property/<path:property_name>', methods=['GET'])
-def get_property_history(property_name):
-    """获取指定楼盘的历史数据"""
+@app.route('/api/projects', methods=['GET'])
+@http_cache.conditional
+def get_projects():
+    """获取楼盘维度数据（首次/最近出现时间、最新待售套数）"""
+    published = _published_response('files', '/projects')
+    if published is not None:
+        return published
     try:
-        # Flask 会自动解码 URL，但为了安全再次解码
-        property_name = urllib.parse.unquote(property_name)
-        history = db.get_property_history(property_name)
+        projects = db.get_projects()
         return jsonify({
             'success': True,
-            'data': history
+            'data': projects
         })
+    except Exception as e:
+        import traceback
+        error_msg = str(e)
+        print(f"获取楼盘维度数据失败: {error_msg}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {error_msg}'
+        }), 500
+
+@app.route('/api/property/<path:property_name>', methods=['GET'])
+@http_cache.conditional
+def get_property_history(property_name):
+    """获取指定楼盘的历史数据（可选参数同 /api/records）"""
+    # Flask 会自动解码 URL，但为了安全再次解码
+    property_name = urllib.parse.unquote(property_name)
+    params, error = _history_params()
+    if error:
+        return error
+    if not params:
+        published = _published_response('history', property_name)
+        if published is not None:
+            return published
+    try:
+        if 'resolution' in params or 'max_points' in params:
+            history = db.get_property_series(property_name, **params)
+        else:
+            history = db.get_property_history(property_name, **params)
+        return _history_response(history, params)
     except Exception as e:
         import traceback
         error_msg = str(e)
@@ -110,8 +266,12 @@ def get_property_history(property_name):
         }), 500
 
 @app.route('/api/properties/latest', methods=['GET'])
+@http_cache.conditional
 def get_latest_properties():
     """获取最新的所有楼盘数据"""
+    published = _published_response('files', '/properties/latest')
+    if published is not None:
+        return published
     try:
         properties = db.get_latest_properties()
         return jsonify({
@@ -128,218 +288,405 @@ def get_latest_properties():
             'error': f'获取数据失败: {error_msg}'
         }), 500
 
-def _add_log(message):
-    """添加日志到状态"""
-    global refresh_status
-    timestamp = datetime.now().isoformat()
-    log_entry = f"[{timestamp}] {message}"
-    print(log_entry)
-    with refresh_lock:
-        refresh_status['logs'].append(log_entry)
-        # 只保留最近50条日志
-        if len(refresh_status['logs']) > 50:
-            refresh_status['logs'] = refresh_status['logs'][-50:]
-
-def _update_step(step):
-    """更新当前步骤"""
-    global refresh_status
-    with refresh_lock:
-        refresh_status['current_step'] = step
-    _add_log(f"步骤: {step}")
-
-def _refresh_task():
-    """后台执行数据刷新任务"""
-    global refresh_status
+@app.route('/api/properties/history', methods=['GET', 'POST'])
+@http_cache.conditional
+def get_properties_history():
+    """批量获取多个楼盘的历史数据
+
+    GET:  ?name=A&name=B 或 ?names=all，可选 &format=columnar
+    POST: {"names": ["A", "B"] 或 "all", "format": "columnar"}
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        names = body.get('names')
+        layout = body.get('format', 'rows')
+    else:
+        names = request.args.getlist('name') or request.args.get('names')
+        layout = request.args.get('format', 'rows')
+
+    if names == 'all':
+        names = None
+    elif not names or not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        return jsonify({
+            'success': False,
+            'error': '请提供楼盘名称列表 (name) 或 names=all'
+        }), 400
+    if layout not in ('rows', 'columnar'):
+        return jsonify({
+            'success': False,
+            'error': 'format 只能是 rows 或 columnar'
+        }), 400
+
     try:
-        start_time = datetime.now().isoformat()
-        with refresh_lock:
-            refresh_status['is_running'] = True
-            refresh_status['start_time'] = start_time
-            refresh_status['end_time'] = None
-            refresh_status['error'] = None
-            refresh_status['result'] = None
-            refresh_status['current_step'] = '初始化任务'
-            refresh_status['logs'] = []
-        
-        _add_log("开始后台刷新数据...")
-        _update_step("正在抓取数据...")
-        
-        # 创建一个带回调的 scraper 来更新状态
-        class StatusScraper(PropertyScraper):
-            def fetch_page(self, start: int):
-                _update_step(f"正在请求数据 (第 {start} 页)...")
-                _add_log(f"开始请求第 {start} 页数据...")
-                try:
-                    result = super().fetch_page(start)
-                    if result:
-                        _add_log(f"数据请求成功 (第 {start} 页)")
-                    else:
-                        _add_log(f"数据请求失败 (第 {start} 页): 返回 None")
-                    return result
-                except Exception as e:
-                    _add_log(f"数据请求异常 (第 {start} 页): {str(e)}")
-                    raise
-            
-            def parse_properties(self, data: Dict):
-                _update_step("正在解析数据...")
-                _add_log("开始解析楼盘数据...")
-                try:
-                    result = super().parse_properties(data)
-                    if result:
-                        _add_log(f"数据解析成功: 找到 {len(result)} 个楼盘")
-                    else:
-                        _add_log("数据解析失败: 未找到楼盘数据")
-                    return result
-                except Exception as e:
-                    _add_log(f"数据解析异常: {str(e)}")
-                    raise
-            
-            def fetch_all_properties(self):
-                _add_log("开始执行 fetch_all_properties...")
-                try:
-                    result = super().fetch_all_properties()
-                    if result:
-                        _add_log(f"fetch_all_properties 成功: {result.get('total_projects', 0)} 个项目")
-                    else:
-                        _add_log("fetch_all_properties 失败: 返回 None")
-                    return result
-                except Exception as e:
-                    _add_log(f"fetch_all_properties 异常: {str(e)}")
-                    raise
-        
-        status_scraper = StatusScraper()
-        result = status_scraper.fetch_all_properties()
-        
-        if not result:
-            end_time = datetime.now().isoformat()
-            error_msg = '数据抓取失败，未返回有效数据'
-            with refresh_lock:
-                refresh_status['is_running'] = False
-                refresh_status['end_time'] = end_time
-                refresh_status['error'] = error_msg
-                refresh_status['current_step'] = '数据抓取失败'
-            _add_log(error_msg)
-            return
-        
-        units = result['total_available_units']
-        projects = result['total_projects']
-        
-        _add_log(f"数据抓取成功: {projects} 个项目，共 {units} 套")
-        _update_step(f"正在保存数据 ({projects} 个项目，{units} 套)...")
-        
-        # 保存数据到数据库
-        _add_log("开始保存数据到数据库...")
-        success = db.save_record(units, projects, result)
-        
-        end_time = datetime.now().isoformat()
-        
-        if success:
-            # 验证数据是否真的保存成功
-            latest = db.get_latest_record()
-            if latest and latest.get('available_units') == units:
-                with refresh_lock:
-                    refresh_status['is_running'] = False
-                    refresh_status['end_time'] = end_time
-                    refresh_status['result'] = {
-                        'projects': projects,
-                        'units': units
-                    }
-                    refresh_status['current_step'] = '任务完成'
-                _add_log(f"数据保存成功并验证: {projects} 个项目，共 {units} 套")
-            else:
-                error_msg = f'数据保存验证失败: 保存了 {units} 套，但数据库最新记录是 {latest.get("available_units") if latest else "无"}'
-                with refresh_lock:
-                    refresh_status['is_running'] = False
-                    refresh_status['end_time'] = end_time
-                    refresh_status['error'] = error_msg
-                    refresh_status['current_step'] = '数据保存验证失败'
-                _add_log(error_msg)
-        else:
-            error_msg = '数据保存到数据库失败'
-            with refresh_lock:
-                refresh_status['is_running'] = False
-                refresh_status['end_time'] = end_time
-                refresh_status['error'] = error_msg
-                refresh_status['current_step'] = '数据保存失败'
-            _add_log(error_msg)
-            
+        series = db.get_properties_history(names, columnar=(layout == 'columnar'))
+        return jsonify({
+            'success': True,
+            'format': layout,
+            'data': series
+        })
     except Exception as e:
         import traceback
         error_msg = str(e)
-        end_time = datetime.now().isoformat()
-        
-        with refresh_lock:
-            refresh_status['is_running'] = False
-            refresh_status['end_time'] = end_time
-            refresh_status['error'] = error_msg
-            refresh_status['current_step'] = f'发生错误: {error_msg[:50]}'
-        
-        _add_log(f"刷新数据时发生错误: {error_msg}")
-        _add_log(f"错误详情: {traceback.format_exc()}")
+        print(f"批量获取楼盘历史数据失败: {error_msg}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {error_msg}'
+        }), 500
+
+@app.route('/api/ranking/speed', methods=['GET'])
+@http_cache.conditional
+def get_speed_ranking():
+    """获取指定日期范围内的卖出速度排名"""
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    if not start_date or not end_date:
+        return jsonify({
+            'success': False,
+            'error': '请提供 start 和 end 日期参数 (YYYY-MM-DD)'
+        }), 400
+    try:
+        datetime.strptime(start_date, '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '日期格式错误，应为 YYYY-MM-DD'
+        }), 400
+
+    published = _published_response('rankings', f'{start_date}_{end_date}')
+    if published is not None:
+        return published
+    try:
+        ranking = db.get_sales_speed_ranking(start_date, end_date)
+        return jsonify({
+            'success': True,
+            'data': ranking
+        })
+    except Exception as e:
+        import traceback
+        error_msg = str(e)
+        print(f"获取卖出速度排名失败: {error_msg}")
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {error_msg}'
+        }), 500
+
+def _analytics_date_range():
+    """读取分析接口和历史接口可选的 start/end 日期参数，返回 (start, end, 错误响应)"""
+    start_date = request.args.get('start') or None
+    end_date = request.args.get('end') or None
+    try:
+        for value in (start_date, end_date):
+            if value:
+                datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None, None, (jsonify({
+            'success': False,
+            'error': '日期格式错误，应为 YYYY-MM-DD'
+        }), 400)
+    return start_date, end_date, None
+
+def _analytics_error(e):
+    import traceback
+    error_msg = str(e)
+    print(f"分析查询失败: {error_msg}")
+    print(traceback.format_exc())
+    return jsonify({
+        'success': False,
+        'error': f'获取数据失败: {error_msg}'
+    }), 500
+
+@app.route('/api/analytics/totals', methods=['GET'])
+@http_cache.conditional
+def get_analytics_totals():
+    """日期范围内每次快照的全市待售总数及变化"""
+    start_date, end_date, error = _analytics_date_range()
+    if error:
+        return error
+    try:
+        return jsonify({
+            'success': True,
+            'data': db.analytics.totals(start_date, end_date)
+        })
+    except Exception as e:
+        return _analytics_error(e)
+
+@app.route('/api/analytics/deltas', methods=['GET'])
+@http_cache.conditional
+def get_analytics_deltas():
+    """日期范围内每个楼盘首末两次记录之间的套数变化"""
+    start_date, end_date, error = _analytics_date_range()
+    if error:
+        return error
+    try:
+        return jsonify({
+            'success': True,
+            'data': db.analytics.deltas(start_date, end_date)
+        })
+    except Exception as e:
+        return _analytics_error(e)
+
+@app.route('/api/analytics/top', methods=['GET'])
+@http_cache.conditional
+def get_analytics_top():
+    """日期范围内卖出最多/最快/比例最高的楼盘（by=sold|speed|ratio，limit 默认 25）"""
+    start_date, end_date, error = _analytics_date_range()
+    if error:
+        return error
+    by = request.args.get('by', 'sold')
+    limit = request.args.get('limit', 25, type=int)
+    if by not in ('sold', 'speed', 'ratio') or limit is None or limit <= 0:
+        return jsonify({
+            'success': False,
+            'error': 'by 应为 sold / speed / ratio，limit 应为正整数'
+        }), 400
+    try:
+        return jsonify({
+            'success': True,
+            'data': db.analytics.top_sellers(start_date, end_date, limit=limit, by=by)
+        })
+    except Exception as e:
+        return _analytics_error(e)
+
+@app.route('/api/analytics/velocity', methods=['GET'])
+@http_cache.conditional
+def get_analytics_velocity():
+    """滚动去化速度（name 为空时按全市总数，window 为窗口天数，默认 7）"""
+    start_date, end_date, error = _analytics_date_range()
+    if error:
+        return error
+    name = request.args.get('name') or None
+    window = request.args.get('window', 7, type=int)
+    if window is None or window <= 0:
+        return jsonify({
+            'success': False,
+            'error': 'window 应为正整数'
+        }), 400
+    try:
+        series = db.analytics.velocity(name, start_date, end_date, window=window)
+        if series is None:
+            return jsonify({
+                'success': False,
+                'error': f'未找到楼盘: {name}'
+            }), 404
+        return jsonify({
+            'success': True,
+            'data': series
+        })
+    except Exception as e:
+        return _analytics_error(e)
+
+def _run_inline(job_id):
+    """没有后台 worker 时在 Web 进程的线程中执行排队的任务"""
+    # 抓取相关的模块（requests、bs4）只在 Web 进程执行刷新时才导入
+    from backend.refresh import run_refresh_job
+    job = jobs.claim(job_id)
+    if job is not None:
+        run_refresh_job(job['id'], jobs, db, publisher)
+
+def _executor():
+    """本次入队的任务由谁执行：worker（后台 worker 进程）或 inline（当前 Web 进程）"""
+    if REFRESH_EXECUTOR in ('worker', 'inline'):
+        return REFRESH_EXECUTOR
+    return 'worker' if jobs.workers(WORKER_STALE_AFTER) else 'inline'
 
 @app.route('/api/refresh', methods=['GET'])
 def refresh_data():
-    """手动刷新数据（异步执行）"""
-    global refresh_status
+    """手动刷新数据：任务放入队列，由后台 worker 执行；已有任务排队或运行时合并到该任务"""
+    try:
+        job, created = jobs.enqueue('manual')
+        executor = _executor()
+    except Exception as e:
+        print(f"登记刷新任务失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'启动刷新任务失败: {e}'
+        }), 500
     
-    # 检查是否正在刷新
-    with refresh_lock:
-        if refresh_status['is_running']:
-            # 返回轻量级响应（不包含 logs）
-            light_status = {
-                'is_running': refresh_status['is_running'],
-                'start_time': refresh_status.get('start_time'),
-                'current_step': refresh_status.get('current_step')
-            }
-            return jsonify({
-                'success': False,
-                'error': '数据刷新任务正在进行中，请稍后再试',
-                'status': light_status
-            }), 429
-        
-        # 启动后台任务
-        thread = threading.Thread(target=_refresh_task, daemon=True)
+    # 新任务，或没有 worker 认领的排队任务，在没有后台 worker 时由本进程执行
+    if job['status'] == 'queued' and executor == 'inline':
+        thread = threading.Thread(target=_run_inline, args=(job['id'],), daemon=True)
         thread.start()
     
-    # 立即返回轻量级响应，避免超时和输出过大
-    # 不包含 logs 数组，减少响应大小
+    # 返回轻量级响应（不包含 logs），避免超时和输出过大
     light_status = {
-        'is_running': refresh_status['is_running'],
-        'start_time': refresh_status.get('start_time'),
-        'current_step': refresh_status.get('current_step')
+        'job_id': job['id'],
+        'state': job['status'],
+        'is_running': True,
+        'start_time': job['start_time'],
+        'current_step': job['current_step'],
+        'executor': executor
     }
+    if not created:
+        return jsonify({
+            'success': True,
+            'deduplicated': True,
+            'message': '数据刷新任务正在进行中，已合并到该任务',
+            'status': light_status
+        })
     return jsonify({
         'success': True,
-        'message': '数据刷新任务已启动，正在后台处理中',
+        'message': '数据刷新任务已加入队列，正在后台处理中',
         'status': light_status
     })
 
 @app.route('/api/refresh/status', methods=['GET'])
 def refresh_status_endpoint():
-    """获取刷新任务状态"""
-    global refresh_status
-    with refresh_lock:
+    """获取刷新任务状态（正在运行的任务，没有时为最近一次任务）"""
+    try:
         # 返回轻量级状态，不包含 logs
-        light_status = {
-            'is_running': refresh_status['is_running'],
-            'start_time': refresh_status.get('start_time'),
-            'end_time': refresh_status.get('end_time'),
-            'current_step': refresh_status.get('current_step'),
-            'error': refresh_status.get('error'),
-            'result': refresh_status.get('result')
-        }
         return jsonify({
             'success': True,
-            'status': light_status
+            'status': job_status(jobs.latest())
         })
+    except Exception as e:
+        print(f"获取刷新任务状态失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {e}'
+        }), 500
+
+@app.route('/api/refresh/jobs', methods=['GET'])
+def refresh_jobs():
+    """最近的刷新任务历史（触发方式、执行者、合并的触发次数、起止时间和耗时，limit 默认 20）"""
+    limit = request.args.get('limit', 20, type=int)
+    if limit is None or limit <= 0:
+        return jsonify({
+            'success': False,
+            'error': 'limit 应为正整数'
+        }), 400
+    try:
+        return jsonify({
+            'success': True,
+            'data': jobs.history(min(limit, 500))
+        })
+    except Exception as e:
+        print(f"获取刷新任务历史失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': f'获取数据失败: {e}'
+        }), 500
+
+@app.route('/api/refresh/events', methods=['GET'])
+def refresh_events_stream():
+    """以 Server-Sent Events 推送刷新进度：status / step / progress / log / done
+
+    事件来自任务登记表，连接到任意 worker 都能收到，支持 Last-Event-ID 续传。
+    没有正在运行的任务时发送当前状态后结束连接，客户端收到 done（或 is_running 为 false 的 status）后应关闭连接。
+    每个连接最长 SSE_MAX_DURATION 秒后结束，由浏览器续传；当前 worker 的连接数达到 SSE_MAX_STREAMS 时返回 503，
+    客户端应改为轮询 /api/refresh/status。
+    """
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({
+            'success': False,
+            'error': '事件流连接数已满，请轮询 /api/refresh/status'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(1, int(SSE_MAX_DURATION)))
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    def stream():
+        yield f'retry: {SSE_RECONNECT_MS}\n\n'
+        events, complete = jobs.since(last_event_id)
+        if complete:
+            last = last_event_id
+        else:
+            # 首次连接或续传点已失效：先发送完整状态（含最近日志）
+            last, snapshot = jobs.snapshot()
+            yield format_sse(last, 'status', snapshot)
+            if not snapshot['is_running']:
+                return
+            events = jobs.wait(last, timeout=0)
+
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        while True:
+            for event_id, event_type, data in events:
+                yield format_sse(event_id, event_type, data)
+                last = event_id
+                if event_type == 'done':
+                    return
+            if time.monotonic() >= deadline:
+                return
+            events = jobs.wait(last, timeout=SSE_HEARTBEAT)
+            if not events:
+                if not job_status(jobs.latest())['is_running'] and last >= jobs.last_id:
+                    return
+                yield ': keepalive\n\n'
+
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭反向代理缓冲
+    })
+    # 服务器关闭响应时（正常结束或客户端断开）释放连接名额
+    response.call_on_close(sse_slots.release)
+    return response
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """获取查询缓存命中统计（仅当前 worker）"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'data': db.cache.stats()
+    })
+
+@app.route('/api/admin/profile', methods=['GET'])
+def profile_report():
+    """本 worker 最慢的请求和存储查询（?reset=1 查看后清空）"""
+    if not profiling.authorized(request):
+        return jsonify({
+            'success': False,
+            'error': '未开启性能剖析或令牌不正确'
+        }), 403
+    data = {
+        'requests': profiling.slow_requests.items(),
+        'queries': profiling.slow_queries.items()
+    }
+    if request.args.get('reset') == '1':
+        profiling.slow_requests.clear()
+        profiling.slow_queries.clear()
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'data': data
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 指标（多个 gunicorn worker 时汇总 PROMETHEUS_MULTIPROC_DIR 中所有进程的指标）"""
+    output, content_type = metrics.render(jobs)
+    if output is None:
+        return jsonify({
+            'success': False,
+            'error': '未安装 prometheus_client，指标不可用'
+        }), 503
+    return Response(output, content_type=content_type)
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """健康检查端点，返回轻量级响应"""
+    """健康检查端点，返回轻量级响应；?deep=1 时验证数据库表结构（会连接数据库），失败时返回 503"""
+    if request.args.get('deep') != '1':
+        return jsonify({
+            'status': 'ok',
+            'service': 'zhuhaibay'
+        }), 200
+    try:
+        ok = db.init_db()
+    except Exception:
+        ok = False
     return jsonify({
-        'status': 'ok',
-        'service': 'zhuhaibay'
-    }), 200
+        'status': 'ok' if ok else 'error',
+        'service': 'zhuhaibay',
+        'database': dict(db.schema_status or {}, backend=db.storage.name)
+    }), 200 if ok else 503
 
 if __name__ == '__main__':
     import os
@@ -0,0 +1,222 @@
+"""
+查询缓存：Database 读接口的进程内 LRU + TTL 缓存
+
+数据每天只在 save_record 时变化一次，因此读接口可以放心缓存：
+- 每个条目带一个标签（如 'records'、'property:云玺花园'），save_record 按标签精确失效
+- 多个 gunicorn worker 之间通过共享的代数文件（generation）同步：
+  任一进程保存数据后更新该文件，其他进程发现代数变化时清空本地缓存
+- Web 服务和后台 worker 不在同一台主机上时看不到彼此的代数文件，
+  代数还包括定期从数据库读取的最新快照 id（generation_source），另一台主机保存数据后最多 sync_interval 秒生效
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from backend import metrics
+
+DEFAULT_GENERATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', '.cache_generation')
+
+
+class QueryCache:
+    """线程安全的有界 LRU 缓存，条目按 TTL 过期"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600, generation_path: Optional[str] = None,
+                 generation_source: Optional[Callable[[], Hashable]] = None, sync_interval: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation_path = generation_path
+        self.generation_source = generation_source
+        self.sync_interval = sync_interval
+        self._source_generation = None
+        self._source_checked_at = None
+        self._source_lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (tag, value, expires_at)
+        self._lock = threading.Lock()
+        self._generation = self._read_generation()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _read_generation(self):
+        """读取共享代数（文件的 inode + 修改时间，文件不存在时为 None），以及最近一次从数据库读取的代数"""
+        file_generation = None
+        if self.generation_path:
+            try:
+                st = os.stat(self.generation_path)
+                file_generation = (st.st_ino, st.st_mtime_ns)
+            except OSError:
+                pass
+        if self.generation_source is None:
+            return file_generation
+        return (file_generation, self._source_generation)
+
+    def _poll_source(self):
+        """每 sync_interval 秒从数据库读取一次代数（在缓存锁之外查询，失败时沿用上一次的值）"""
+        if self.generation_source is None:
+            return
+        now = time.monotonic()
+        if self._source_checked_at is not None and now - self._source_checked_at < self.sync_interval:
+            return
+        with self._source_lock:
+            if self._source_checked_at is not None and now - self._source_checked_at < self.sync_interval:
+                return
+            try:
+                self._source_generation = self.generation_source()
+            except Exception as e:
+                print(f"读取数据库代数失败: {e}")
+            self._source_checked_at = time.monotonic()
+
+    def current_generation(self):
+        """当前的共享代数（供缓存之外的进程内状态判断数据是否已被其他进程更新）"""
+        self._poll_source()
+        return self._read_generation()
+
+    def _sync_generation(self):
+        """其他进程保存过数据时清空本地缓存（调用方需持有锁）"""
+        generation = self._read_generation()
+        if generation != self._generation:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key: Hashable):
+        """返回 (命中与否, 值, 当前代数)"""
+        self._poll_source()
+        with self._lock:
+            self._sync_generation()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None, self._generation
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return False, None, self._generation
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1], self._generation
+
+    def set(self, key: Hashable, tag: str, value, generation=None):
+        """写入条目；若查询期间数据已被保存（代数变化）则丢弃，避免缓存旧数据"""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (tag, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str] = (), where: Optional[Callable[[str, object], bool]] = None) -> int:
+        """按标签（或 where(tag, value) 条件）失效条目，并通知其他进程，返回失效条数"""
+        tags = set(tags)
+        with self._lock:
+            stale = [
+                key for key, (tag, value, _) in self._entries.items()
+                if tag in tags or (where is not None and where(tag, value))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self._bump_generation()
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bump_generation()
+
+    def _bump_generation(self):
+        """更新共享代数文件（原子替换），本进程直接采用新代数以保留未失效的条目"""
+        if not self.generation_path:
+            return
+        try:
+            directory = os.path.dirname(self.generation_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.generation_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(time.time_ns()))
+            os.replace(tmp_path, self.generation_path)
+            self._generation = self._read_generation()
+        except OSError as e:
+            print(f"更新缓存代数文件失败: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def cached_query(tag):
+    """Database 读方法的缓存装饰器
+
+    tag 为字符串，或根据方法参数生成标签的函数。空结果（[] / None，也是读失败时的返回值）不缓存。
+    缓存返回的是同一个对象，调用方不应修改。
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None or not cache.enabled:
+                return method(self, *args, **kwargs)
+
+            # 列表参数（如楼盘名称列表）转为元组后作为键
+            key_args = tuple(tuple(a) if isinstance(a, list) else a for a in args)
+            key_kwargs = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in kwargs.items()))
+            key = (method.__name__, key_args, key_kwargs)
+            try:
+                hash(key)
+            except TypeError:
+                return method(self, *args, **kwargs)
+
+            hit, value, generation = cache.get(key)
+            metrics.observe_cache(method.__name__, hit)
+            if hit:
+                return value
+            value = method(self, *args, **kwargs)
+            if value:
+                cache.set(key, tag(*args, **kwargs) if callable(tag) else tag, value, generation)
+            return value
+        return wrapper
+    return decorator
+
+
+def create_cache(generation_dir: Optional[str] = None,
+                 generation_source: Optional[Callable[[], Hashable]] = None) -> QueryCache:
+    """根据环境变量创建查询缓存
+
+    QUERY_CACHE_SIZE: 最大条目数（默认 256，0 表示关闭）
+    QUERY_CACHE_TTL: 条目有效期秒数（默认 600）
+    QUERY_CACHE_GENERATION_PATH: 共享代数文件（默认与数据库同目录的 .cache_generation）
+    QUERY_CACHE_SYNC_INTERVAL: 有 generation_source 时从数据库读取代数的间隔秒数（默认 30，0 为每次查询都读取）
+    """
+    generation_path = os.environ.get('QUERY_CACHE_GENERATION_PATH')
+    if not generation_path:
+        generation_path = os.path.join(generation_dir, '.cache_generation') if generation_dir else DEFAULT_GENERATION_PATH
+    return QueryCache(
+        maxsize=int(os.environ.get('QUERY_CACHE_SIZE', 256)),
+        ttl=float(os.environ.get('QUERY_CACHE_TTL', 600)),
+        generation_path=generation_path,
+        generation_source=generation_source,
+        sync_interval=float(os.environ.get('QUERY_CACHE_SYNC_INTERVAL', 30))
+    )
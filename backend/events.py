@@ -0,0 +1,18 @@
+"""
+刷新进度事件的 Server-Sent Events 编码
+
+事件本身保存在任务登记表（backend/jobs.py）中，每个事件有全局递增的 id，
+客户端断线重连时带上 Last-Event-ID 即可从下一个事件继续。
+"""
+import json
+from typing import Dict, Optional
+
+
+def format_sse(event_id: Optional[int], event_type: str, data: Dict) -> str:
+    """一条 text/event-stream 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
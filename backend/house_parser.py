@@ -0,0 +1,215 @@
+"""
+楼盘列表页的快速 HTML 解析
+
+只在一次流式扫描中提取 div.house-info 块里需要的两段文本
+（a.overflow 的名称、div.house-info-main 的文本），不构建完整的文档树。
+提取规则与 BeautifulSoup(html.parser) 的 find_all / find / get_text 保持一致：
+- 嵌套的 house-info 块也会单独返回，按文档顺序排列
+- 名称和详情都取容器内（不含容器自身）第一个匹配的后代元素
+- 结束标签关闭最近的同名元素，找不到同名元素时忽略
+"""
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from bs4.dammit import EntitySubstitution
+
+# 与 BeautifulSoup 一致的空元素（没有结束标签）
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+])
+
+# BeautifulSoup 的 get_text 会忽略这些元素内（任意深度）的文本
+STRING_CONTAINER_ELEMENTS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# 这些元素内的纯空白文本不做合并
+PRESERVE_WHITESPACE_ELEMENTS = frozenset(['pre', 'textarea'])
+
+# 纯 ASCII 空白的文本节点会被合并为单个空格或换行
+ASCII_SPACES = str.maketrans('', '', '\x20\x0a\x09\x0c\x0d')
+
+
+class _Container:
+    __slots__ = ('index', 'name_parts', 'name_index', 'info_parts', 'info_index')
+
+    def __init__(self, index: int):
+        self.index = index          # 容器 div 在标签栈中的位置
+        self.name_parts = None      # a.overflow 中的文本片段
+        self.name_index = None      # a.overflow 在标签栈中的位置（None 表示未在采集）
+        self.info_parts = None      # div.house-info-main 中的文本片段
+        self.info_index = None
+
+
+class HouseInfoParser(HTMLParser):
+    """流式提取 house-info 块，结果为 [(名称, 详情文本或 None), ...]
+
+    事件处理（空元素、自闭合标签、字符引用、空白文本合并）逐一对应
+    bs4.builder._htmlparser.BeautifulSoupHTMLParser 的行为。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self._stack: List[str] = []
+        self._hidden_depth = 0  # 当前打开的 STRING_CONTAINER_ELEMENTS 数量
+        self._preserve_depth = 0  # 当前打开的 pre/textarea 数量
+        self._already_closed_empty: List[str] = []
+        self._pending: List[str] = []  # 尚未结束的文本节点片段
+        self._active: List[_Container] = []
+        self.containers: List[_Container] = []
+
+    @staticmethod
+    def _classes(attrs) -> List[str]:
+        value = None
+        for key, attr_value in attrs:
+            if key == 'class':
+                value = attr_value  # 重复属性以最后一个为准
+        return value.split() if value else []
+
+    def _flush(self, cdata: bool = False):
+        """结束当前文本节点（对应 BeautifulSoup.endData），CDATA 段不受 script 等元素影响"""
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending = []
+        if self._hidden_depth and not cdata:
+            return
+        if not data.translate(ASCII_SPACES) and not self._preserve_depth:
+            data = '\n' if '\n' in data else ' '
+        for container in self._active:
+            if container.name_index is not None:
+                container.name_parts.append(data)
+            if container.info_index is not None:
+                container.info_parts.append(data)
+
+    def _push(self, tag: str, attrs):
+        self._flush()
+        self._stack.append(tag)
+        if tag in STRING_CONTAINER_ELEMENTS:
+            self._hidden_depth += 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self._preserve_depth += 1
+        if tag != 'a' and tag != 'div':
+            return
+
+        classes = self._classes(attrs)
+        if not classes:
+            return
+        index = len(self._stack) - 1
+        for container in self._active:
+            if tag == 'a' and container.name_parts is None and 'overflow' in classes:
+                container.name_parts = []
+                container.name_index = index
+            elif tag == 'div' and container.info_parts is None and 'house-info-main' in classes:
+                container.info_parts = []
+                container.info_index = index
+
+        if tag == 'div' and 'house-info' in classes:
+            container = _Container(index)
+            self.containers.append(container)
+            self._active.append(container)
+
+    def _pop_to(self, tag: str):
+        """关闭最近的同名元素及其内部仍打开的元素（对应 BeautifulSoup._popToTag）"""
+        self._flush()
+        stack = self._stack
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i] == tag:
+                break
+        else:
+            return
+        if self._hidden_depth:
+            self._hidden_depth -= sum(1 for name in stack[i:] if name in STRING_CONTAINER_ELEMENTS)
+        if self._preserve_depth:
+            self._preserve_depth -= sum(1 for name in stack[i:] if name in PRESERVE_WHITESPACE_ELEMENTS)
+        del stack[i:]
+
+        for container in self._active:
+            if container.name_index is not None and container.name_index >= i:
+                container.name_index = None
+            if container.info_index is not None and container.info_index >= i:
+                container.info_index = None
+        if self._active and self._active[-1].index >= i:
+            self._active = [c for c in self._active if c.index < i]
+
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._push(tag, attrs)
+        if tag in VOID_ELEMENTS and handle_empty_element:
+            self.handle_endtag(tag, check_already_closed=False)
+            self._already_closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # <div/> 之类的自闭合写法：打开后立即关闭
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self._already_closed_empty:
+            self._already_closed_empty.remove(tag)
+        else:
+            self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_charref(self, name):
+        if name.startswith(('x', 'X')):
+            code = int(name[1:].lstrip('xX'), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytearray([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else f'&{name}')
+
+    # 注释、声明等会结束当前文本节点，但它们本身不计入 get_text（CDATA 段除外）
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self._pending.append(data[len('CDATA['):])
+            self._flush(cdata=True)
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def results(self) -> List[Tuple[str, Optional[str]]]:
+        blocks = []
+        for container in self.containers:
+            if container.name_parts is None:
+                name = ''
+            else:
+                # 等价于 get_text(strip=True)
+                name = ''.join(part.strip() for part in container.name_parts if part.strip())
+            info = ''.join(container.info_parts) if container.info_parts is not None else None
+            blocks.append((name, info))
+        return blocks
+
+
+def extract_house_blocks(html: str) -> List[Tuple[str, Optional[str]]]:
+    """返回页面中每个 div.house-info 块的 (名称, house-info-main 文本)"""
+    parser = HouseInfoParser()
+    parser.feed(html)
+    parser.close()
+    return parser.results()
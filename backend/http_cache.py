@@ -0,0 +1,168 @@
+"""
+HTTP 缓存与压缩：读接口的 ETag / Last-Modified / 304 处理、Cache-Control 和 gzip/brotli 压缩
+
+数据每天只在刷新后变化一次，因此读接口的验证器直接取自最新快照（主记录 id 和时间）：
+- ETag 为 "快照 id-请求路径和参数的摘要"，压缩后的响应在后面加上 -gzip / -br
+- Cache-Control 的 max-age 不超过距下一次定时刷新（REFRESH_TIME）的秒数
+"""
+import functools
+import gzip
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from flask import make_response, request
+
+from backend import profiling
+
+try:
+    import brotli  # 可选依赖，未安装时只使用 gzip
+except ImportError:
+    brotli = None
+
+# 压缩的响应类型
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain')
+
+# 响应可能附加的压缩后缀（If-None-Match 与任一后缀匹配即未变化，304 返回匹配的那个）
+ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+
+def seconds_until_next_refresh(refresh_time: str, now: Optional[datetime] = None) -> int:
+    """距离下一次每日定时刷新（HH:MM，服务器本地时间）的秒数"""
+    now = now or datetime.now()
+    hour, minute = (int(part) for part in refresh_time.split(':'))
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return int((next_run - now).total_seconds())
+
+
+class HttpCache:
+    """为 Flask 读接口提供条件请求和压缩
+
+    version_getter 返回最新快照 {'id', 'timestamp', ...}，没有数据时返回 None（此时不加验证器）。
+    """
+
+    def __init__(self, version_getter: Callable[[], Optional[dict]]):
+        self.version_getter = version_getter
+        self.max_age = int(os.environ.get('HTTP_CACHE_MAX_AGE', 600))
+        self.refresh_time = os.environ.get('REFRESH_TIME', '09:00')
+        self.min_compress_size = int(os.environ.get('HTTP_COMPRESS_MIN_SIZE', 1024))
+        self.compress_level = int(os.environ.get('HTTP_COMPRESS_LEVEL', 6))
+
+    def init_app(self, app):
+        app.after_request(self._compress)
+
+    def _cache_max_age(self) -> int:
+        # 手动刷新随时可能发生，因此同时受 HTTP_CACHE_MAX_AGE 限制
+        return max(0, min(self.max_age, seconds_until_next_refresh(self.refresh_time)))
+
+    def _validators(self):
+        """返回 (ETag, Last-Modified)，没有数据时返回 (None, None)"""
+        version = self.version_getter()
+        if not version or version.get('id') is None:
+            return None, None
+        digest = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:16]
+        etag = f"{version['id']}-{digest}"
+        try:
+            last_modified = datetime.fromisoformat(version['timestamp']).astimezone(timezone.utc).replace(microsecond=0)
+        except (TypeError, ValueError):
+            last_modified = None
+        return etag, last_modified
+
+    def _not_modified(self, etag: str, last_modified: Optional[datetime]) -> Optional[str]:
+        """数据未变化时返回 304 响应的 ETag，否则返回 None
+
+        304 的 ETag 要与客户端缓存的 200 响应相同：按 If-None-Match 中匹配的那个（含压缩后缀）返回；
+        只带 If-Modified-Since 的请求按本次协商的压缩编码加后缀。
+        """
+        if request.if_none_match:
+            for suffix in ENCODING_SUFFIXES:
+                if request.if_none_match.contains(etag + suffix):
+                    return etag + suffix
+            return None
+        if last_modified is not None and request.if_modified_since is not None \
+                and request.if_modified_since >= last_modified:
+            encoding = self._choose_encoding()
+            return f'{etag}-{encoding}' if encoding else etag
+        return None
+
+    def _set_cache_headers(self, response, etag: str, last_modified: Optional[datetime]):
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self._cache_max_age()
+        response.cache_control.must_revalidate = True
+        response.vary.add('Accept-Encoding')
+
+    def conditional(self, view):
+        """读接口装饰器：数据未变化时直接返回 304，否则为 200 响应加上验证器和 Cache-Control"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            try:
+                etag, last_modified = self._validators()
+            except Exception as e:
+                print(f"读取 HTTP 缓存验证器失败: {e}")
+                etag, last_modified = None, None
+            if etag is None:
+                return view(*args, **kwargs)
+
+            matched = self._not_modified(etag, last_modified)
+            if matched is not None:
+                response = make_response('', 304)
+                self._set_cache_headers(response, matched, last_modified)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                self._set_cache_headers(response, etag, last_modified)
+            return response
+        return wrapper
+
+    def _choose_encoding(self) -> Optional[str]:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    @staticmethod
+    def _tag_encoding(response, encoding: str):
+        # 不同编码是不同的表示，强 ETag 需要区分
+        etag, weak = response.get_etag()
+        if etag and not weak and not etag.endswith(f'-{encoding}'):
+            response.set_etag(f'{etag}-{encoding}')
+
+    def _compress(self, response):
+        """after_request：对足够大的文本响应做 gzip/brotli 压缩（已预压缩的响应只补上 ETag 后缀）"""
+        if response.status_code != 200:
+            return response
+        if response.headers.get('Content-Encoding') in ('gzip', 'br'):
+            response.vary.add('Accept-Encoding')
+            self._tag_encoding(response, response.headers['Content-Encoding'])
+            return response
+        if (response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_compress_size:
+            return response
+
+        with profiling.span('compress', encoding):
+            if encoding == 'br':
+                compressed = brotli.compress(data, quality=min(self.compress_level, 11))
+            else:
+                compressed = gzip.compress(data, compresslevel=self.compress_level, mtime=0)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        self._tag_encoding(response, encoding)
+        return response
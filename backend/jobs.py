@@ -0,0 +1,712 @@
+"""
+刷新任务登记表和任务队列：Web 服务、后台 worker 和命令行共享的任务状态
+
+JOBS_BACKEND 选择登记表的位置（默认与存储引擎 DB_BACKEND 相同）：
+- sqlite: 本机的 SQLite 文件（WAL 模式依赖共享内存，只能由同一台主机上的进程共享）
+- supabase: Supabase 中的 refresh_jobs 等表（supabase_schema.sql），任何主机上的进程都共享同一个队列
+
+- 任务先以 queued 状态入队，由后台 worker（或没有 worker 时由 Web 服务）认领后变为 running
+- 同一时间最多一个 queued、一个 running 任务（部分唯一索引保证），重复触发会合并到已有的任务
+- 执行任务的进程定期写心跳，超过 JOB_STALE_AFTER 秒没有心跳的任务视为已中断
+- 后台 worker 也定期写心跳，Web 服务据此判断是否有 worker 在线
+- 任务的进度事件（步骤、分页进度、日志）也写入登记表，事件 id 全局递增，
+  任何 worker 上的 /api/refresh/events 连接都能推送并按 Last-Event-ID 续传
+"""
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from backend.storage import SupabaseBackend
+
+DEFAULT_JOBS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'jobs.db')
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refresh_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    trigger TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 1,
+    current_step TEXT,
+    error TEXT,
+    result TEXT,
+    created_at TEXT,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    heartbeat_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_jobs_running ON refresh_jobs(status) WHERE status = 'running';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_jobs_queued ON refresh_jobs(status) WHERE status = 'queued';
+
+CREATE TABLE IF NOT EXISTS refresh_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_events_job ON refresh_events(job_id, id);
+
+CREATE TABLE IF NOT EXISTS refresh_workers (
+    owner TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+# 未完成的任务状态
+ACTIVE_STATUSES = ('queued', 'running')
+
+# 保留最近多少个任务的进度事件
+EVENTS_KEEP_JOBS = 20
+
+
+def _row_to_job(row) -> Optional[Dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def job_status(job: Optional[Dict]) -> Dict:
+    """与原 refresh_status 相同结构的轻量级状态（不含 logs）"""
+    if not job:
+        return {
+            'is_running': False, 'start_time': None, 'end_time': None,
+            'current_step': None, 'error': None, 'result': None
+        }
+    return {
+        'job_id': job['id'],
+        'trigger': job['trigger'],
+        'state': job['status'],
+        'is_running': job['status'] in ACTIVE_STATUSES,  # 排队中的任务也视为进行中
+        'start_time': job['start_time'],
+        'end_time': job['end_time'],
+        'current_step': job['current_step'],
+        'error': job['error'],
+        'result': job['result']
+    }
+
+
+class JobRegistry(ABC):
+    """任务登记表接口：存储相关的方法由 SQLiteJobRegistry / SupabaseJobRegistry 实现
+
+    JOB_STALE_AFTER: 心跳超时秒数（默认 600）
+    JOB_POLL_INTERVAL: 等待其他进程事件时的轮询间隔秒数（默认 0.5）
+    """
+
+    name = 'base'
+
+    def __init__(self, stale_after: Optional[float] = None):
+        self.stale_after = stale_after if stale_after is not None else float(os.environ.get('JOB_STALE_AFTER', 600))
+        self.poll_interval = float(os.environ.get('JOB_POLL_INTERVAL', 0.5))
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._cond = threading.Condition()  # 本进程发布事件时立即唤醒等待的连接
+
+    def verify_schema(self):
+        """验证登记表的表结构，失败时抛出异常（SQLite 在打开时已建表）"""
+
+    # ---------- 任务 ----------
+
+    def enqueue(self, trigger: str) -> Tuple[Dict, bool]:
+        """任务入队，返回 (任务, 是否新建)；已有排队中或正在运行的任务时合并到该任务"""
+        return self._submit(trigger, run_now=False)
+
+    def start(self, trigger: str) -> Tuple[Dict, bool]:
+        """登记一个由调用方立即执行的任务（直接进入 running），返回 (任务, 是否新建)"""
+        return self._submit(trigger, run_now=True)
+
+    @abstractmethod
+    def _submit(self, trigger: str, run_now: bool) -> Tuple[Dict, bool]:
+        """原子地合并到已有任务或新建任务；run_now 时直接接手排队中的任务"""
+
+    @abstractmethod
+    def claim(self, job_id: Optional[int] = None) -> Optional[Dict]:
+        """认领最早的排队任务（或指定任务）并置为 running；已有任务在运行或没有排队任务时返回 None"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: int):
+        """刷新任务的心跳时间"""
+
+    @contextlib.contextmanager
+    def keepalive(self, job_id: int):
+        """任务执行期间在后台线程中定期写心跳（长时间没有进度事件时任务也不会被判定为中断）"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.stale_after / 4):
+                try:
+                    self.heartbeat(job_id)
+                except Exception as e:
+                    print(f"写入任务心跳失败: {e}")
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    @abstractmethod
+    def set_step(self, job_id: int, step: str):
+        """更新当前步骤（同时作为心跳）并发布 step 事件"""
+
+    @abstractmethod
+    def finish(self, job_id: int, error: Optional[str] = None, result: Optional[Dict] = None,
+               step: Optional[str] = None) -> Optional[Dict]:
+        """结束任务（error 为空即成功）并发布 done 事件"""
+
+    @abstractmethod
+    def get(self, job_id: int) -> Optional[Dict]:
+        """按 id 返回任务"""
+
+    @abstractmethod
+    def latest(self) -> Optional[Dict]:
+        """正在运行或排队中的任务，没有时为最近结束的任务（心跳超时的任务先标记为失败）"""
+
+    @abstractmethod
+    def _recent(self, limit: int) -> List[Dict]:
+        """最近的 limit 个任务（新的在前）"""
+
+    def history(self, limit: int = 20) -> List[Dict]:
+        """最近的任务（新的在前），附带耗时秒数"""
+        jobs = []
+        for job in self._recent(limit):
+            job['duration'] = None
+            job['wait'] = None
+            if job['created_at'] and job['status'] != 'queued':
+                job['wait'] = round((datetime.fromisoformat(job['start_time'])
+                                     - datetime.fromisoformat(job['created_at'])).total_seconds(), 3)
+            if job['end_time']:
+                job['duration'] = round((datetime.fromisoformat(job['end_time'])
+                                         - datetime.fromisoformat(job['start_time'])).total_seconds(), 3)
+            del job['heartbeat_at']
+            jobs.append(job)
+        return jobs
+
+    @abstractmethod
+    def stats(self) -> List[Dict]:
+        """按 (触发方式, 状态) 统计任务数和已结束任务的总耗时秒数，以及最近一次结束时间"""
+
+    # ---------- 后台 worker ----------
+
+    @abstractmethod
+    def worker_heartbeat(self, started_at: str):
+        """登记本进程为在线的后台 worker"""
+
+    @abstractmethod
+    def worker_exit(self):
+        """注销本进程的后台 worker 登记"""
+
+    @abstractmethod
+    def workers(self, within: float) -> List[Dict]:
+        """最近 within 秒内有心跳的后台 worker"""
+
+    # ---------- 进度事件 ----------
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    @abstractmethod
+    def publish(self, event_type: str, data: Dict, job_id: Optional[int] = None) -> int:
+        """发布一条进度事件，带 job_id 时同时刷新该任务的心跳"""
+
+    @property
+    @abstractmethod
+    def last_id(self) -> int:
+        """最新的事件 id，没有事件时为 0"""
+
+    @abstractmethod
+    def since(self, last_id: Optional[int]) -> Tuple[List[tuple], bool]:
+        """返回 (last_id 之后的事件, 是否完整)；last_id 为 None、已被清理或大于当前 id 时不完整"""
+
+    @abstractmethod
+    def _events_after(self, last_id: int) -> List[tuple]:
+        """last_id 之后的事件 [(id, type, data), ...]"""
+
+    def wait(self, last_id: int, timeout: float) -> List[tuple]:
+        """等待 last_id 之后的新事件（其他进程发布的事件按 JOB_POLL_INTERVAL 轮询），超时返回空列表"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events = self._events_after(last_id)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining))
+
+    @abstractmethod
+    def snapshot(self, log_limit: int = 50) -> Tuple[int, Dict]:
+        """(当前最新事件 id, 最新任务的状态及最近日志)"""
+
+
+class SQLiteJobRegistry(JobRegistry):
+    """本机的 SQLite 登记表（WAL 模式，每个线程一个连接）
+
+    JOBS_DB_PATH: 登记表文件（默认 data/jobs.db，只能由同一台主机上的进程共享）
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: Optional[str] = None, stale_after: Optional[float] = None):
+        super().__init__(stale_after)
+        self.path = path or os.environ.get('JOBS_DB_PATH') or DEFAULT_JOBS_PATH
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.conn:
+            columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(refresh_jobs)')}
+            if columns and 'created_at' not in columns:
+                # 早期的登记表没有入队时间
+                self.conn.execute('ALTER TABLE refresh_jobs ADD COLUMN created_at TEXT')
+            self.conn.executescript(JOBS_SCHEMA)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    # ---------- 任务 ----------
+
+    def _submit(self, trigger: str, run_now: bool) -> Tuple[Dict, bool]:
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._expire_stale(conn)
+            active = _row_to_job(conn.execute(
+                "SELECT * FROM refresh_jobs WHERE status IN ('queued', 'running') ORDER BY id LIMIT 1"
+            ).fetchone())
+            if active is not None and run_now and active['status'] == 'queued':
+                # 立即执行时直接接手排队中的任务
+                conn.execute('UPDATE refresh_jobs SET requests = requests + 1 WHERE id = ?', (active['id'],))
+                job = self._mark_running(conn, active['id'])
+                conn.execute('COMMIT')
+                self._notify()
+                return job, True
+            if active is not None:
+                conn.execute('UPDATE refresh_jobs SET requests = requests + 1 WHERE id = ?', (active['id'],))
+                conn.execute('COMMIT')
+                active['requests'] += 1
+                return active, False
+
+            now = datetime.now().isoformat()
+            job_id = conn.execute(
+                'INSERT INTO refresh_jobs (trigger, status, owner, current_step, created_at, start_time, heartbeat_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (trigger, 'running' if run_now else 'queued', self.owner,
+                 '初始化任务' if run_now else '排队等待执行', now, now, time.time())
+            ).lastrowid
+            # 只保留最近几个任务的进度事件
+            conn.execute(
+                'DELETE FROM refresh_events WHERE job_id <= ?',
+                (job_id - EVENTS_KEEP_JOBS,)
+            )
+            job = _row_to_job(conn.execute('SELECT * FROM refresh_jobs WHERE id = ?', (job_id,)).fetchone())
+            self._insert_event(conn, job_id, 'status', job_status(job))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._notify()
+        return job, True
+
+    def claim(self, job_id: Optional[int] = None) -> Optional[Dict]:
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if self._expire_stale(conn) is not None:
+                conn.execute('COMMIT')
+                return None
+            if job_id is None:
+                row = conn.execute("SELECT id FROM refresh_jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            else:
+                row = conn.execute("SELECT id FROM refresh_jobs WHERE id = ? AND status = 'queued'", (job_id,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            job = self._mark_running(conn, row['id'])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._notify()
+        return job
+
+    def _mark_running(self, conn, job_id: int) -> Dict:
+        """排队任务改为由本进程执行（调用方持有事务）"""
+        conn.execute(
+            "UPDATE refresh_jobs SET status = 'running', owner = ?, current_step = ?, start_time = ?, heartbeat_at = ? "
+            'WHERE id = ?',
+            (self.owner, '初始化任务', datetime.now().isoformat(), time.time(), job_id)
+        )
+        job = _row_to_job(conn.execute('SELECT * FROM refresh_jobs WHERE id = ?', (job_id,)).fetchone())
+        self._insert_event(conn, job_id, 'status', job_status(job))
+        return job
+
+    def _expire_stale(self, conn) -> Optional[Dict]:
+        """返回正在运行的任务；心跳超时的任务标记为失败（调用方持有事务）"""
+        running = _row_to_job(conn.execute("SELECT * FROM refresh_jobs WHERE status = 'running'").fetchone())
+        if running is None or time.time() - running['heartbeat_at'] <= self.stale_after:
+            return running
+        error = f"任务心跳超时（{running['owner']} 可能已退出）"
+        conn.execute(
+            "UPDATE refresh_jobs SET status = 'failed', error = ?, current_step = ?, end_time = ? WHERE id = ?",
+            (error, '任务已中断', datetime.now().isoformat(), running['id'])
+        )
+        stale = _row_to_job(conn.execute('SELECT * FROM refresh_jobs WHERE id = ?', (running['id'],)).fetchone())
+        self._insert_event(conn, stale['id'], 'done', job_status(stale))
+        print(f"刷新任务 {running['id']} 心跳超时，已标记为失败")
+        return None
+
+    def heartbeat(self, job_id: int):
+        self.conn.execute('UPDATE refresh_jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job_id))
+
+    def set_step(self, job_id: int, step: str):
+        self.conn.execute(
+            'UPDATE refresh_jobs SET current_step = ?, heartbeat_at = ? WHERE id = ?',
+            (step, time.time(), job_id)
+        )
+        self.publish('step', {'step': step}, job_id)
+
+    def finish(self, job_id: int, error: Optional[str] = None, result: Optional[Dict] = None,
+               step: Optional[str] = None) -> Optional[Dict]:
+        conn = self.conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'UPDATE refresh_jobs SET status = ?, error = ?, result = ?, current_step = COALESCE(?, current_step), '
+                "end_time = ?, heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                ('failed' if error else 'succeeded', error, json.dumps(result, ensure_ascii=False) if result else None,
+                 step, datetime.now().isoformat(), time.time(), job_id)
+            )
+            job = _row_to_job(conn.execute('SELECT * FROM refresh_jobs WHERE id = ?', (job_id,)).fetchone())
+            self._insert_event(conn, job_id, 'done', job_status(job))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._notify()
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        return _row_to_job(self.conn.execute('SELECT * FROM refresh_jobs WHERE id = ?', (job_id,)).fetchone())
+
+    @staticmethod
+    def _select_latest(conn) -> Optional[Dict]:
+        row = conn.execute(
+            "SELECT * FROM refresh_jobs WHERE status IN ('queued', 'running') ORDER BY status = 'running' DESC, id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            row = conn.execute('SELECT * FROM refresh_jobs ORDER BY id DESC LIMIT 1').fetchone()
+        return _row_to_job(row)
+
+    def latest(self) -> Optional[Dict]:
+        conn = self.conn
+        job = self._select_latest(conn)
+        if job is not None and job['status'] == 'running' and time.time() - job['heartbeat_at'] > self.stale_after:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._expire_stale(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._notify()
+            job = self._select_latest(conn)
+        return job
+
+    def _recent(self, limit: int) -> List[Dict]:
+        return [_row_to_job(row) for row in self.conn.execute('SELECT * FROM refresh_jobs ORDER BY id DESC LIMIT ?', (limit,))]
+
+    def stats(self) -> List[Dict]:
+        rows = self.conn.execute(
+            'SELECT trigger, status, COUNT(*) AS count, '
+            'SUM((julianday(end_time) - julianday(start_time)) * 86400.0) AS duration, '
+            'MAX(end_time) AS last_end_time '
+            'FROM refresh_jobs GROUP BY trigger, status'
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # ---------- 后台 worker ----------
+
+    def worker_heartbeat(self, started_at: str):
+        self.conn.execute(
+            'INSERT INTO refresh_workers (owner, started_at, heartbeat_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at',
+            (self.owner, started_at, time.time())
+        )
+
+    def worker_exit(self):
+        self.conn.execute('DELETE FROM refresh_workers WHERE owner = ?', (self.owner,))
+
+    def workers(self, within: float) -> List[Dict]:
+        return [dict(row) for row in self.conn.execute(
+            'SELECT owner, started_at, heartbeat_at FROM refresh_workers WHERE heartbeat_at >= ? ORDER BY owner',
+            (time.time() - within,)
+        )]
+
+    # ---------- 进度事件 ----------
+
+    @staticmethod
+    def _insert_event(conn, job_id: Optional[int], event_type: str, data: Dict) -> int:
+        return conn.execute(
+            'INSERT INTO refresh_events (job_id, type, data) VALUES (?, ?, ?)',
+            (job_id, event_type, json.dumps(data, ensure_ascii=False))
+        ).lastrowid
+
+    def publish(self, event_type: str, data: Dict, job_id: Optional[int] = None) -> int:
+        conn = self.conn
+        event_id = self._insert_event(conn, job_id, event_type, data)
+        if job_id is not None and event_type != 'step':
+            conn.execute('UPDATE refresh_jobs SET heartbeat_at = ? WHERE id = ?', (time.time(), job_id))
+        self._notify()
+        return event_id
+
+    @property
+    def last_id(self) -> int:
+        row = self.conn.execute('SELECT MAX(id) FROM refresh_events').fetchone()
+        return row[0] or 0
+
+    def since(self, last_id: Optional[int]) -> Tuple[List[tuple], bool]:
+        conn = self.conn
+        bounds = conn.execute('SELECT MIN(id), MAX(id) FROM refresh_events').fetchone()
+        newest = bounds[1] or 0
+        if last_id is None or last_id > newest:
+            return [], False
+        oldest = bounds[0] if bounds[0] is not None else newest + 1
+        return self._events_after(last_id), last_id >= oldest - 1
+
+    def _events_after(self, last_id: int) -> List[tuple]:
+        return [
+            (row['id'], row['type'], json.loads(row['data']))
+            for row in self.conn.execute('SELECT id, type, data FROM refresh_events WHERE id > ? ORDER BY id', (last_id,))
+        ]
+
+    def snapshot(self, log_limit: int = 50) -> Tuple[int, Dict]:
+        """在同一个读事务中读取"""
+        self.latest()  # 先处理心跳超时的任务
+        conn = self.conn
+        conn.execute('BEGIN')
+        try:
+            last_id = self.last_id
+            job = self._select_latest(conn)
+            status = job_status(job)
+            logs = []
+            if job:
+                logs = [
+                    json.loads(row['data'])['message']
+                    for row in conn.execute(
+                        "SELECT data FROM refresh_events WHERE job_id = ? AND type = 'log' ORDER BY id DESC LIMIT ?",
+                        (job['id'], log_limit)
+                    )
+                ][::-1]
+            status['logs'] = logs
+        finally:
+            conn.execute('COMMIT')
+        return last_id, status
+
+
+class SupabaseJobRegistry(JobRegistry):
+    """Supabase 中的登记表（表和函数见 supabase_schema.sql），任何主机上的 Web 服务、后台 worker 和命令行共享
+
+    入队、认领和心跳超时处理由数据库函数在同一个咨询锁（pg_advisory_xact_lock）内完成，
+    其他操作是普通的 PostgREST 请求；客户端与 SupabaseBackend 相同（首次使用时创建）
+    """
+
+    name = 'supabase'
+
+    def __init__(self, storage: SupabaseBackend, stale_after: Optional[float] = None):
+        super().__init__(stale_after)
+        self.storage = storage
+
+    @property
+    def client(self):
+        return self.storage.client
+
+    def verify_schema(self):
+        try:
+            self.client.table('refresh_jobs').select('id').limit(1).execute()
+            self.client.table('refresh_events').select('id').limit(1).execute()
+            self.client.table('refresh_workers').select('owner').limit(1).execute()
+        except Exception as e:
+            raise RuntimeError(
+                f"Supabase 中没有刷新任务登记表（{e}），请在 SQL Editor 中执行 supabase_schema.sql，"
+                f"或设置 JOBS_BACKEND=sqlite 使用本机登记表"
+            ) from e
+
+    def _rpc(self, function: str, **params) -> Dict:
+        """调用登记表的数据库函数（参数附带当前时间和心跳超时），并为心跳超时的任务补发 done 事件"""
+        params.update({
+            'p_now': datetime.now().isoformat(),
+            'p_clock': time.time(),
+            'p_stale_after': self.stale_after
+        })
+        result = self.client.rpc(function, params).execute().data
+        expired = _row_to_job(result.get('expired'))
+        if expired is not None:
+            self._insert_event(expired['id'], 'done', job_status(expired))
+            print(f"刷新任务 {expired['id']} 心跳超时，已标记为失败")
+        return result
+
+    # ---------- 任务 ----------
+
+    def _submit(self, trigger: str, run_now: bool) -> Tuple[Dict, bool]:
+        result = self._rpc('submit_refresh_job', p_trigger=trigger, p_owner=self.owner, p_run_now=run_now, p_keep_jobs=EVENTS_KEEP_JOBS)
+        job = _row_to_job(result['job'])
+        if result['created']:
+            self._insert_event(job['id'], 'status', job_status(job))
+        self._notify()
+        return job, result['created']
+
+    def claim(self, job_id: Optional[int] = None) -> Optional[Dict]:
+        job = _row_to_job(self._rpc('claim_refresh_job', p_job_id=job_id, p_owner=self.owner)['job'])
+        if job is not None:
+            self._insert_event(job['id'], 'status', job_status(job))
+        self._notify()
+        return job
+
+    def heartbeat(self, job_id: int):
+        self.client.table('refresh_jobs').update({'heartbeat_at': time.time()}).eq('id', job_id).execute()
+
+    def set_step(self, job_id: int, step: str):
+        self.client.table('refresh_jobs').update({'current_step': step, 'heartbeat_at': time.time()}).eq('id', job_id).execute()
+        self.publish('step', {'step': step}, job_id)
+
+    def finish(self, job_id: int, error: Optional[str] = None, result: Optional[Dict] = None,
+               step: Optional[str] = None) -> Optional[Dict]:
+        values = {
+            'status': 'failed' if error else 'succeeded',
+            'error': error,
+            'result': json.dumps(result, ensure_ascii=False) if result else None,
+            'end_time': datetime.now().isoformat(),
+            'heartbeat_at': time.time()
+        }
+        if step is not None:
+            values['current_step'] = step
+        # 只结束仍在运行的任务（已被判定为心跳超时的任务保持 failed）
+        self.client.table('refresh_jobs').update(values).eq('id', job_id).eq('status', 'running').execute()
+        job = self.get(job_id)
+        self._insert_event(job_id, 'done', job_status(job))
+        self._notify()
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        rows = self.client.table('refresh_jobs').select('*').eq('id', job_id).execute().data
+        return _row_to_job(rows[0]) if rows else None
+
+    def _select_latest(self) -> Optional[Dict]:
+        rows = self.client.table('refresh_jobs').select('*').in_('status', list(ACTIVE_STATUSES)).order('id').execute().data
+        if not rows:
+            rows = self.client.table('refresh_jobs').select('*').order('id', desc=True).limit(1).execute().data
+        rows.sort(key=lambda row: (row['status'] != 'running', row['id']))
+        return _row_to_job(rows[0]) if rows else None
+
+    def latest(self) -> Optional[Dict]:
+        job = self._select_latest()
+        if job is not None and job['status'] == 'running' and time.time() - job['heartbeat_at'] > self.stale_after:
+            self._rpc('expire_stale_refresh_job')
+            self._notify()
+            job = self._select_latest()
+        return job
+
+    def _recent(self, limit: int) -> List[Dict]:
+        rows = self.client.table('refresh_jobs').select('*').order('id', desc=True).limit(limit).execute().data
+        return [_row_to_job(row) for row in rows]
+
+    def stats(self) -> List[Dict]:
+        return self.client.table('refresh_job_stats').select('*').execute().data or []
+
+    # ---------- 后台 worker ----------
+
+    def worker_heartbeat(self, started_at: str):
+        self.client.table('refresh_workers').upsert(
+            {'owner': self.owner, 'started_at': started_at, 'heartbeat_at': time.time()}
+        ).execute()
+
+    def worker_exit(self):
+        self.client.table('refresh_workers').delete().eq('owner', self.owner).execute()
+
+    def workers(self, within: float) -> List[Dict]:
+        return self.client.table('refresh_workers').select('owner, started_at, heartbeat_at') \
+            .gte('heartbeat_at', time.time() - within).order('owner').execute().data or []
+
+    # ---------- 进度事件 ----------
+
+    def _insert_event(self, job_id: Optional[int], event_type: str, data: Dict) -> int:
+        rows = self.client.table('refresh_events').insert(
+            {'job_id': job_id, 'type': event_type, 'data': json.dumps(data, ensure_ascii=False)}
+        ).execute().data
+        return rows[0]['id']
+
+    def publish(self, event_type: str, data: Dict, job_id: Optional[int] = None) -> int:
+        event_id = self._insert_event(job_id, event_type, data)
+        if job_id is not None and event_type != 'step':
+            self.heartbeat(job_id)
+        self._notify()
+        return event_id
+
+    def _edge_id(self, desc: bool) -> Optional[int]:
+        rows = self.client.table('refresh_events').select('id').order('id', desc=desc).limit(1).execute().data
+        return rows[0]['id'] if rows else None
+
+    @property
+    def last_id(self) -> int:
+        return self._edge_id(desc=True) or 0
+
+    def since(self, last_id: Optional[int]) -> Tuple[List[tuple], bool]:
+        newest = self.last_id
+        if last_id is None or last_id > newest:
+            return [], False
+        oldest = self._edge_id(desc=False)
+        oldest = oldest if oldest is not None else newest + 1
+        return self._events_after(last_id), last_id >= oldest - 1
+
+    def _events_after(self, last_id: int) -> List[tuple]:
+        rows = self.storage._fetch_all_rows(lambda: self.client.table('refresh_events')
+            .select('id, type, data')
+            .gt('id', last_id)
+            .order('id'))
+        return [(row['id'], row['type'], json.loads(row['data'])) for row in rows]
+
+    def snapshot(self, log_limit: int = 50) -> Tuple[int, Dict]:
+        """先读事件 id 再读任务和日志（没有跨请求的读事务）：期间发布的事件会在续传时重复推送，不会遗漏"""
+        self.latest()  # 先处理心跳超时的任务
+        last_id = self.last_id
+        job = self._select_latest()
+        status = job_status(job)
+        logs = []
+        if job:
+            rows = self.client.table('refresh_events').select('data').eq('job_id', job['id']).eq('type', 'log') \
+                .order('id', desc=True).limit(log_limit).execute().data or []
+            logs = [json.loads(row['data'])['message'] for row in rows][::-1]
+        status['logs'] = logs
+        return last_id, status
+
+
+def create_registry(db) -> JobRegistry:
+    """根据环境变量创建任务登记表
+
+    JOBS_BACKEND: sqlite / supabase，默认与 db 的存储引擎（DB_BACKEND）相同；
+    supabase 时使用 db 的 Supabase 地址和密钥，Web 服务和后台 worker 可以部署在不同主机上
+    """
+    backend = (os.environ.get('JOBS_BACKEND') or db.storage.name).lower()
+    if backend == 'sqlite':
+        return SQLiteJobRegistry()
+    if backend == 'supabase':
+        return SupabaseJobRegistry(SupabaseBackend(db.supabase_url, db.supabase_key))
+    raise ValueError(f"未知的任务登记表: {backend}（可选 sqlite / supabase）")
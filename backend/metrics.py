@@ -0,0 +1,171 @@
+"""
+Prometheus 指标：读接口延迟、Database 方法耗时和行数、抓取耗时和字节数、查询缓存命中、刷新任务结果
+
+prometheus_client 为可选依赖，未安装时所有记录函数什么都不做，/metrics 返回 503。
+多个 gunicorn worker 时需要设置 PROMETHEUS_MULTIPROC_DIR（gunicorn.conf.py 默认设为 data/prometheus），
+各进程把指标写入该目录，/metrics 汇总所有进程；后台 worker 使用同一个目录时，它的抓取指标也会包含在内。
+刷新任务的次数和耗时直接从任务登记表统计，与执行任务的是哪个进程无关。
+"""
+import functools
+import os
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+    from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, SummaryMetricFamily
+    from prometheus_client.multiprocess import MultiProcessCollector
+except ImportError:  # 可选依赖，未安装时不记录指标
+    Counter = None
+
+PREFIX = 'zhuhaibay'
+
+# 接口和数据库查询的延迟分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 抓取单页的延迟分桶（秒，含重试）
+FETCH_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# 查询返回行数的分桶
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+enabled = Counter is not None
+
+if enabled:
+    HTTP_LATENCY = Histogram(
+        f'{PREFIX}_http_request_duration_seconds', '接口请求耗时',
+        ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+    )
+    DB_LATENCY = Histogram(
+        f'{PREFIX}_db_query_duration_seconds', 'Database 方法耗时（含查询缓存）',
+        ['method'], buckets=LATENCY_BUCKETS
+    )
+    DB_ROWS = Histogram(
+        f'{PREFIX}_db_query_rows', 'Database 方法返回的行数',
+        ['method'], buckets=ROWS_BUCKETS
+    )
+    CACHE_LOOKUPS = Counter(
+        f'{PREFIX}_query_cache_lookups_total', '查询缓存查找次数',
+        ['method', 'result']
+    )
+    SCRAPER_FETCH = Histogram(
+        f'{PREFIX}_scraper_fetch_duration_seconds', '抓取单页耗时（含重试）',
+        ['outcome'], buckets=FETCH_BUCKETS
+    )
+    SCRAPER_BYTES = Counter(
+        f'{PREFIX}_scraper_response_bytes_total', '抓取响应的字节数'
+    )
+    SCRAPER_PARSE = Histogram(
+        f'{PREFIX}_scraper_parse_duration_seconds', '解析单页耗时',
+        ['format'], buckets=LATENCY_BUCKETS
+    )
+
+
+def init_app(app):
+    """为 Flask 应用记录每个请求的耗时（按路由规则而不是实际路径，避免楼盘名称产生大量标签）"""
+    if not enabled:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_LATENCY.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
+
+def timed_query(method):
+    """Database 方法的耗时和返回行数"""
+    if not enabled:
+        return method
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = method(*args, **kwargs)
+        DB_LATENCY.labels(method.__name__).observe(time.perf_counter() - started)
+        rows = _row_count(result)
+        if rows is not None:
+            DB_ROWS.labels(method.__name__).observe(rows)
+        return result
+    return wrapper
+
+
+def _row_count(result) -> Optional[int]:
+    """列表为行数，楼盘名称 → 序列的字典为楼盘数，单条记录为 1，读失败的 None 为 0，其他（如 bool）不统计"""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return len(result) if result and all(isinstance(v, (list, dict)) for v in result.values()) else 1
+    if result is None:
+        return 0
+    return None
+
+
+def observe_cache(method: str, hit: bool):
+    if enabled:
+        CACHE_LOOKUPS.labels(method, 'hit' if hit else 'miss').inc()
+
+
+def observe_fetch(outcome: str, seconds: float, size: int = 0):
+    """outcome: ok / not_modified / unchanged / error"""
+    if enabled:
+        SCRAPER_FETCH.labels(outcome).observe(seconds)
+        if size:
+            SCRAPER_BYTES.inc(size)
+
+
+def observe_parse(data_format: str, seconds: float):
+    if enabled:
+        SCRAPER_PARSE.labels(data_format).observe(seconds)
+
+
+class RefreshJobCollector:
+    """在每次采集时从任务登记表统计刷新任务（所有进程执行的任务都在表中）"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    def collect(self):
+        total = CounterMetricFamily(f'{PREFIX}_refresh_jobs', '刷新任务数', labels=['trigger', 'status'])
+        duration = SummaryMetricFamily(
+            f'{PREFIX}_refresh_job_duration_seconds', '已结束刷新任务的耗时', labels=['trigger', 'status']
+        )
+        last_end = GaugeMetricFamily(
+            f'{PREFIX}_refresh_job_last_end_timestamp_seconds', '最近一次结束的时间', labels=['status']
+        )
+        latest_by_status = {}
+        for row in self.jobs.stats():
+            total.add_metric([row['trigger'], row['status']], row['count'])
+            if row['last_end_time']:
+                duration.add_metric([row['trigger'], row['status']], row['count'], row['duration'] or 0.0)
+                latest_by_status[row['status']] = max(latest_by_status.get(row['status'], ''), row['last_end_time'])
+        for status, end_time in latest_by_status.items():
+            last_end.add_metric([status], datetime.fromisoformat(end_time).timestamp())
+        return [total, duration, last_end]
+
+
+def render(jobs=None) -> Tuple[Optional[bytes], str]:
+    """/metrics 的响应内容和 Content-Type；未安装 prometheus_client 时返回 (None, '')"""
+    if not enabled:
+        return None, ''
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        output = generate_latest(registry)
+    else:
+        output = generate_latest(REGISTRY)
+    if jobs is not None:
+        registry = CollectorRegistry()
+        registry.register(RefreshJobCollector(jobs))
+        try:
+            output += generate_latest(registry)
+        except Exception as e:
+            print(f"统计刷新任务指标失败: {e}")
+    return output, CONTENT_TYPE_LATEST
@@ -0,0 +1,239 @@
+"""
+按需性能剖析：单个请求的耗时分解、最慢请求和查询的排行、刷新任务的 cProfile
+
+- PROFILE_REQUESTS=1 时剖析所有请求；设置 PROFILE_TOKEN 后，带 X-Profile-Token: <token> 请求头的单个请求也会被剖析
+- 被剖析的请求记录每次存储查询（存储引擎方法和过滤参数，即 PostgREST / SQLite 查询）、JSON 序列化、
+  响应压缩和总耗时，通过 Server-Timing 响应头返回，并进入本进程最慢请求/最慢查询的排行（各保留 PROFILE_KEEP 条）
+- /api/admin/profile 查看排行（设置了 PROFILE_TOKEN 时需要同样的请求头）；超过 PROFILE_SLOW_MS 毫秒的查询同时打印到日志
+- PROFILE_REFRESH=1 或 refresh_data.py --profile 时用 cProfile 剖析刷新任务，结果写入 PROFILE_DIR
+两个开关都没有设置时存储引擎不被包装，请求处理没有额外开销。
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import heapq
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'profiles')
+
+TOKEN_HEADER = 'X-Profile-Token'
+
+# 正在剖析的请求（每个请求线程各自一份）
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def requests_enabled() -> bool:
+    return os.environ.get('PROFILE_REQUESTS', '0') != '0'
+
+
+def profile_token() -> Optional[str]:
+    return os.environ.get('PROFILE_TOKEN') or None
+
+
+def available() -> bool:
+    """是否可能有请求被剖析（决定是否包装存储引擎）"""
+    return requests_enabled() or profile_token() is not None
+
+
+class SlowLog:
+    """线程安全地保留耗时最长的 keep 条记录"""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._heap = []  # (耗时, 序号, 记录) 的最小堆
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, entry: Dict):
+        item = (seconds, next(self._counter), entry)
+        with self._lock:
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def items(self) -> List[Dict]:
+        """按耗时从长到短"""
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._heap, key=lambda item: item[0], reverse=True)]
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+
+
+_keep = int(os.environ.get('PROFILE_KEEP', 50))
+SLOW_QUERY_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+slow_requests = SlowLog(_keep)
+slow_queries = SlowLog(_keep)
+
+
+class RequestProfile:
+    """一个请求的耗时分解"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []  # {'kind', 'name', 'detail', 'ms'}
+
+    def add(self, kind: str, name: str, seconds: float, detail: Optional[str] = None):
+        self.spans.append({'kind': kind, 'name': name, 'detail': detail, 'ms': round(seconds * 1000, 3)})
+
+    def totals(self) -> Dict[str, float]:
+        """每类耗时的合计毫秒数和总耗时"""
+        totals = {}
+        for item in self.spans:
+            totals[item['kind']] = round(totals.get(item['kind'], 0) + item['ms'], 3)
+        totals['total'] = round((time.perf_counter() - self.started) * 1000, 3)
+        return totals
+
+    def server_timing(self, totals: Dict[str, float]) -> str:
+        return ', '.join(f'{kind};dur={ms}' for kind, ms in totals.items())
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, detail: Optional[str] = None):
+    """在正在剖析的请求中记录一段耗时（没有剖析时什么都不做）"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        profile.add(kind, name, seconds, detail)
+        if kind == 'query':
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                print(f"慢查询 {seconds * 1000:.1f} ms: {name}({detail})，请求 {profile.method} {profile.path}")
+            slow_queries.add(seconds, {
+                'query': name,
+                'filters': detail,
+                'ms': round(seconds * 1000, 3),
+                'request': f'{profile.method} {profile.path}',
+                'time': datetime.now().isoformat()
+            })
+
+
+def _describe(value) -> str:
+    if isinstance(value, (list, tuple)):
+        shown = ', '.join(repr(v) for v in value[:5])
+        return f'[{shown}, ... 共 {len(value)} 个]' if len(value) > 5 else f'[{shown}]'
+    return repr(value)
+
+
+def _describe_args(args, kwargs) -> str:
+    parts = [_describe(a) for a in args]
+    parts += [f'{k}={_describe(v)}' for k, v in kwargs.items()]
+    return ', '.join(parts)
+
+
+class ProfiledStorage:
+    """存储引擎的代理：正在剖析的请求记录每次查询的方法、过滤参数和耗时"""
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def __getattr__(self, name):
+        attr = getattr(self._storage, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return attr(*args, **kwargs)
+            with span('query', f'{self._storage.name}.{name}', _describe_args(args, kwargs)):
+                return attr(*args, **kwargs)
+        return wrapper
+
+
+def wrap_storage(storage):
+    """开启了请求剖析时返回带记录的代理，否则原样返回"""
+    return ProfiledStorage(storage) if available() else storage
+
+
+def authorized(request) -> bool:
+    """是否允许查看剖析结果：设置了 PROFILE_TOKEN 时校验请求头，否则只在 PROFILE_REQUESTS 开启时允许"""
+    token = profile_token()
+    if token is not None:
+        return request.headers.get(TOKEN_HEADER) == token
+    return requests_enabled()
+
+
+def init_app(app):
+    """按开关或请求头剖析请求；应在其他 after_request（如响应压缩）之前注册，使总耗时包含它们"""
+    if not available():
+        return
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class ProfiledJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            with span('serialize', 'json'):
+                return super().response(*args, **kwargs)
+
+    app.json = ProfiledJSONProvider(app)
+
+    @app.before_request
+    def _start_profile():
+        token = profile_token()
+        if requests_enabled() or (token is not None and request.headers.get(TOKEN_HEADER) == token):
+            g.profile_token = _current.set(RequestProfile(request.method, request.full_path.rstrip('?')))
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = _current.get()
+        if profile is None:
+            return response
+        totals = profile.totals()
+        response.headers['Server-Timing'] = profile.server_timing(totals)
+        slow_requests.add(totals['total'] / 1000, {
+            'request': f'{profile.method} {profile.path}',
+            'status': response.status_code,
+            'time': datetime.now().isoformat(),
+            'timing': totals,
+            'spans': profile.spans
+        })
+        return response
+
+    @app.teardown_request
+    def _reset_profile(exc=None):
+        token = g.pop('profile_token', None)
+        if token is not None:
+            _current.reset(token)
+
+
+# ---------- 刷新任务 ----------
+
+def refresh_enabled() -> bool:
+    return os.environ.get('PROFILE_REFRESH', '0') != '0'
+
+
+def profile_call(name: str, func, *args, **kwargs):
+    """用 cProfile 执行 func，结果写入 PROFILE_DIR/<name>-<时间>.prof，并打印累计耗时最长的函数"""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        try:
+            directory = os.environ.get('PROFILE_DIR') or DEFAULT_PROFILE_DIR
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+            print(out.getvalue())
+            print(f"性能剖析结果已保存: {path}（可用 python -m pstats 或 snakeviz 查看）")
+        except Exception as e:
+            print(f"保存性能剖析结果失败: {e}")
@@ -0,0 +1,216 @@
+"""
+静态数据发布：每次刷新保存成功后，把读接口的响应预先生成为带版本号的 JSON 文件
+
+目录结构（PUBLISH_DIR，默认 data/public）：
+    current.json                当前版本的清单（原子替换），读接口和静态前端都从这里找到文件
+    v<快照 id>-<发布时间>/
+        records.json            与 GET /api/records 的响应完全相同，下同
+        latest.json / properties.json / projects.json / properties_latest.json
+        history/<摘要>.json      每个楼盘一个文件，对应关系见清单的 history
+        ranking/speed-<start>_<end>.json   预设日期范围的卖出速度排名，见清单的 rankings
+每个 .json 旁边还有预压缩的 .json.gz。新版本写完后才切换 current.json，旧版本保留 PUBLISH_KEEP 个。
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+DEFAULT_PUBLISH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'public')
+
+MANIFEST_NAME = 'current.json'
+
+# 发布卖出速度排名的日期范围（截至快照当天）：本月、最近 N 天和全部历史
+RANKING_WINDOWS_DAYS = (7, 30, 90)
+
+
+def _dumps(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _envelope(data) -> bytes:
+    """与读接口相同的响应结构"""
+    return _dumps({'success': True, 'data': data})
+
+
+def history_file(name: str) -> str:
+    """楼盘名称可能包含 / 等字符，历史文件按名称摘要命名"""
+    return f"history/{hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def ranking_windows(snapshot_date: str, first_date: Optional[str]):
+    """返回 [(start, end), ...]，end 为快照日期"""
+    end = datetime.fromisoformat(snapshot_date).date()
+    windows = [end.replace(day=1)]  # 前端默认选择本月
+    windows += [end - timedelta(days=days) for days in RANKING_WINDOWS_DAYS]
+    if first_date:
+        windows.append(datetime.fromisoformat(first_date).date())
+    result = []
+    for start in windows:
+        if start <= end and (start.isoformat(), end.isoformat()) not in result:
+            result.append((start.isoformat(), end.isoformat()))
+    return result
+
+
+class SnapshotPublisher:
+    """生成和读取静态数据版本
+
+    PUBLISH_STATIC: 是否发布和使用静态文件（默认 1，0 为关闭）
+    PUBLISH_DIR: 发布目录（默认 data/public）
+    PUBLISH_KEEP: 保留的旧版本数（默认 3）
+    """
+
+    def __init__(self, root: Optional[str] = None, keep: Optional[int] = None):
+        self.enabled = os.environ.get('PUBLISH_STATIC', '1') != '0'
+        self.root = root or os.environ.get('PUBLISH_DIR') or DEFAULT_PUBLISH_DIR
+        self.keep = keep if keep is not None else int(os.environ.get('PUBLISH_KEEP', 3))
+        self._manifest: Optional[Dict] = None
+        self._manifest_stat = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    # ---------- 发布 ----------
+
+    def publish(self, db) -> Optional[Dict]:
+        """在保存成功后调用：读取最新数据生成新版本并切换，返回清单；失败时撤下旧版本（读接口改为查库）"""
+        if not self.enabled:
+            return None
+        tmp_dir = None
+        try:
+            started = datetime.now()
+            latest = db.get_latest_record()
+            records = db.get_all_records()
+            if not latest or not records:
+                raise RuntimeError('没有读取到最新记录')
+
+            version = f"v{latest['id']}-{started.strftime('%Y%m%dT%H%M%S%f')}"
+            tmp_dir = os.path.join(self.root, f'.{version}.{os.getpid()}.tmp')
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(os.path.join(tmp_dir, 'history'))
+            os.makedirs(os.path.join(tmp_dir, 'ranking'))
+
+            files = {
+                '/records': ('records.json', records),
+                '/latest': ('latest.json', latest),
+                '/properties': ('properties.json', db.get_property_list()),
+                '/projects': ('projects.json', db.get_projects()),
+                '/properties/latest': ('properties_latest.json', db.get_latest_properties()),
+            }
+            for filename, data in files.values():
+                self._write(tmp_dir, filename, _envelope(data))
+
+            # 一次扫描取出全部楼盘的历史，再按楼盘拆分
+            history = {}
+            for name, series in db.get_properties_history(None).items():
+                history[name] = history_file(name)
+                self._write(tmp_dir, history[name], _envelope(series))
+
+            rankings = {}
+            for start, end in ranking_windows(latest['timestamp'][:10], records[0]['timestamp'][:10]):
+                filename = f'ranking/speed-{start}_{end}.json'
+                self._write(tmp_dir, filename, _envelope(db.get_sales_speed_ranking(start, end)))
+                rankings[f'{start}_{end}'] = filename
+
+            manifest = {
+                'version': version,
+                'record_id': latest['id'],
+                'timestamp': latest['timestamp'],
+                'published_at': started.isoformat(),
+                'files': {path: filename for path, (filename, _) in files.items()},
+                'history': history,
+                'rankings': rankings
+            }
+            os.replace(tmp_dir, os.path.join(self.root, version))
+            self._replace_manifest(_dumps(manifest))
+            self._prune(version)
+            print(f"已发布静态数据 {version}: {len(history)} 个楼盘历史，{len(rankings)} 个排名，"
+                  f"耗时 {(datetime.now() - started).total_seconds():.2f} 秒")
+            return manifest
+        except Exception as e:
+            import traceback
+            print(f"发布静态数据失败: {e}")
+            print(traceback.format_exc())
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            self.unpublish()
+            return None
+
+    @staticmethod
+    def _write(directory: str, filename: str, data: bytes):
+        path = os.path.join(directory, filename)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    def _replace_manifest(self, data: bytes):
+        tmp_path = f'{self.manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _prune(self, current: str):
+        """删除多余的旧版本（按发布时间排序，正在切换的读请求仍可读到最近几个版本）"""
+        versions = sorted(
+            (entry for entry in os.listdir(self.root)
+             if entry.startswith('v') and entry != current and os.path.isdir(os.path.join(self.root, entry))),
+            key=lambda entry: entry.rsplit('-', 1)[-1]
+        )
+        for entry in versions[:max(0, len(versions) - self.keep)]:
+            shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+
+    def unpublish(self):
+        """撤下当前版本（之后的读请求回到数据库查询，直到下一次发布成功）"""
+        try:
+            os.remove(self.manifest_path)
+            print("已撤下静态数据，读接口改为查询数据库")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"撤下静态数据失败: {e}")
+
+    # ---------- 读取 ----------
+
+    def manifest(self) -> Optional[Dict]:
+        """当前清单；current.json 变化（其他进程发布）时重新读取"""
+        if not self.enabled:
+            return None
+        try:
+            st = os.stat(self.manifest_path)
+            stat = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+        with self._lock:
+            if stat != self._manifest_stat:
+                try:
+                    with open(self.manifest_path, 'rb') as f:
+                        self._manifest = json.loads(f.read())
+                except (OSError, ValueError) as e:
+                    print(f"读取静态数据清单失败: {e}")
+                    return None
+                self._manifest_stat = stat
+            return self._manifest
+
+    def version(self) -> Optional[Dict]:
+        """当前版本对应的快照 {'id', 'timestamp'}（作为 HTTP 缓存验证器），未发布时返回 None"""
+        manifest = self.manifest()
+        if not manifest:
+            return None
+        return {'id': manifest['record_id'], 'timestamp': manifest['timestamp']}
+
+    def artifact_path(self, section: str, key: str) -> Optional[str]:
+        """清单中 section（files / history / rankings）下 key 对应文件的路径，不存在时返回 None"""
+        manifest = self.manifest()
+        if not manifest:
+            return None
+        filename = manifest.get(section, {}).get(key)
+        if not filename:
+            return None
+        path = os.path.join(self.root, manifest['version'], filename)
+        return path if os.path.exists(path) else None
@@ -0,0 +1,197 @@
+"""
+刷新流程：抓取 → 保存 → 验证 → 发布静态数据，步骤、分页进度和日志写入任务登记表
+
+后台 worker（backend/worker.py）、Web 服务的内联执行和命令行工具都通过 run_refresh_job 执行同一套流程。
+"""
+import threading
+import traceback
+from datetime import datetime
+from typing import Dict, Optional
+
+from backend import profiling
+from backend.scraper import PropertyScraper
+
+
+class RefreshRun:
+    """执行一个已处于 running 状态的刷新任务"""
+
+    def __init__(self, job_id: int, jobs, db, publisher=None, profile: Optional[bool] = None):
+        self.job_id = job_id
+        self.jobs = jobs
+        self.db = db
+        self.publisher = publisher
+        # 是否用 cProfile 剖析本次执行（默认由 PROFILE_REFRESH 决定）
+        self.profile = profiling.refresh_enabled() if profile is None else profile
+        # 分页进度（页面并发抓取，计数在 _progress_lock 内更新）
+        self.progress = {'pages_done': 0, 'pages_total': None}
+        self._progress_lock = threading.Lock()
+
+    def log(self, message: str):
+        """添加日志到任务（所有 worker 的事件流都能看到）"""
+        log_entry = f"[{datetime.now().isoformat()}] {message}"
+        print(log_entry)
+        self.jobs.publish('log', {'message': log_entry}, self.job_id)
+
+    def step(self, step: str):
+        """更新当前步骤"""
+        self.jobs.set_step(self.job_id, step)
+        self.log(f"步骤: {step}")
+
+    def finish(self, step: str, error: Optional[str] = None, result: Optional[Dict] = None) -> Dict:
+        """结束任务，记录结果或错误"""
+        return self.jobs.finish(self.job_id, error=error, result=result, step=step)
+
+    def report_page(self, start: int, ok: bool):
+        with self._progress_lock:
+            self.progress['pages_done'] += 1
+            data = dict(self.progress, page=start, ok=ok)
+        self.jobs.publish('progress', data, self.job_id)
+
+    def set_pages_total(self, pages_total: int):
+        with self._progress_lock:
+            self.progress['pages_total'] = pages_total
+
+    def make_scraper(self) -> PropertyScraper:
+        """带进度回调的 scraper"""
+        run = self
+
+        class StatusScraper(PropertyScraper):
+            def fetch_page(self, start: int):
+                run.step(f"正在请求数据 (第 {start} 页)...")
+                run.log(f"开始请求第 {start} 页数据...")
+                try:
+                    result = super().fetch_page(start)
+                    if result:
+                        run.log(f"数据请求成功 (第 {start} 页)")
+                    else:
+                        run.log(f"数据请求失败 (第 {start} 页): 返回 None")
+                    run.report_page(start, bool(result))
+                    return result
+                except Exception as e:
+                    run.log(f"数据请求异常 (第 {start} 页): {str(e)}")
+                    run.report_page(start, False)
+                    raise
+
+            def _total_count(self, data: Dict):
+                total = super()._total_count(data)
+                if total is not None:
+                    run.set_pages_total(min(self.max_pages, -(-total // self.page_size)))
+                return total
+
+            def parse_properties(self, data: Dict):
+                run.step("正在解析数据...")
+                run.log("开始解析楼盘数据...")
+                try:
+                    result = super().parse_properties(data)
+                    if result:
+                        run.log(f"数据解析成功: 找到 {len(result)} 个楼盘")
+                    else:
+                        run.log("数据解析失败: 未找到楼盘数据")
+                    return result
+                except Exception as e:
+                    run.log(f"数据解析异常: {str(e)}")
+                    raise
+
+            def fetch_all_properties(self):
+                run.log("开始执行 fetch_all_properties...")
+                try:
+                    result = super().fetch_all_properties()
+                    if result:
+                        run.log(f"fetch_all_properties 成功: {result.get('total_projects', 0)} 个项目")
+                    else:
+                        run.log("fetch_all_properties 失败: 返回 None")
+                    return result
+                except Exception as e:
+                    run.log(f"fetch_all_properties 异常: {str(e)}")
+                    raise
+
+        return StatusScraper()
+
+    def run(self) -> Dict:
+        """执行任务，返回结束后的任务记录"""
+        if self.profile:
+            self.log("本次刷新开启了性能剖析（cProfile）")
+            return profiling.profile_call(f'refresh-{self.job_id}', self._run_safely)
+        return self._run_safely()
+
+    def _run_safely(self) -> Dict:
+        try:
+            with self.jobs.keepalive(self.job_id):
+                return self._run()
+        except Exception as e:
+            error_msg = str(e)
+            self.log(f"刷新数据时发生错误: {error_msg}")
+            self.log(f"错误详情: {traceback.format_exc()}")
+            try:
+                return self.finish(f'发生错误: {error_msg[:50]}', error=error_msg)
+            except Exception as finish_error:
+                # 登记表不可用时任务会在心跳超时后被标记为失败
+                print(f"记录刷新任务结果失败: {finish_error}")
+                return None
+
+    def _run(self) -> Dict:
+        self.log("开始后台刷新数据...")
+        self.step("正在抓取数据...")
+
+        scraper = self.make_scraper()
+        result = scraper.fetch_all_properties()
+
+        if not result:
+            error_msg = '数据抓取失败，未返回有效数据'
+            self.log(error_msg)
+            return self.finish('数据抓取失败', error=error_msg)
+
+        units = result['total_available_units']
+        projects = result['total_projects']
+
+        self.log(f"数据抓取成功: {projects} 个项目，共 {units} 套")
+
+        if result.get('unchanged'):
+            # 与上次保存的内容相同，提前结束，跳过保存
+            self.log("数据与上次保存的内容相同，跳过保存")
+            return self.finish('数据未变化，已跳过保存', result={
+                'projects': projects,
+                'units': units,
+                'unchanged': True
+            })
+
+        self.step(f"正在保存数据 ({projects} 个项目，{units} 套)...")
+
+        # 保存数据到数据库
+        self.log("开始保存数据到数据库...")
+        success = self.db.save_record(units, projects, result)
+        if success and self.db.last_save_stats:
+            stats = self.db.last_save_stats
+            self.log(f"写入 {stats['written']} 条楼盘数据（变化 {stats['changed']}，未变 {stats['unchanged']}）")
+
+        if not success:
+            error_msg = '数据保存到数据库失败'
+            self.log(error_msg)
+            return self.finish('数据保存失败', error=error_msg)
+
+        # 验证数据是否真的保存成功（只读取最新主记录的 id 和套数）
+        latest = self.db.get_latest_record()
+        saved_id = self.db.last_save_stats.get('record_id') if self.db.last_save_stats else None
+        if not (latest and latest.get('available_units') == units and latest.get('id') == saved_id):
+            error_msg = f'数据保存验证失败: 保存了 {units} 套，但数据库最新记录是 {latest.get("available_units") if latest else "无"}'
+            self.log(error_msg)
+            return self.finish('数据保存验证失败', error=error_msg)
+
+        scraper.commit_state(result)
+        if self.publisher is not None and self.publisher.enabled:
+            self.step("正在发布静态数据...")
+            manifest = self.publisher.publish(self.db)
+            if manifest:
+                self.log(f"已发布静态数据: {manifest['version']}")
+            else:
+                self.log("静态数据发布失败，读接口暂时改为查询数据库")
+        self.log(f"数据保存成功并验证: {projects} 个项目，共 {units} 套")
+        return self.finish('任务完成', result={
+            'projects': projects,
+            'units': units
+        })
+
+
+def run_refresh_job(job_id: int, jobs, db, publisher=None, profile: Optional[bool] = None) -> Optional[Dict]:
+    """执行一个已认领（running）的刷新任务，返回结束后的任务记录"""
+    return RefreshRun(job_id, jobs, db, publisher, profile).run()
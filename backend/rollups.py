@@ -0,0 +1,191 @@
+"""
+历史曲线的降采样
+
+- 按天/周/月把快照列分桶（列按时间排序，每个桶是连续的一段列），每个桶给出最后一次的值、最小值、最大值、
+  变化量（相对上一个有数据的桶的最后值，之前没有数据时相对本桶第一个值）和点数
+- 周、月汇总随分析引擎的矩阵一起预先计算；save_record 追加一列后只重新计算最后一个桶（Rollup.extend）
+- lttb 为 Largest-Triangle-Three-Buckets 降采样，保留曲线的形状，把点数限制在 max_points 以内
+"""
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RESOLUTIONS = ('day', 'week', 'month')
+
+# 预先计算并增量维护的分辨率（按天的汇总只在查询时为单个序列计算）
+PRECOMPUTED = ('week', 'month')
+
+
+def bucket_labels(dates: np.ndarray, resolution: str) -> np.ndarray:
+    """每列所属的桶：day 为日期，week 为该周周一的日期，month 为 YYYY-MM；按时间排序的列得到非递减的标签"""
+    if resolution == 'day':
+        return dates
+    if resolution == 'month':
+        return dates.astype('<U7')
+    if resolution == 'week':
+        days = dates.astype('datetime64[D]')
+        weekday = ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')  # 1970-01-01 是周四
+        return (days - weekday).astype('<U10')
+    raise ValueError(f"未知的分辨率: {resolution}（可选 {' / '.join(RESOLUTIONS)}）")
+
+
+def _bucket_starts(labels: np.ndarray) -> np.ndarray:
+    """每个桶第一列的列号"""
+    if len(labels) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+
+
+def _reduce(units: np.ndarray, starts: np.ndarray, prev: np.ndarray) -> Dict[str, np.ndarray]:
+    """units 的列按 starts 分桶后逐桶汇总；prev 为这些列之前每行最后的值（没有时为 NaN）"""
+    rows, n = units.shape
+    if n == 0:
+        empty = np.zeros((rows, 0))
+        return {'last': empty, 'minimum': empty, 'maximum': empty, 'delta': empty, 'carry': empty,
+                'count': empty.astype(np.int32), 'last_column': empty.astype(np.int32)}
+    valid = ~np.isnan(units)
+    ends = np.append(starts[1:], n)
+    columns = np.arange(n, dtype=np.int32)
+    # 每列及之前最后一个有值的列（没有时为 -1），每列及之后第一个有值的列（没有时为 n）
+    last_seen = np.maximum.accumulate(np.where(valid, columns, -1), axis=1)
+    next_seen = np.minimum.accumulate(np.where(valid, columns, n)[:, ::-1], axis=1)[:, ::-1]
+    last_column = last_seen[:, ends - 1]
+    first_column = next_seen[:, starts]
+    has = last_column >= starts
+
+    def take(index):
+        return np.take_along_axis(units, np.clip(index, 0, n - 1), axis=1)
+
+    last = np.where(has, take(last_column), np.nan)
+    first = np.where(has, take(first_column), np.nan)
+    # 截至每个桶结束时每行最后的值（向后延续），用于下一个桶的变化量
+    carry = np.where(last_column >= 0, take(last_column), prev[:, None])
+    before = np.concatenate((prev[:, None], carry[:, :-1]), axis=1)
+    return {
+        'last': last,
+        'minimum': np.fmin.reduceat(units, starts, axis=1),  # fmin/fmax 忽略 NaN
+        'maximum': np.fmax.reduceat(units, starts, axis=1),
+        'delta': last - np.where(np.isnan(before), first, before),
+        'carry': carry,
+        'count': np.add.reduceat(valid.astype(np.int32), starts, axis=1),
+        'last_column': np.where(has, last_column, -1).astype(np.int32)
+    }
+
+
+def _to_int(value) -> Optional[int]:
+    return None if value is None or math.isnan(value) else int(value)
+
+
+class Rollup:
+    """一种分辨率下矩阵每一行的分桶汇总（行与矩阵的行对应，列为桶），不可变"""
+
+    __slots__ = ('resolution', 'labels', 'starts', 'last', 'minimum', 'maximum', 'delta', 'carry', 'count', 'last_column')
+
+    def __init__(self, resolution: str, labels: np.ndarray, starts: np.ndarray, arrays: Dict[str, np.ndarray]):
+        self.resolution = resolution
+        self.labels = labels  # 每个桶的标签（升序）
+        self.starts = starts  # 每个桶第一列的列号
+        self.last = arrays['last']
+        self.minimum = arrays['minimum']
+        self.maximum = arrays['maximum']
+        self.delta = arrays['delta']
+        self.carry = arrays['carry']
+        self.count = arrays['count']  # 桶内有值的快照数
+        self.last_column = arrays['last_column']  # 桶内最后一个有值的列号（没有时为 -1）
+
+    @classmethod
+    def build(cls, units: np.ndarray, dates: np.ndarray, resolution: str) -> 'Rollup':
+        column_labels = bucket_labels(dates, resolution)
+        starts = _bucket_starts(column_labels)
+        arrays = _reduce(units, starts, np.full(units.shape[0], np.nan))
+        return cls(resolution, column_labels[starts], starts, arrays)
+
+    def extend(self, units: np.ndarray, dates: np.ndarray, row_map: np.ndarray) -> 'Rollup':
+        """矩阵只在末尾变化（追加一列，或替换当天的列）后的汇总：之前的桶原样沿用，只重新计算最后一个桶
+
+        row_map[i] 为新矩阵第 i 行在旧矩阵中的行号（新楼盘为 -1）。
+        """
+        column_labels = bucket_labels(dates, self.resolution)
+        if len(column_labels) == 0:
+            return Rollup.build(units, dates, self.resolution)
+        tail_label = column_labels[-1]
+        keep = int(np.searchsorted(self.labels, tail_label, side='left'))  # 沿用的桶数
+        tail_start = int(np.searchsorted(column_labels, tail_label, side='left'))
+        known = row_map >= 0
+
+        def kept(array, fill):
+            out = np.full((len(row_map), keep), fill, dtype=array.dtype)
+            out[known] = array[row_map[known], :keep]
+            return out
+
+        old = {
+            'last': kept(self.last, np.nan), 'minimum': kept(self.minimum, np.nan),
+            'maximum': kept(self.maximum, np.nan), 'delta': kept(self.delta, np.nan),
+            'carry': kept(self.carry, np.nan), 'count': kept(self.count, 0),
+            'last_column': kept(self.last_column, -1)
+        }
+        prev = old['carry'][:, -1] if keep else np.full(len(row_map), np.nan)
+        tail_starts = _bucket_starts(column_labels[tail_start:])
+        tail = _reduce(units[:, tail_start:], tail_starts, prev)
+        tail['last_column'] = np.where(tail['last_column'] >= 0, tail['last_column'] + tail_start, -1).astype(np.int32)
+        arrays = {key: np.concatenate((old[key], tail[key]), axis=1) for key in old}
+        labels = np.concatenate((self.labels[:keep], column_labels[tail_start:][tail_starts]))
+        starts = np.concatenate((self.starts[:keep], tail_starts + tail_start))
+        return Rollup(self.resolution, labels, starts, arrays)
+
+    def row(self, i: int, timestamps: List[str], extra: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """第 i 行有数据的桶：bucket、桶内最后一次快照的 timestamp 和 available_units，以及 min / max / delta / points
+
+        extra 为 {字段名: 行号}，附带这些行在同一个桶内最后的值。
+        """
+        buckets = []
+        for b in np.flatnonzero(self.count[i] > 0):
+            bucket = {
+                'bucket': str(self.labels[b]),
+                'timestamp': timestamps[self.last_column[i, b]],
+                'available_units': int(self.last[i, b]),
+                'min': int(self.minimum[i, b]),
+                'max': int(self.maximum[i, b]),
+                'delta': _to_int(self.delta[i, b]),
+                'points': int(self.count[i, b])
+            }
+            for key, row in (extra or {}).items():
+                bucket[key] = _to_int(self.last[row, b])
+            buckets.append(bucket)
+        return buckets
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets：返回保留的点的下标（升序，总是包含首尾两点）
+
+    点数不超过 threshold（或 threshold < 3）时全部保留。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # 下一个桶的平均点（最后一个桶的下一个桶为最后一个点）
+        next_hi = min(int((i + 2) * every) + 1, n)
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample(rows: List[Dict], max_points: Optional[int], value_key: str = 'available_units') -> List[Dict]:
+    """按 timestamp 排序的行超过 max_points 时用 LTTB 保留其中 max_points 行"""
+    if not max_points or len(rows) <= max_points:
+        return rows
+    x = np.fromiter((datetime.fromisoformat(row['timestamp']).timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    y = np.fromiter((row[value_key] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    return [rows[i] for i in lttb(x, y, max_points)]
@@ -0,0 +1,97 @@
+"""
+自适应采样计划：决定后台 worker 下一次定时抓取的时间
+
+- 每天 REFRESH_TIME 之后至少成功抓取一次；worker 停机错过时，启动后立即补抓
+- 默认每天只在 REFRESH_TIME 抓取一次；SAMPLE_INTRADAY=1 时开启日内加密采样：
+  最近一次抓取发现变化时按 SAMPLE_MIN_INTERVAL 加密采样，连续没有变化时间隔逐次翻倍，最长 SAMPLE_MAX_INTERVAL
+- 抓取失败时从 SAMPLE_MIN_INTERVAL 开始指数退避重试
+- 每个计划时间加上 0 ~ SAMPLE_JITTER 秒的随机抖动，避免每次在固定时刻请求上游
+计划只依据任务登记表中的历史（手动刷新和命令行刷新也算一次采样），worker 重启后不会丢失。
+"""
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from backend.jobs import ACTIVE_STATUSES
+
+
+class SamplingPlan:
+    """根据最近的刷新任务计算下一次抓取时间
+
+    REFRESH_TIME: 每天定时抓取的时间（默认 09:00）
+    SAMPLE_INTRADAY: 是否在每日定时抓取之间加密采样（默认 0）
+    SAMPLE_MIN_INTERVAL / SAMPLE_MAX_INTERVAL: 采样（及失败重试）间隔的下限和上限秒数（默认 10800 / 86400）
+    SAMPLE_JITTER: 随机抖动的最大秒数（默认 300）
+    """
+
+    def __init__(self, refresh_time: Optional[str] = None, min_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, jitter: Optional[float] = None,
+                 intraday: Optional[bool] = None):
+        self.refresh_time = refresh_time or os.environ.get('REFRESH_TIME', '09:00')
+        self.intraday = intraday if intraday is not None else os.environ.get('SAMPLE_INTRADAY', '0') != '0'
+        self.min_interval = min_interval if min_interval is not None else float(os.environ.get('SAMPLE_MIN_INTERVAL', 10800))
+        self.max_interval = max_interval if max_interval is not None else float(os.environ.get('SAMPLE_MAX_INTERVAL', 86400))
+        self.max_interval = max(self.min_interval, self.max_interval)
+        self.jitter = jitter if jitter is not None else float(os.environ.get('SAMPLE_JITTER', 300))
+
+    def daily_anchor(self, now: datetime) -> datetime:
+        """now 之前（含）最近一次的每日定时时间"""
+        hour, minute = (int(part) for part in self.refresh_time.split(':')[:2])
+        anchor = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if anchor > now:
+            anchor -= timedelta(days=1)
+        return anchor
+
+    def _jitter(self, seed: int) -> timedelta:
+        # 同一次计划的抖动按最近任务的 id 取随机数，反复计算时计划时间不会来回变动
+        return timedelta(seconds=random.Random(seed).uniform(0, self.jitter))
+
+    def interval(self, finished: List[Dict]) -> Tuple[float, str]:
+        """下一次采样距上次结束的秒数及原因；finished 为已结束的任务（新的在前）"""
+        failures = 0
+        for job in finished:
+            if job['status'] != 'failed':
+                break
+            failures += 1
+        if failures:
+            return min(self.max_interval, self.min_interval * 2 ** (failures - 1)), f'连续失败 {failures} 次，退避重试'
+
+        quiet = 0
+        for job in finished:
+            if job['status'] != 'succeeded' or not (job['result'] or {}).get('unchanged'):
+                break
+            quiet += 1
+        seconds = min(self.max_interval, self.min_interval * 2 ** quiet)
+        return seconds, f'连续 {quiet} 次没有变化' if quiet else '上次抓取有变化'
+
+    def next_run(self, history: List[Dict], now: Optional[datetime] = None) -> Optional[Tuple[datetime, str]]:
+        """返回 (计划时间, 原因)；history 为任务登记表的最近任务（新的在前），有任务排队或运行时返回 None"""
+        now = now or datetime.now()
+        if history and history[0]['status'] in ACTIVE_STATUSES:
+            return None
+        finished = [job for job in history if job['end_time']]
+        if not finished:
+            return now, '没有抓取记录'
+
+        last = finished[0]
+        jitter = self._jitter(last['id'])
+        seconds, reason = self.interval(finished)
+        due = datetime.fromisoformat(last['end_time']) + timedelta(seconds=seconds) + jitter
+
+        anchor = self.daily_anchor(now)
+        caught_up = any(
+            job['status'] == 'succeeded' and datetime.fromisoformat(job['start_time']) >= anchor
+            for job in finished
+        )
+        if not caught_up:
+            if last['status'] == 'failed' and datetime.fromisoformat(last['end_time']) >= anchor:
+                # 本次定时抓取失败了，按退避间隔重试
+                return due, reason
+            # 定时时间已过但还没有成功抓取（worker 停机或刚启动），立即补抓
+            return min(due, anchor + jitter), f'补抓 {anchor.strftime("%m-%d %H:%M")} 的定时抓取'
+        anchor += timedelta(days=1)
+        if not self.intraday or anchor + jitter < due:
+            # 默认今天已成功抓取后只等下一次每日定时抓取
+            return anchor + jitter, '每日定时抓取'
+        return due, reason
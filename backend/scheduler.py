@@ -1,50 +1,30 @@
-import schedule
-import time
-from datetime import datetime
-import sys
+"""
+兼容入口：定时抓取已合并到后台刷新 worker（backend/worker.py）
+
+    python -m backend.scheduler   等同于   python -m backend.worker
+"""
 import os
+import sys
 
 # 添加父目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.scraper import PropertyScraper
-from backend.database import Database
+# 先导入 backend.worker：它在导入 prometheus_client 之前设置 PROMETHEUS_MULTIPROC_DIR
+from backend.worker import RefreshWorker
+from backend.refresh import run_refresh_job
+
+
+class PropertyScheduler(RefreshWorker):
+    """保留原来的类名；run() 即后台 worker 的主循环"""
 
-class PropertyScheduler:
-    def __init__(self):
-        self.scraper = PropertyScraper()
-        self.db = Database()
-    
     def fetch_and_save(self):
-        """抓取并保存数据"""
-        print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始抓取数据...")
-        
-        result = self.scraper.fetch_all_properties()
-        if result:
-            units = result['total_available_units']
-            projects = result['total_projects']
-            success = self.db.save_record(units, projects, result)
-            if success:
-                print(f"数据已保存: {projects} 个项目，共 {units} 套")
-            else:
-                print("数据保存失败")
-        else:
-            print("数据抓取失败")
-    
-    def run(self):
-        """运行定时任务"""
-        # 立即执行一次
-        self.fetch_and_save()
-        
-        # 每天9点执行
-        schedule.every().day.at("09:00").do(self.fetch_and_save)
-        
-        print("\n定时任务已启动，每天9:00自动抓取数据")
-        print("按 Ctrl+C 停止\n")
-        
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # 每分钟检查一次
+        """立即抓取并保存一次（在任务登记表中登记，已有刷新任务在运行时跳过）"""
+        job, created = self.jobs.start('scheduler')
+        if not created:
+            print(f"已有刷新任务 {job['id']} 正在运行（{job['owner']}），本次抓取合并到该任务")
+            return
+        run_refresh_job(job['id'], self.jobs, self.db, self.publisher)
+
 
 if __name__ == '__main__':
     scheduler = PropertyScheduler()
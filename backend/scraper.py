@@ -1,23 +1,163 @@
+import functools
+import hashlib
+import os
+import random
 import requests
 import re
 import json
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, List
 import time
+from datetime import datetime
+
+from backend import metrics
+from backend.house_parser import extract_house_blocks
+
+# 可重试的 HTTP 状态码（限流和服务端错误）
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# JSON 响应中可能表示总条数的字段
+TOTAL_COUNT_KEYS = ('total', 'totalCount', 'total_count', 'recordsTotal')
+
+# 无效楼盘名称（垃圾数据），合并为一个预编译的正则，re.match 语义不变
+INVALID_NAME_PATTERN = re.compile('|'.join(f'(?:{p})' for p in [
+    r'^\d{11,}$',  # 纯数字且长度超过10位（如：20230040466）
+    r'^/$',  # 只有斜杠
+    r'^\d+栋$',  # 只有数字+栋（如：1栋）
+    r'^[A-Z0-9]{15,}$',  # 纯大写字母和数字的长串（如：440403004001GB00024）
+    r'.*地下室.*车位.*',  # 包含"地下室"和"车位"的（如：B区地下室（车位分割））
+    r'^[A-Z]区地下室',  # A区地下室、B区地下室等
+    r'^\d{12}[A-Z0-9]+$',  # 数字开头的编码（如：440403004001GB00024）
+]), re.IGNORECASE)
+
+AVAILABLE_UNITS_PATTERN = re.compile(r'待售[：:\s]*(\d+)')
+
+# HTML 解析方式：fast 为只提取 house-info 块的流式解析，bs4 为完整的 BeautifulSoup 文档树
+HTML_PARSERS = ('fast', 'bs4')
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', '.scraper_state.json')
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_invalid_name(name: str) -> bool:
+    """楼盘名称每天重复出现，缓存判断结果"""
+    return INVALID_NAME_PATTERN.match(name) is not None
+
 
 class PropertyScraper:
-    def __init__(self):
-        self.base_url = 'https://fdcjy.zhszjj.com/presalelist'
+    def __init__(self, base_url: Optional[str] = None):
+        # base_url 可指向本地桩服务器，便于离线测试
+        self.base_url = base_url or os.environ.get('SCRAPER_BASE_URL', 'https://fdcjy.zhszjj.com/presalelist')
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'application/json, text/javascript, */*; q=0.01',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Referer': 'https://fdcjy.zhszjj.com/'
         }
-        self.page_size = 1000  # 一次性获取1000条数据
+        self.page_size = int(os.environ.get('SCRAPER_PAGE_SIZE', 1000))  # 每页条数
+        self.max_workers = int(os.environ.get('SCRAPER_MAX_WORKERS', 4))  # 并发请求的页数上限
+        self.max_retries = int(os.environ.get('SCRAPER_MAX_RETRIES', 3))  # 每页失败后的重试次数
+        self.backoff_base = float(os.environ.get('SCRAPER_BACKOFF_BASE', 1.0))  # 指数退避的基础秒数
+        self.timeout = (10, float(os.environ.get('SCRAPER_READ_TIMEOUT', 60)))  # (连接, 读取) 超时
+        self.max_pages = 100  # 防止总数未知时无限翻页
+        self.html_parser = os.environ.get('SCRAPER_HTML_PARSER', 'fast')
+        if self.html_parser not in HTML_PARSERS:
+            print(f"未知的 SCRAPER_HTML_PARSER: {self.html_parser}，使用 fast")
+            self.html_parser = 'fast'
+        self._session = None
+        self._session_lock = threading.Lock()
+        # 变化检测状态：上次成功保存时每页的 ETag/Last-Modified、响应正文哈希、解析结果和内容哈希
+        self.state_path = os.environ.get('SCRAPER_STATE_PATH', DEFAULT_STATE_PATH)
+        self._state = None
+        self._pending_pages: Dict[int, Dict] = {}  # 本次抓取中各页的响应校验信息
+        self._last_pages: Dict[int, Dict] = {}  # 上一次 fetch_all_properties 的逐页状态
+        self._pages_lock = threading.Lock()
+        # 录制模式：保存每页的原始响应，供 benchmarks/replay.py 离线回放
+        self.capture_dir = os.environ.get('SCRAPER_CAPTURE_DIR') or None
+    
+    @property
+    def session(self) -> requests.Session:
+        """复用连接的会话，连接池大小与并发数一致"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.headers.update(self.headers)
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, self.max_workers))
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+    
+    def _get_with_retry(self, params: Dict, headers: Optional[Dict] = None) -> requests.Response:
+        """带重试和指数退避的 GET 请求，重试耗尽后抛出最后一次的异常"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(self.base_url, params=params, headers=headers, timeout=self.timeout)
+                if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    raise requests.HTTPError(f"可重试的状态码 {response.status_code}", response=response)
+                response.raise_for_status()
+                return response
+            except requests.RequestException as e:
+                retryable = e.response is None or e.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) * (1 + random.random() * 0.5)
+                print(f"请求失败（第 {attempt + 1} 次）: {e}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+    
+    def _load_state(self) -> Dict:
+        """读取上次成功保存时的状态；抓取地址或每页条数变化时忽略旧状态"""
+        if self._state is None:
+            state = {}
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if state.get('base_url') != self.base_url or state.get('page_size') != self.page_size:
+                state = {}
+            self._state = state
+        return self._state
+    
+    def _saved_page(self, start: int) -> Optional[Dict]:
+        return self._load_state().get('pages', {}).get(str(start))
+    
+    def commit_state(self, result: Dict):
+        """数据保存成功后记录本次抓取的校验信息，供下次条件请求和变化检测使用"""
+        state = {
+            'base_url': self.base_url,
+            'page_size': self.page_size,
+            'content_hash': result.get('content_hash'),
+            'saved_date': datetime.now().date().isoformat(),
+            'pages': {str(page): info for page, info in self._last_pages.items()}
+        }
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+            self._state = state
+        except OSError as e:
+            print(f"保存抓取状态失败: {e}")
+    
+    @staticmethod
+    def content_hash(properties: List[Dict]) -> str:
+        """规范化楼盘列表（名称 + 待售套数，排序后）的内容哈希"""
+        normalized = sorted((p.get('name', ''), p.get('available_units', 0)) for p in properties)
+        return hashlib.sha256(json.dumps(normalized, ensure_ascii=False).encode('utf-8')).hexdigest()
     
     def fetch_page(self, start: int) -> Optional[Dict]:
-        """获取单页数据"""
+        """获取单页数据（start 为页码，从 1 开始）
+        
+        若上次保存过该页的 ETag/Last-Modified，则发送条件请求；
+        服务器返回 304，或响应正文的哈希与上次相同时返回 {'not_modified': True, ...}，携带上次的解析结果。
+        """
         try:
             params = {
                 'keywords': 'presale',
@@ -27,15 +167,43 @@ class PropertyScraper:
                 'count': self.page_size
             }
             
+            saved = self._saved_page(start)
+            conditional_headers = {}
+            if saved and saved.get('properties') is not None:
+                if saved.get('etag'):
+                    conditional_headers['If-None-Match'] = saved['etag']
+                if saved.get('last_modified'):
+                    conditional_headers['If-Modified-Since'] = saved['last_modified']
+            
             print(f"正在请求: {self.base_url} (start={start}, count={self.page_size})")
-            response = requests.get(
-                self.base_url, 
-                params=params,
-                headers=self.headers, 
-                timeout=120
-            )
+            fetch_started = time.perf_counter()
+            try:
+                response = self._get_with_retry(params, conditional_headers)
+            except requests.RequestException:
+                metrics.observe_fetch('error', time.perf_counter() - fetch_started)
+                raise
             print(f"响应状态码: {response.status_code}")
-            response.raise_for_status()
+            
+            if response.status_code == 304:
+                metrics.observe_fetch('not_modified', time.perf_counter() - fetch_started)
+                print(f"第 {start} 页未修改，沿用上次的解析结果")
+                return self._reuse_page(saved)
+            
+            body_hash = hashlib.sha256(response.content).hexdigest()
+            with self._pages_lock:
+                self._pending_pages[start] = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'body_hash': body_hash
+                }
+            if saved and saved.get('properties') is not None and saved.get('body_hash') == body_hash:
+                # 服务器不支持条件请求时，正文与上次相同的页同样跳过解析
+                metrics.observe_fetch('unchanged', time.perf_counter() - fetch_started, len(response.content))
+                print(f"第 {start} 页内容未变，沿用上次的解析结果")
+                return self._reuse_page(saved)
+            metrics.observe_fetch('ok', time.perf_counter() - fetch_started, len(response.content))
+            if self.capture_dir:
+                self._capture(start, response)
             print(f"响应内容长度: {len(response.text)} 字符")
             
             # 尝试解析JSON响应
@@ -43,9 +211,12 @@ class PropertyScraper:
                 data = response.json()
                 return data
             except json.JSONDecodeError:
-                # 如果不是JSON，尝试解析HTML
-                soup = BeautifulSoup(response.text, 'html.parser')
-                return {'html': response.text, 'soup': soup}
+                # 如果不是JSON，按HTML处理（fast 模式在 parse_properties 中流式解析）
+                if self.html_parser == 'bs4':
+                    from bs4 import BeautifulSoup
+                    soup = BeautifulSoup(response.text, 'html.parser')
+                    return {'html': response.text, 'soup': soup}
+                return {'html': response.text}
             
         except requests.RequestException as e:
             print(f"请求第 {start} 页失败: {e}")
@@ -54,25 +225,53 @@ class PropertyScraper:
             print(f"解析第 {start} 页失败: {e}")
             return None
     
+    @staticmethod
+    def _reuse_page(saved: Dict) -> Dict:
+        """沿用上次保存的一页：原始条目数、总条数和解析结果"""
+        return {
+            'not_modified': True,
+            'raw_count': saved.get('raw_count', 0),
+            'total': saved.get('total'),
+            'properties': saved['properties']
+        }
+    
+    def _capture(self, start: int, response: requests.Response):
+        """保存一页的原始响应：page-NNNN.json/.html 为正文，page-NNNN.meta.json 为请求参数和响应头"""
+        try:
+            os.makedirs(self.capture_dir, exist_ok=True)
+            body = response.content
+            extension = 'json' if body.lstrip()[:1] in (b'{', b'[') else 'html'
+            base = os.path.join(self.capture_dir, f'page-{start:04d}')
+            # 同一页只保留最新的一种格式
+            stale = f"{base}.{'html' if extension == 'json' else 'json'}"
+            if os.path.exists(stale):
+                os.remove(stale)
+            with open(f'{base}.{extension}', 'wb') as f:
+                f.write(body)
+            meta = {
+                'start': start,
+                'count': self.page_size,
+                'url': response.url,
+                'status': response.status_code,
+                'headers': {k: v for k, v in response.headers.items()
+                            if k.lower() in ('content-type', 'etag', 'last-modified', 'cache-control')},
+                'bytes': len(body),
+                'elapsed_ms': round(response.elapsed.total_seconds() * 1000, 1),
+                'captured_at': datetime.now().isoformat()
+            }
+            with open(f'{base}.meta.json', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存第 {start} 页的原始响应失败: {e}")
+    
     def is_valid_property_name(self, name: str) -> bool:
         """验证楼盘名称是否有效"""
         if not name or len(name.strip()) == 0:
             return False
         
-        # 过滤垃圾数据
-        invalid_patterns = [
-            r'^\d{11,}$',  # 纯数字且长度超过10位（如：20230040466）
-            r'^/$',  # 只有斜杠
-            r'^\d+栋$',  # 只有数字+栋（如：1栋）
-            r'^[A-Z0-9]{15,}$',  # 纯大写字母和数字的长串（如：440403004001GB00024）
-            r'.*地下室.*车位.*',  # 包含"地下室"和"车位"的（如：B区地下室（车位分割））
-            r'^[A-Z]区地下室',  # A区地下室、B区地下室等
-            r'^\d{12}[A-Z0-9]+$',  # 数字开头的编码（如：440403004001GB00024）
-        ]
-        
-        for pattern in invalid_patterns:
-            if re.match(pattern, name, re.IGNORECASE):
-                return False
+        # 过滤垃圾数据（见 INVALID_NAME_PATTERN）
+        if _is_invalid_name(name):
+            return False
         
         return True
     
@@ -100,65 +299,169 @@ class PropertyScraper:
                 properties.append(prop)
         
         # 如果是HTML格式
-        elif 'soup' in data:
-            soup = data['soup']
-            
-            # 查找所有包含房产信息的div容器
-            house_containers = soup.find_all('div', class_='house-info')
-            
-            for container in house_containers:
-                try:
-                    # 提取项目名称 - 在a标签中
-                    name_elem = container.find('a', class_='overflow')
-                    name = name_elem.get_text(strip=True) if name_elem else ''
-                    
-                    # 验证名称有效性
-                    if not self.is_valid_property_name(name):
-                        continue
-                    
-                    # 提取待售套数 - 在house-info-main的表格中
-                    info_main = container.find('div', class_='house-info-main')
-                    if info_main:
-                        text = info_main.get_text()
-                        match = re.search(r'待售[：:\s]*(\d+)', text)
-                        
-                        if match:
-                            available_units = int(match.group(1))
-                            prop = {
-                                'name': name,
-                                'available_units': available_units
-                            }
-                            properties.append(prop)
-                except Exception as e:
+        elif 'soup' in data or 'html' in data:
+            for name, text in self._house_blocks(data):
+                # 验证名称有效性
+                if not self.is_valid_property_name(name):
                     continue
+                
+                # 提取待售套数 - 在house-info-main的表格中
+                if text is not None:
+                    match = AVAILABLE_UNITS_PATTERN.search(text)
+                    if match:
+                        properties.append({
+                            'name': name,
+                            'available_units': int(match.group(1))
+                        })
         
         return properties
     
+    def _count_raw_items(self, data: Dict) -> int:
+        """统计一页中的原始条目数（名称过滤之前），用于判断是否还有下一页"""
+        if data.get('not_modified'):
+            return data['raw_count']
+        if 'data' in data or 'list' in data or 'items' in data:
+            items = data.get('data', data.get('list', data.get('items', [])))
+            return len(items) if isinstance(items, list) else 0
+        if 'soup' in data or 'html' in data:
+            return len(self._house_blocks(data))
+        return 0
+    
+    def _house_blocks(self, data: Dict) -> List[tuple]:
+        """HTML 页中每个 div.house-info 的 (项目名称, house-info-main 文本或 None)，结果缓存在 data 中"""
+        blocks = data.get('house_blocks')
+        if blocks is not None:
+            return blocks
+        if 'soup' in data:
+            blocks = []
+            for container in data['soup'].find_all('div', class_='house-info'):
+                # 项目名称在a标签中，待售套数在house-info-main的表格中
+                name_elem = container.find('a', class_='overflow')
+                info_main = container.find('div', class_='house-info-main')
+                blocks.append((
+                    name_elem.get_text(strip=True) if name_elem else '',
+                    info_main.get_text() if info_main else None
+                ))
+        else:
+            blocks = extract_house_blocks(data['html'])
+        data['house_blocks'] = blocks
+        return blocks
+    
+    def _total_count(self, data: Dict) -> Optional[int]:
+        """从 JSON 响应中读取总条数（HTML 响应或缺少该字段时返回 None）"""
+        for key in TOTAL_COUNT_KEYS:
+            value = data.get(key)
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+            if isinstance(value, str) and value.isdigit():
+                return int(value)
+        return None
+    
+    def _fetch_pages(self) -> Optional[List[tuple]]:
+        """分页抓取所有页面，按页码顺序返回 (页码, 数据)；任何一页重试后仍失败时返回 None
+        
+        先请求第 1 页得到总条数，再以有限并发请求剩余页面；
+        总数未知时按并发数分批向后翻页，直到某页不满一页为止。
+        缺页的快照不完整（delta 模式会把缺失的楼盘记为消失），因此整次抓取失败，保留上一次快照。
+        """
+        first = self.fetch_page(1)
+        if not first:
+            return None
+        pages = [(1, first)]
+        
+        first_count = self._count_raw_items(first)
+        if first_count < self.page_size:
+            return pages
+        
+        total = first.get('total') if first.get('not_modified') else self._total_count(first)
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            if total is not None:
+                last_page = min(self.max_pages, -(-total // self.page_size))
+                print(f"共 {total} 条数据，分 {last_page} 页抓取（并发 {self.max_workers}）")
+                # executor.map 按提交顺序返回结果，合并后保持页码顺序
+                for page_no, data in zip(range(2, last_page + 1), executor.map(self.fetch_page, range(2, last_page + 1))):
+                    if not data:
+                        print(f"第 {page_no} 页抓取失败，放弃本次抓取")
+                        return None
+                    pages.append((page_no, data))
+                return pages
+            
+            print(f"总条数未知，按每批 {self.max_workers} 页继续翻页...")
+            next_page = 2
+            while next_page <= self.max_pages:
+                batch = list(range(next_page, min(next_page + self.max_workers, self.max_pages + 1)))
+                results = list(executor.map(self.fetch_page, batch))
+                for page_no, data in zip(batch, results):
+                    if not data:
+                        print(f"第 {page_no} 页抓取失败，放弃本次抓取")
+                        return None
+                    pages.append((page_no, data))
+                    if self._count_raw_items(data) < self.page_size:
+                        return pages
+                next_page = batch[-1] + 1
+        return pages
+    
     def fetch_all_properties(self) -> Optional[Dict]:
-        """获取所有房产数据"""
+        """获取所有房产数据
+        
+        返回结果中 unchanged=True 表示内容与上次保存的完全相同且今天已保存过，调用方可跳过保存。
+        保存成功后应调用 commit_state(result)。
+        """
         print("开始抓取珠海所有在售房产数据...")
-        print("正在获取数据（一次性获取1000条）...")
+        print(f"正在分页获取数据（每页 {self.page_size} 条）...")
         
-        # 一次性获取1000条数据
-        data = self.fetch_page(1)
-        if not data:
+        with self._pages_lock:
+            self._pending_pages = {}
+        pages = self._fetch_pages()
+        if not pages:
             print("数据获取失败")
             return None
         
-        properties = self.parse_properties(data)
+        properties = []
+        page_states = {}
+        not_modified_pages = 0
+        for page_no, data in pages:
+            if data.get('not_modified'):
+                # 304 或正文未变：跳过解析，沿用上次的结果（正文未变时更新本次响应的校验信息）
+                page_properties = data['properties']
+                page_states[page_no] = dict(self._saved_page(page_no), **self._pending_pages.get(page_no, {}))
+                not_modified_pages += 1
+            else:
+                parse_started = time.perf_counter()
+                page_properties = self.parse_properties(data)
+                metrics.observe_parse('html' if 'html' in data else 'json', time.perf_counter() - parse_started)
+                page_states[page_no] = dict(
+                    self._pending_pages.get(page_no, {}),
+                    raw_count=self._count_raw_items(data),
+                    total=self._total_count(data),
+                    properties=page_properties
+                )
+            properties.extend(page_properties)
         
         if not properties:
             print("未找到房产数据")
             return None
         
         total_available = sum(p.get('available_units', 0) for p in properties)
+        content_hash = self.content_hash(properties)
+        state = self._load_state()
+        # 每天至少保存一次快照，保证每日序列完整
+        unchanged = (
+            content_hash == state.get('content_hash')
+            and state.get('saved_date') == datetime.now().date().isoformat()
+        )
         
-        print(f"\n抓取完成！共 {len(properties)} 个项目，总待售 {total_available} 套")
+        print(f"\n抓取完成！共 {len(pages)} 页（{not_modified_pages} 页未修改），{len(properties)} 个项目，总待售 {total_available} 套")
+        if unchanged:
+            print("数据与上次保存的内容相同，无需重新保存")
+        self._last_pages = page_states
         
         return {
             'total_projects': len(properties),
             'total_available_units': total_available,
-            'properties': properties
+            'properties': properties,
+            'content_hash': content_hash,
+            'unchanged': unchanged
         }
     
     def fetch_available_units(self) -> Optional[int]:
@@ -0,0 +1,1009 @@
+"""
+存储引擎：Database 通过 StorageBackend 访问数据，
+可选 Supabase（PostgREST）或本地 SQLite（WAL 模式）两种实现
+"""
+import json
+import os
+import base64
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from typing import List, Dict, Optional, Tuple
+
+# 两张表的 SQLite 结构，与 data/properties.db 保持一致
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS property_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    available_units INTEGER NOT NULL,
+    total_projects INTEGER DEFAULT 0,
+    details TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS property_details (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    available_units INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_property_name
+ON property_details(property_name, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_property_records_timestamp
+ON property_records(timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_property_details_timestamp
+ON property_details(timestamp);
+
+-- 楼盘维度表：每个楼盘一行，由触发器在插入/删除 property_details 时维护（delta 模式由 replace_day 维护）
+CREATE TABLE IF NOT EXISTS property_projects (
+    property_name TEXT PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    latest_units INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_property_projects
+AFTER INSERT ON property_details
+BEGIN
+    INSERT INTO property_projects (property_name, first_seen, last_seen, latest_units)
+    VALUES (NEW.property_name, NEW.timestamp, NEW.timestamp, NEW.available_units)
+    ON CONFLICT(property_name) DO UPDATE SET
+        first_seen = MIN(first_seen, excluded.first_seen),
+        latest_units = CASE WHEN excluded.last_seen >= last_seen THEN excluded.latest_units ELSE latest_units END,
+        last_seen = MAX(last_seen, excluded.last_seen),
+        updated_at = CURRENT_TIMESTAMP;
+END;
+
+-- 删除明细（按天替换快照）后按剩余数据重新计算该楼盘，没有剩余数据时从维度表删除
+CREATE TRIGGER IF NOT EXISTS trg_property_projects_delete
+AFTER DELETE ON property_details
+BEGIN
+    DELETE FROM property_projects
+    WHERE property_name = OLD.property_name
+      AND NOT EXISTS (SELECT 1 FROM property_details WHERE property_name = OLD.property_name);
+    UPDATE property_projects SET
+        first_seen = (SELECT MIN(timestamp) FROM property_details WHERE property_name = OLD.property_name),
+        last_seen = (SELECT MAX(timestamp) FROM property_details WHERE property_name = OLD.property_name),
+        latest_units = (SELECT available_units FROM property_details WHERE property_name = OLD.property_name
+                        ORDER BY timestamp DESC, id DESC LIMIT 1),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE property_name = OLD.property_name;
+END;
+
+-- 变化记录表（DETAILS_STORAGE=delta 时代替 property_details）：
+-- 只在楼盘待售套数与上次存储值不同时写一行，available_units 为 NULL 表示楼盘从列表中消失。
+-- 同名楼盘（同一项目的多个预售证）按在快照中的出现顺序用 slot 区分
+CREATE TABLE IF NOT EXISTS property_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    slot INTEGER NOT NULL DEFAULT 0,
+    available_units INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_property_changes_name
+ON property_changes(property_name, slot, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_property_changes_timestamp
+ON property_changes(timestamp);
+
+-- 快照内容（完整抓取结果）：压缩后单独存放，只在需要时按 record_id 读取，
+-- property_records.details 不再写入（旧数据仍可读取）
+CREATE TABLE IF NOT EXISTS property_snapshots (
+    record_id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_property_snapshots_timestamp
+ON property_snapshots(timestamp);
+"""
+
+# 与 trg_property_projects 相同的维度表更新（delta 模式下不写 property_details，由 replace_day 直接执行）
+SQLITE_UPSERT_PROJECT = """
+INSERT INTO property_projects (property_name, first_seen, last_seen, latest_units)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(property_name) DO UPDATE SET
+    first_seen = MIN(first_seen, excluded.first_seen),
+    latest_units = CASE WHEN excluded.last_seen >= last_seen THEN excluded.latest_units ELSE latest_units END,
+    last_seen = MAX(last_seen, excluded.last_seen),
+    updated_at = CURRENT_TIMESTAMP
+"""
+
+# 每个 (楼盘, slot) 的最后一条变化，即最新快照中的状态
+SQLITE_CURRENT_STATE = """
+SELECT property_name, slot, available_units FROM (
+    SELECT property_name, slot, available_units,
+           ROW_NUMBER() OVER (PARTITION BY property_name, slot ORDER BY timestamp DESC, id DESC) AS rn
+    FROM property_changes
+)
+WHERE rn = 1 AND available_units IS NOT NULL
+ORDER BY property_name, slot
+"""
+
+# 最新一次快照的明细（按写入顺序，与 _snapshot_slots 的 slot 编号一致）
+SQLITE_LATEST_SNAPSHOT = """
+SELECT property_name, available_units FROM property_details
+WHERE timestamp = (SELECT MAX(timestamp) FROM property_details)
+ORDER BY id
+"""
+
+# 维度表为空时从已有历史数据回填
+SQLITE_BACKFILL_PROJECTS = """
+INSERT INTO property_projects (property_name, first_seen, last_seen, latest_units)
+SELECT d.property_name, MIN(d.timestamp), MAX(d.timestamp),
+       (SELECT l.available_units FROM property_details l
+        WHERE l.property_name = d.property_name
+        ORDER BY l.timestamp DESC, l.id DESC LIMIT 1)
+FROM property_details d
+GROUP BY d.property_name
+"""
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'properties.db')
+
+# property_snapshots.payload 的编码：UTF-8 JSON 经 zlib 压缩（Supabase 中再做 base64）
+SNAPSHOT_ENCODING = 'zlib-json'
+
+# 楼盘明细的存储方式：full 为每次快照每个楼盘一行（property_details），
+# delta 为只记录变化（property_changes），读取时按快照时间重建完整的每日序列
+DETAILS_MODES = ('full', 'delta')
+
+
+class StorageBackend(ABC):
+    """存储引擎接口：只负责行的读写，业务逻辑留在 Database 中"""
+
+    name = 'base'
+    details_mode = 'full'
+
+    @abstractmethod
+    def verify_schema(self):
+        """验证（或创建）表结构，失败时抛出异常"""
+
+    @abstractmethod
+    def replace_day(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        """用一份新快照整体替换 [day_start, day_end) 内的数据（原子操作，可重复执行）
+
+        day_start == day_end 时范围为空，只追加新快照（日内采样）。
+
+        返回 {'record_id', 'written', 'changed', 'unchanged', 'removed'}：
+        written 为写入的明细行数，changed/unchanged 为与删除后剩余的最新快照相比变化/未变的行数
+        （同名楼盘按出现顺序编号 slot 后逐个比较），removed 为被替换掉的当天旧明细行数。
+        """
+
+    @abstractmethod
+    def select_records(self, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """按时间升序返回主记录（timestamp, available_units, total_projects）
+
+        start/end 为 timestamp 的半开区间 [start, end)；limit/offset 作用于排序后的结果（分页）。
+        """
+
+    @abstractmethod
+    def select_latest_record(self) -> Optional[Dict]:
+        """返回最新创建的主记录（id, timestamp, available_units, total_projects，不含快照内容）"""
+
+    @abstractmethod
+    def select_record_details(self, record_id) -> Optional[Dict]:
+        """返回主记录对应的快照内容（保存时的 details），没有时返回 None"""
+
+    @abstractmethod
+    def select_property_names(self) -> List[str]:
+        """返回去重后的楼盘名称（扫描 property_details，仅在维度表不可用时使用）"""
+
+    @abstractmethod
+    def select_projects(self) -> List[Dict]:
+        """按名称返回楼盘维度表（property_name, first_seen, last_seen, latest_units）"""
+
+    @abstractmethod
+    def select_details(self, property_names: Optional[List[str]] = None,
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """按 (property_name, timestamp) 升序返回楼盘详细记录
+
+        property_names 为 None 时不按名称过滤；start/end 为 timestamp 的半开区间 [start, end)；
+        limit/offset 作用于排序后的结果（分页）。
+        每行包含 property_name, timestamp, available_units。
+        """
+
+    @abstractmethod
+    def select_latest_details(self) -> List[Dict]:
+        """返回最新一次快照中所有楼盘的 property_name, available_units（按名称排序）"""
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase（PostgREST）存储"""
+
+    name = 'supabase'
+
+    def __init__(self, supabase_url: str, supabase_key: str, details_mode: str = 'full'):
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.details_mode = details_mode
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+        self._changes_ready = details_mode != 'delta'
+        self._changes_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """首次查询时创建客户端（导入 supabase 较慢），同一进程的所有线程共用一个客户端及其连接池；
+        fork 出的子进程不沿用父进程的连接，重新创建"""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._client_lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    from supabase import create_client
+                    self._client = create_client(self.supabase_url, self.supabase_key)
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def _fetch_all_rows(self, build_query, page_size: int = 1000,
+                        offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """分页拉取查询从 offset 开始的全部结果（最多 limit 行；PostgREST 单次请求默认最多返回 1000 行）"""
+        rows = []
+        while limit is None or len(rows) < limit:
+            size = page_size if limit is None else min(page_size, limit - len(rows))
+            result = build_query().range(offset, offset + size - 1).execute()
+            batch = result.data or []
+            rows.extend(batch)
+            if len(batch) < size:
+                break
+            offset += size
+        return rows
+
+    def verify_schema(self):
+        # 尝试查询表是否存在（通过查询来验证）
+        self.client.table('property_records').select('id').limit(1).execute()
+        self.client.table('property_details').select('id').limit(1).execute()
+        if self.details_mode == 'delta':
+            result = self.client.table('property_changes').select('id').limit(1).execute()
+            if not result.data:
+                self._migrate_to_changes()
+            self._changes_ready = True
+
+    def _ensure_changes(self):
+        """delta 模式读写 property_changes 之前确保已从 property_details 迁移（每个进程只检查一次）"""
+        if not self._changes_ready:
+            with self._changes_lock:
+                if not self._changes_ready:
+                    self.verify_schema()
+
+    def _migrate_to_changes(self):
+        """首次启用 delta 模式时，把 property_details 中的全量历史压缩写入 property_changes"""
+        snapshots = [row['timestamp'] for row in self.select_records()]
+        detail_rows = self._fetch_all_rows(lambda: self.client.table('property_details')
+            .select('property_name, timestamp, available_units')
+            .order('timestamp', desc=False)
+            .order('id', desc=False))
+        if not detail_rows:
+            return
+        changes = _compact_details(snapshots, detail_rows)
+        for i in range(0, len(changes), 1000):
+            self.client.table('property_changes').insert(changes[i:i + 1000]).execute()
+        print(f"已将 {len(detail_rows)} 条楼盘明细压缩为 {len(changes)} 条变化记录（property_details 保留不动）")
+
+    def replace_day(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        if self.details_mode == 'delta':
+            return self._replace_day_delta(day_start, day_end, record, detail_rows)
+        try:
+            # 一次 RPC：由数据库函数在同一事务中删除当天旧数据并写入新快照
+            result = self.client.rpc('replace_daily_snapshot', _snapshot_rpc_params(day_start, day_end, record, detail_rows)).execute()
+            return result.data
+        except Exception as e:
+            print(f"调用 replace_daily_snapshot 失败（请执行 supabase_schema.sql 创建该函数），改为分步写入: {e}")
+
+        return self._replace_day_stepwise(day_start, day_end, record, detail_rows)
+
+    def _replace_day_stepwise(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        """数据库函数不可用时的退路：按范围批量删除后再插入（非原子）"""
+        self.client.table('property_records').delete().gte('timestamp', day_start).lt('timestamp', day_end).execute()
+        removed = self.client.table('property_details').delete().gte('timestamp', day_start).lt('timestamp', day_end).execute()
+        # 删除当天数据后，剩余的最新快照即为与新快照比较的上一次状态（与 delta 模式相同，按 (楼盘, slot) 比较）
+        previous = _snapshot_slots(self._select_latest_snapshot())
+
+        record_id = self._insert_record(record)
+        written = 0
+        if record_id is not None and detail_rows:
+            details_result = self.client.table('property_details').insert(detail_rows).execute()
+            written = len(details_result.data) if details_result.data else 0
+
+        return _snapshot_stats(record_id, written, len(removed.data or []), previous, _snapshot_slots(detail_rows))
+
+    def _replace_day_delta(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        self._ensure_changes()
+        try:
+            # 一次 RPC：删除当天旧数据、与上次状态比较后只写入变化行，并更新维度表
+            result = self.client.rpc('replace_daily_snapshot_delta', _snapshot_rpc_params(day_start, day_end, record, detail_rows)).execute()
+            return result.data
+        except Exception as e:
+            print(f"调用 replace_daily_snapshot_delta 失败（请执行 supabase_schema.sql 创建该函数），改为分步写入: {e}")
+
+        # 退路（非原子）：删除当天数据后在本地计算变化行
+        self.client.table('property_records').delete().gte('timestamp', day_start).lt('timestamp', day_end).execute()
+        removed = self.client.table('property_changes').delete().gte('timestamp', day_start).lt('timestamp', day_end).execute()
+        if removed.data:
+            self._rollback_projects(day_start, detail_rows)
+        previous = {(row['property_name'], row['slot']): row['available_units'] for row in self._select_current_state()}
+        current = _snapshot_slots(detail_rows)
+        changes = _delta_changes(previous, current, record['timestamp'])
+
+        record_id = self._insert_record(record)
+        written = 0
+        if record_id is not None:
+            for i in range(0, len(changes), 1000):
+                changes_result = self.client.table('property_changes').insert(changes[i:i + 1000]).execute()
+                written += len(changes_result.data) if changes_result.data else 0
+            self._upsert_projects(record['timestamp'], detail_rows)
+
+        return _snapshot_stats(record_id, written, len(removed.data or []), previous, current)
+
+    def _insert_record(self, record: Dict):
+        """写入主记录，快照内容压缩后写入 property_snapshots；该表不存在时仍写入 details 列"""
+        details = record.get('details')
+        result = self.client.table('property_records').insert(dict(record, details=None)).execute()
+        record_id = result.data[0].get('id') if result.data else None
+        if record_id is None or details is None:
+            return record_id
+        try:
+            self.client.table('property_snapshots').insert({
+                'record_id': record_id,
+                'timestamp': record['timestamp'],
+                'encoding': SNAPSHOT_ENCODING,
+                'payload': _encode_details_text(details)
+            }).execute()
+        except Exception as e:
+            print(f"写入 property_snapshots 失败（请执行 supabase_schema.sql 创建该表），快照内容改存 details 列: {e}")
+            self.client.table('property_records').update({'details': details}).eq('id', record_id).execute()
+        return record_id
+
+    def _upsert_projects(self, timestamp: str, detail_rows: List[Dict]):
+        """按触发器 upsert_property_project 的规则更新维度表（同名楼盘以最后一条为准）"""
+        projects = {row['property_name']: row for row in self.select_projects()}
+        latest = {row['property_name']: row['available_units'] for row in detail_rows}
+        rows = []
+        for name, units in latest.items():
+            project = projects.get(name)
+            if project is None:
+                rows.append({'property_name': name, 'first_seen': timestamp, 'last_seen': timestamp, 'latest_units': units})
+            else:
+                rows.append({
+                    'property_name': name,
+                    'first_seen': min(project['first_seen'], timestamp),
+                    'last_seen': max(project['last_seen'], timestamp),
+                    'latest_units': units if timestamp >= project['last_seen'] else project['latest_units']
+                })
+        for i in range(0, len(rows), 1000):
+            self.client.table('property_projects').upsert(rows[i:i + 1000]).execute()
+
+    def _rollback_projects(self, day_start: str, detail_rows: List[Dict]):
+        """与 SQLiteBackend._rollback_projects 相同：删除变化记录后回退维度表中受影响的楼盘"""
+        self.client.table('property_projects').delete().gte('first_seen', day_start).execute()
+        current = {row['property_name'] for row in detail_rows}
+        names = [row['property_name'] for row in self._fetch_all_rows(lambda: self.client.table('property_projects')
+            .select('property_name')
+            .gte('last_seen', day_start)
+            .order('property_name', desc=False)) if row['property_name'] not in current]
+        if not names:
+            return
+        projects = _projects_from_rows(self._select_details_delta(names, None, None))
+        rows = list(projects.values())
+        for i in range(0, len(rows), 1000):
+            self.client.table('property_projects').upsert(rows[i:i + 1000]).execute()
+        missing = [name for name in names if name not in projects]
+        for i in range(0, len(missing), 100):
+            self.client.table('property_projects').delete().in_('property_name', missing[i:i + 100]).execute()
+
+    def _select_current_state(self) -> List[Dict]:
+        """每个 (楼盘, slot) 在最新快照中的待售套数（视图 property_current_state）"""
+        return self._fetch_all_rows(lambda: self.client.table('property_current_state')
+            .select('property_name, slot, available_units')
+            .not_.is_('available_units', 'null')
+            .order('property_name', desc=False)
+            .order('slot', desc=False))
+
+    def _select_latest_snapshot(self) -> List[Dict]:
+        """最新一次快照的明细（按写入顺序，与 _snapshot_slots 的 slot 编号一致）"""
+        latest = self.client.table('property_details')\
+            .select('timestamp')\
+            .order('timestamp', desc=True)\
+            .limit(1)\
+            .execute()
+        if not latest.data:
+            return []
+        return self._fetch_all_rows(lambda: self.client.table('property_details')
+            .select('property_name, available_units')
+            .eq('timestamp', latest.data[0]['timestamp'])
+            .order('id', desc=False))
+
+    def select_records(self, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        def build_query():
+            query = self.client.table('property_records')\
+                .select('timestamp, available_units, total_projects')
+            if start is not None:
+                query = query.gte('timestamp', start)
+            if end is not None:
+                query = query.lt('timestamp', end)
+            return query.order('timestamp', desc=False)
+
+        return self._fetch_all_rows(build_query, offset=offset, limit=limit)
+
+    def select_latest_record(self) -> Optional[Dict]:
+        result = self.client.table('property_records')\
+            .select('id, timestamp, available_units, total_projects')\
+            .order('created_at', desc=True)\
+            .limit(1)\
+            .execute()
+
+        if not result.data:
+            return None
+        return result.data[0]
+
+    def select_record_details(self, record_id) -> Optional[Dict]:
+        try:
+            result = self.client.table('property_snapshots')\
+                .select('encoding, payload')\
+                .eq('record_id', record_id)\
+                .execute()
+            if result.data:
+                row = result.data[0]
+                return _decode_details(row['encoding'], base64.b64decode(row['payload']))
+        except Exception as e:
+            print(f"读取 property_snapshots 失败，改为读取 details 列: {e}")
+
+        # 拆分之前保存的记录，快照内容仍在 details 列中
+        result = self.client.table('property_records').select('details').eq('id', record_id).execute()
+        details = result.data[0].get('details') if result.data else None
+        return json.loads(details) if isinstance(details, str) else details
+
+    def select_property_names(self) -> List[str]:
+        table = 'property_changes' if self.details_mode == 'delta' else 'property_details'
+        # PostgREST 单次最多返回 1000 行：按 (property_name, id) 排序后分页拉取全部名称再去重
+        rows = self._fetch_all_rows(lambda: self.client.table(table)
+            .select('property_name')
+            .order('property_name', desc=False)
+            .order('id', desc=False))
+        return list(dict.fromkeys(row['property_name'] for row in rows))
+
+    def select_projects(self) -> List[Dict]:
+        return self._fetch_all_rows(lambda: self.client.table('property_projects')
+            .select('property_name, first_seen, last_seen, latest_units')
+            .order('property_name', desc=False))
+
+    def select_details(self, property_names: Optional[List[str]] = None,
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        if self.details_mode == 'delta':
+            # 完整序列由变化记录展开得到，只能展开后再分页
+            return _page(self._select_details_delta(property_names, start, end), limit, offset)
+
+        def build_query(names_chunk=None):
+            query = self.client.table('property_details')\
+                .select('property_name, timestamp, available_units')
+            if names_chunk is not None:
+                query = query.in_('property_name', names_chunk)
+            if start is not None:
+                query = query.gte('timestamp', start)
+            if end is not None:
+                query = query.lt('timestamp', end)
+            return query\
+                .order('property_name', desc=False)\
+                .order('timestamp', desc=False)\
+                .order('id', desc=False)
+
+        unique_names = sorted(set(property_names)) if property_names is not None else None
+        if unique_names is None or len(unique_names) <= 100:
+            return self._fetch_all_rows(lambda: build_query(unique_names), offset=offset, limit=limit)
+
+        # 名称列表较长时分批过滤，避免请求 URL 过长
+        rows = []
+        for i in range(0, len(unique_names), 100):
+            chunk = unique_names[i:i + 100]
+            rows.extend(self._fetch_all_rows(lambda: build_query(chunk)))
+            if limit is not None and len(rows) >= offset + limit:
+                break
+        return _page(rows, limit, offset)
+
+    def _select_details_delta(self, property_names: Optional[List[str]], start: Optional[str], end: Optional[str]) -> List[Dict]:
+        """读取 end 之前的变化记录，再按 [start, end) 内的快照时间展开为完整序列"""
+        self._ensure_changes()
+
+        def build_snapshot_query():
+            query = self.client.table('property_records').select('timestamp')
+            if start is not None:
+                query = query.gte('timestamp', start)
+            if end is not None:
+                query = query.lt('timestamp', end)
+            return query.order('timestamp', desc=False)
+
+        def build_query(names_chunk=None):
+            query = self.client.table('property_changes')\
+                .select('property_name, slot, timestamp, available_units')
+            if names_chunk is not None:
+                query = query.in_('property_name', names_chunk)
+            if end is not None:
+                query = query.lt('timestamp', end)
+            return query\
+                .order('property_name', desc=False)\
+                .order('slot', desc=False)\
+                .order('timestamp', desc=False)\
+                .order('id', desc=False)
+
+        snapshots = [row['timestamp'] for row in self._fetch_all_rows(build_snapshot_query)]
+        if property_names is None:
+            return _expand_changes(self._fetch_all_rows(build_query), snapshots)
+
+        unique_names = sorted(set(property_names))
+        rows = []
+        for i in range(0, len(unique_names), 100):
+            chunk = unique_names[i:i + 100]
+            rows.extend(_expand_changes(self._fetch_all_rows(lambda: build_query(chunk)), snapshots))
+        return rows
+
+    def select_latest_details(self) -> List[Dict]:
+        if self.details_mode == 'delta':
+            self._ensure_changes()
+            return [
+                {'property_name': row['property_name'], 'available_units': row['available_units']}
+                for row in self._select_current_state()
+            ]
+
+        # 先获取最新时间戳
+        latest_result = self.client.table('property_details')\
+            .select('timestamp')\
+            .order('created_at', desc=True)\
+            .limit(1)\
+            .execute()
+
+        if not latest_result.data:
+            return []
+
+        latest_time = latest_result.data[0]['timestamp']
+
+        # 获取该时间戳的所有楼盘数据
+        return self._fetch_all_rows(lambda: self.client.table('property_details')
+            .select('property_name, available_units')
+            .eq('timestamp', latest_time)
+            .order('property_name', desc=False))
+
+
+class SQLiteBackend(StorageBackend):
+    """本地 SQLite 存储（WAL 模式，每个线程一个连接）
+
+    所有 SQL 都是固定文本 + 参数绑定，sqlite3 的语句缓存会复用已编译的语句。
+    表结构在本进程第一次打开连接时自动创建，之后不再检查。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path: Optional[str] = None, details_mode: str = 'full'):
+        self.db_path = db_path or os.environ.get('DB_PATH') or DEFAULT_SQLITE_PATH
+        self.details_mode = details_mode
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            # WAL 允许读写并发，多个 gunicorn worker 读时不会互相阻塞
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        self.verify_schema()  # 本线程的连接已登记，verify_schema 中不会再进入这里
+                        self._schema_ready = True
+        return conn
+
+    def verify_schema(self):
+        with self.conn:
+            self.conn.executescript(SQLITE_SCHEMA)
+            if self.conn.execute('SELECT 1 FROM property_projects LIMIT 1').fetchone() is None:
+                self.conn.execute(SQLITE_BACKFILL_PROJECTS)
+            if self.details_mode == 'delta' and self.conn.execute('SELECT 1 FROM property_changes LIMIT 1').fetchone() is None:
+                self._migrate_to_changes()
+
+    def _migrate_to_changes(self):
+        """首次启用 delta 模式时，把 property_details 中的全量历史压缩写入 property_changes（调用方持有事务）"""
+        detail_rows = [dict(row) for row in self.conn.execute(
+            'SELECT property_name, timestamp, available_units FROM property_details ORDER BY timestamp, id'
+        )]
+        if not detail_rows:
+            return
+        snapshots = [row['timestamp'] for row in self.select_records()]
+        changes = _compact_details(snapshots, detail_rows)
+        self.conn.executemany(
+            'INSERT INTO property_changes (timestamp, property_name, slot, available_units) VALUES (?, ?, ?, ?)',
+            [(row['timestamp'], row['property_name'], row['slot'], row['available_units']) for row in changes]
+        )
+        print(f"已将 {len(detail_rows)} 条楼盘明细压缩为 {len(changes)} 条变化记录（property_details 保留不动）")
+
+    def _insert_record(self, record: Dict) -> int:
+        """写入主记录，快照内容压缩后写入 property_snapshots（调用方持有事务）"""
+        conn = self.conn
+        record_id = conn.execute(
+            'INSERT INTO property_records (timestamp, available_units, total_projects, details) '
+            'VALUES (?, ?, ?, NULL)',
+            (record['timestamp'], record['available_units'], record.get('total_projects', 0))
+        ).lastrowid
+        details = record.get('details')
+        if details is not None:
+            conn.execute(
+                'INSERT INTO property_snapshots (record_id, timestamp, encoding, payload) VALUES (?, ?, ?, ?)',
+                (record_id, record['timestamp'], SNAPSHOT_ENCODING, _encode_details(details))
+            )
+        return record_id
+
+    def replace_day(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        if self.details_mode == 'delta':
+            return self._replace_day_delta(day_start, day_end, record, detail_rows)
+        conn = self.conn
+        with conn:
+            conn.execute('DELETE FROM property_records WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end))
+            conn.execute('DELETE FROM property_snapshots WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end))
+            removed = conn.execute(
+                'DELETE FROM property_details WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end)
+            ).rowcount
+            # 删除当天数据后，剩余的最新快照即为上一次快照的状态（与 delta 模式相同，按 (楼盘, slot) 比较）
+            previous = _snapshot_slots([dict(row) for row in conn.execute(SQLITE_LATEST_SNAPSHOT)])
+            record_id = self._insert_record(record)
+            conn.executemany(
+                'INSERT INTO property_details (timestamp, property_name, available_units) VALUES (?, ?, ?)',
+                [(row['timestamp'], row['property_name'], row['available_units']) for row in detail_rows]
+            )
+        return _snapshot_stats(record_id, len(detail_rows), removed, previous, _snapshot_slots(detail_rows))
+
+    def _replace_day_delta(self, day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+        conn = self.conn
+        with conn:
+            conn.execute('DELETE FROM property_records WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end))
+            conn.execute('DELETE FROM property_snapshots WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end))
+            removed = conn.execute(
+                'DELETE FROM property_changes WHERE timestamp >= ? AND timestamp < ?', (day_start, day_end)
+            ).rowcount
+            if removed:
+                self._rollback_projects(day_start, detail_rows)
+            # 删除当天数据后，各 (楼盘, slot) 的最后一条变化即为上一次快照的状态
+            previous = {(row[0], row[1]): row[2] for row in conn.execute(SQLITE_CURRENT_STATE)}
+            current = _snapshot_slots(detail_rows)
+            changes = _delta_changes(previous, current, record['timestamp'])
+
+            record_id = self._insert_record(record)
+            conn.executemany(
+                'INSERT INTO property_changes (timestamp, property_name, slot, available_units) VALUES (?, ?, ?, ?)',
+                [(row['timestamp'], row['property_name'], row['slot'], row['available_units']) for row in changes]
+            )
+            conn.executemany(
+                SQLITE_UPSERT_PROJECT,
+                [(row['property_name'], row['timestamp'], row['timestamp'], row['available_units']) for row in detail_rows]
+            )
+        return _snapshot_stats(record_id, len(changes), removed, previous, current)
+
+    def _rollback_projects(self, day_start: str, detail_rows: List[Dict]):
+        """delta 模式删除 day_start 之后的变化记录后回退维度表（调用方持有事务）
+
+        只在被删除的数据中出现过的楼盘从维度表删除；不在新快照中、但被删除的数据更新过的楼盘
+        按剩余的历史重新计算；新快照中的楼盘随后由 upsert 更新。
+        """
+        conn = self.conn
+        conn.execute('DELETE FROM property_projects WHERE first_seen >= ?', (day_start,))
+        current = {row['property_name'] for row in detail_rows}
+        names = [row[0] for row in conn.execute(
+            'SELECT property_name FROM property_projects WHERE last_seen >= ?', (day_start,)
+        ) if row[0] not in current]
+        if not names:
+            return
+        projects = _projects_from_rows(self._select_details_delta(names, None, None))
+        conn.executemany(
+            'UPDATE property_projects SET last_seen = ?, latest_units = ?, updated_at = CURRENT_TIMESTAMP '
+            'WHERE property_name = ?',
+            [(project['last_seen'], project['latest_units'], name) for name, project in projects.items()]
+        )
+        conn.executemany(
+            'DELETE FROM property_projects WHERE property_name = ?',
+            [(name,) for name in names if name not in projects]
+        )
+
+    def select_records(self, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        # 时间范围和分页都在查询中完成，走 idx_property_records_timestamp 索引
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        cursor = self.conn.execute(
+            f'SELECT timestamp, available_units, total_projects FROM property_records{where} '
+            'ORDER BY timestamp LIMIT ? OFFSET ?',
+            params + [-1 if limit is None else limit, offset]  # LIMIT -1 表示不限
+        )
+        return [dict(row) for row in cursor]
+
+    def select_latest_record(self) -> Optional[Dict]:
+        row = self.conn.execute(
+            'SELECT id, timestamp, available_units, total_projects FROM property_records '
+            'ORDER BY id DESC LIMIT 1'
+        ).fetchone()
+        return dict(row) if row else None
+
+    def select_record_details(self, record_id) -> Optional[Dict]:
+        row = self.conn.execute(
+            'SELECT encoding, payload FROM property_snapshots WHERE record_id = ?', (record_id,)
+        ).fetchone()
+        if row:
+            return _decode_details(row['encoding'], row['payload'])
+
+        # 拆分之前保存的记录，快照内容仍在 details 列中
+        row = self.conn.execute('SELECT details FROM property_records WHERE id = ?', (record_id,)).fetchone()
+        return json.loads(row['details']) if row and row['details'] else None
+
+    def select_property_names(self) -> List[str]:
+        # DISTINCT 可直接走 idx_property_name / idx_property_changes_name 索引
+        if self.details_mode == 'delta':
+            cursor = self.conn.execute('SELECT DISTINCT property_name FROM property_changes')
+        else:
+            cursor = self.conn.execute('SELECT DISTINCT property_name FROM property_details')
+        return [row[0] for row in cursor]
+
+    def select_projects(self) -> List[Dict]:
+        cursor = self.conn.execute(
+            'SELECT property_name, first_seen, last_seen, latest_units FROM property_projects ORDER BY property_name'
+        )
+        return [dict(row) for row in cursor]
+
+    def select_details(self, property_names: Optional[List[str]] = None,
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        if self.details_mode == 'delta':
+            # 完整序列由变化记录展开得到，只能展开后再分页
+            return _page(self._select_details_delta(property_names, start, end), limit, offset)
+
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        range_sql = ''.join(f' AND {c}' for c in conditions)
+
+        if property_names is None:
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+            cursor = self.conn.execute(
+                'SELECT property_name, timestamp, available_units FROM property_details'
+                f'{where} ORDER BY property_name, timestamp, id LIMIT ? OFFSET ?',
+                params + [-1 if limit is None else limit, offset]
+            )
+            return [dict(row) for row in cursor]
+
+        # 逐个楼盘走 (property_name, timestamp) 索引，语句文本固定可被缓存复用；
+        # 每个楼盘最多读取 offset + limit 行，按顺序读够一页后不再查询后面的楼盘
+        sql = ('SELECT property_name, timestamp, available_units FROM property_details '
+               f'WHERE property_name = ?{range_sql} ORDER BY timestamp, id LIMIT ?')
+        per_name = -1 if limit is None else offset + limit
+        rows = chain.from_iterable(
+            self.conn.execute(sql, [name] + params + [per_name]) for name in sorted(set(property_names))
+        )
+        return [dict(row) for row in islice(rows, offset, None if limit is None else offset + limit)]
+
+    def _select_details_delta(self, property_names: Optional[List[str]], start: Optional[str], end: Optional[str]) -> List[Dict]:
+        """读取 end 之前的变化记录，再按 [start, end) 内的快照时间展开为完整序列"""
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('timestamp >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        snapshots = [row[0] for row in self.conn.execute(
+            f'SELECT timestamp FROM property_records{where} ORDER BY timestamp', params
+        )]
+
+        # start 之前的变化也要读取，用于确定区间开始时的状态
+        end_params = [end] if end is not None else []
+        if property_names is None:
+            cursor = self.conn.execute(
+                'SELECT property_name, slot, timestamp, available_units FROM property_changes'
+                f"{' WHERE timestamp < ?' if end is not None else ''} ORDER BY property_name, slot, timestamp, id",
+                end_params
+            )
+            return _expand_changes([dict(row) for row in cursor], snapshots)
+
+        sql = ('SELECT property_name, slot, timestamp, available_units FROM property_changes '
+               f"WHERE property_name = ?{' AND timestamp < ?' if end is not None else ''} ORDER BY slot, timestamp, id")
+        rows = []
+        for name in sorted(set(property_names)):
+            changes = [dict(row) for row in self.conn.execute(sql, [name] + end_params)]
+            rows.extend(_expand_changes(changes, snapshots))
+        return rows
+
+    def select_latest_details(self) -> List[Dict]:
+        if self.details_mode == 'delta':
+            return [
+                {'property_name': row['property_name'], 'available_units': row['available_units']}
+                for row in self.conn.execute(SQLITE_CURRENT_STATE)
+            ]
+
+        cursor = self.conn.execute(
+            'SELECT property_name, available_units FROM property_details '
+            'WHERE timestamp = (SELECT timestamp FROM property_details ORDER BY id DESC LIMIT 1) '
+            'ORDER BY property_name'
+        )
+        return [dict(row) for row in cursor]
+
+
+def _projects_from_rows(rows: List[Dict]) -> Dict[str, Dict]:
+    """按 (property_name, timestamp) 排序的明细汇总为维度表的行（同一时间的同名楼盘以最后一条为准）"""
+    projects = {}
+    for row in rows:
+        name = row['property_name']
+        project = projects.get(name)
+        if project is None:
+            projects[name] = {'property_name': name, 'first_seen': row['timestamp'],
+                              'last_seen': row['timestamp'], 'latest_units': row['available_units']}
+        else:
+            project['last_seen'] = row['timestamp']
+            project['latest_units'] = row['available_units']
+    return projects
+
+
+def _page(rows: List[Dict], limit: Optional[int], offset: int) -> List[Dict]:
+    """排序后结果中的一页"""
+    return rows[offset:] if limit is None else rows[offset:offset + limit]
+
+
+def _encode_details(details: Dict) -> bytes:
+    return zlib.compress(json.dumps(details, ensure_ascii=False).encode('utf-8'))
+
+
+def _encode_details_text(details: Optional[Dict]) -> Optional[str]:
+    """快照内容编码为 base64 文本（Supabase 的 TEXT 列）"""
+    if details is None:
+        return None
+    return base64.b64encode(_encode_details(details)).decode('ascii')
+
+
+def _decode_details(encoding: str, payload: bytes) -> Dict:
+    if encoding != SNAPSHOT_ENCODING:
+        raise ValueError(f"未知的快照编码: {encoding}")
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def _snapshot_rpc_params(day_start: str, day_end: str, record: Dict, detail_rows: List[Dict]) -> Dict:
+    """replace_daily_snapshot(_delta) 的参数；替换范围为空（日内采样）时传 p_append，只追加不删除当天数据"""
+    params = {
+        'p_timestamp': record['timestamp'],
+        'p_available_units': record['available_units'],
+        'p_total_projects': record.get('total_projects', 0),
+        'p_payload': _encode_details_text(record.get('details')),
+        'p_properties': [
+            {'property_name': row['property_name'], 'available_units': row['available_units']}
+            for row in detail_rows
+        ]
+    }
+    if day_start == day_end:
+        params['p_append'] = True
+    return params
+
+
+def _snapshot_slots(detail_rows: List[Dict]) -> Dict[Tuple[str, int], int]:
+    """把一次快照转为 {(楼盘名称, slot): 待售套数}，同名楼盘按出现顺序编号 0, 1, ..."""
+    current = {}
+    counts = {}
+    for row in detail_rows:
+        name = row['property_name']
+        slot = counts.get(name, 0)
+        counts[name] = slot + 1
+        current[(name, slot)] = row['available_units']
+    return current
+
+
+def _delta_changes(previous: Dict[Tuple[str, int], int], current: Dict[Tuple[str, int], int], timestamp: str) -> List[Dict]:
+    """与上次状态相比需要写入的变化行：新出现或套数变化的楼盘，以及消失的楼盘（available_units 为 None）"""
+    changes = [
+        {'timestamp': timestamp, 'property_name': name, 'slot': slot, 'available_units': units}
+        for (name, slot), units in current.items()
+        if previous.get((name, slot)) != units
+    ]
+    changes.extend(
+        {'timestamp': timestamp, 'property_name': name, 'slot': slot, 'available_units': None}
+        for (name, slot) in previous
+        if (name, slot) not in current
+    )
+    return changes
+
+
+def _snapshot_stats(record_id, written: int, removed: int, previous: Dict, current: Dict) -> Dict:
+    """按 (楼盘名称, slot) 与上一次快照比较，统计新快照中变化/未变的行数"""
+    unchanged = sum(1 for key, units in current.items() if previous.get(key) == units)
+    return {
+        'record_id': record_id,
+        'written': written,
+        'changed': len(current) - unchanged,
+        'unchanged': unchanged,
+        'removed': removed
+    }
+
+
+def _compact_details(snapshots: List[str], detail_rows: List[Dict]) -> List[Dict]:
+    """把按 (timestamp, id) 排序的全量明细压缩为变化行，snapshots 为升序的快照时间"""
+    by_timestamp = {}
+    for row in detail_rows:
+        by_timestamp.setdefault(row['timestamp'], []).append(row)
+
+    changes = []
+    previous = {}
+    for timestamp in snapshots:
+        current = _snapshot_slots(by_timestamp.get(timestamp, []))
+        changes.extend(_delta_changes(previous, current, timestamp))
+        previous = current
+    return changes
+
+
+def _expand_changes(changes: List[Dict], snapshots: List[str]) -> List[Dict]:
+    """按快照时间把变化行展开为完整序列（与 full 模式的 select_details 结果一致）
+
+    changes 按 (property_name, slot, timestamp, id) 排序，需包含 snapshots 第一个时间之前的变化以确定初始状态；
+    每个快照时间输出该楼盘各 slot 当时的套数（已消失的不输出）。
+    """
+    rows = []
+    for name, group in groupby(changes, key=itemgetter('property_name')):
+        slots = []
+        for slot, slot_changes in groupby(group, key=itemgetter('slot')):
+            slots.append(list(slot_changes))
+        positions = [0] * len(slots)
+        states = [None] * len(slots)
+        for timestamp in snapshots:
+            for i, slot_changes in enumerate(slots):
+                position = positions[i]
+                while position < len(slot_changes) and slot_changes[position]['timestamp'] <= timestamp:
+                    states[i] = slot_changes[position]['available_units']
+                    position += 1
+                positions[i] = position
+                if states[i] is not None:
+                    rows.append({'property_name': name, 'timestamp': timestamp, 'available_units': states[i]})
+    return rows
+
+
+def create_backend(backend: Optional[str] = None, **kwargs) -> StorageBackend:
+    """根据参数或环境变量创建存储引擎
+
+    DB_BACKEND: supabase（默认）/ sqlite
+    DETAILS_STORAGE: full（默认）/ delta，楼盘明细的存储方式
+    """
+    backend = (backend or os.environ.get('DB_BACKEND', 'supabase')).lower()
+    details_mode = (kwargs.get('details_mode') or os.environ.get('DETAILS_STORAGE', 'full')).lower()
+    if details_mode not in DETAILS_MODES:
+        raise ValueError(f"未知的明细存储方式: {details_mode}（可选 full / delta）")
+    if backend == 'sqlite':
+        return SQLiteBackend(kwargs.get('db_path'), details_mode)
+    if backend == 'supabase':
+        return SupabaseBackend(kwargs['supabase_url'], kwargs['supabase_key'], details_mode)
+    raise ValueError(f"未知的存储引擎: {backend}（可选 supabase / sqlite）")
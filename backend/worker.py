@@ -0,0 +1,113 @@
+"""
+后台刷新 worker：独立于 Web 服务的进程，执行任务队列中的刷新任务和每天的定时抓取
+
+使用方法：
+    python -m backend.worker
+Web 服务的 /api/refresh 只把任务放入队列（backend/jobs.py），由这里认领执行；
+抓取和解析不再占用 gunicorn worker 的线程和 GIL，Web worker 重启也不会中断正在执行的任务。
+定时抓取的时间由自适应采样计划决定（backend/sampling.py）。
+"""
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+# 添加父目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+# 与 gunicorn.conf.py 相同的 Prometheus 多进程目录：须在导入 prometheus_client（backend.metrics）之前设置，
+# 抓取等指标才会写入该目录并汇总到同一台主机上 Web 服务的 /metrics
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(project_root, 'data', 'prometheus'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from backend.database import Database
+from backend.jobs import create_registry
+from backend.publish import SnapshotPublisher
+from backend.refresh import run_refresh_job
+from backend.sampling import SamplingPlan
+
+# 计算采样计划时读取的最近任务数
+PLAN_HISTORY = 20
+
+
+class RefreshWorker:
+    """轮询任务队列并执行刷新任务
+
+    WORKER_POLL_INTERVAL: 检查队列的间隔秒数（默认 2）
+    WORKER_RUN_ON_START: 启动时是否无条件立即抓取一次（默认 0，错过的定时抓取总会补抓）
+    定时抓取的时间见 SamplingPlan
+    """
+
+    def __init__(self):
+        self.db = Database()
+        self.publisher = SnapshotPublisher()
+        self.jobs = create_registry(self.db)
+        self.poll_interval = float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+        self.run_on_start = os.environ.get('WORKER_RUN_ON_START', '0') != '0'
+        self.plan = SamplingPlan()
+        self.next_run = None  # (计划时间, 原因)
+        self.started_at = datetime.now().isoformat()
+        self._stopping = False
+
+    def enqueue_scheduled(self):
+        """定时抓取：放入队列（已有任务排队或运行时合并）"""
+        job, created = self.jobs.enqueue('scheduler')
+        if created:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 定时抓取任务 {job['id']} 已入队")
+        else:
+            print(f"已有刷新任务 {job['id']} 排队或运行中，本次定时抓取合并到该任务")
+
+    def plan_next_run(self):
+        """按任务登记表的最近任务重新计算下一次定时抓取（计划变化时打印）"""
+        next_run = self.plan.next_run(self.jobs.history(PLAN_HISTORY))
+        if next_run and next_run != self.next_run:
+            print(f"下一次定时抓取: {next_run[0].strftime('%Y-%m-%d %H:%M:%S')}（{next_run[1]}）")
+        self.next_run = next_run
+        return next_run
+
+    def run_pending_job(self) -> bool:
+        """认领并执行一个排队中的任务，没有任务时返回 False"""
+        job = self.jobs.claim()
+        if job is None:
+            return False
+        print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始执行刷新任务 {job['id']}（{job['trigger']}）")
+        finished = run_refresh_job(job['id'], self.jobs, self.db, self.publisher)
+        if finished:
+            print(f"刷新任务 {job['id']} 结束: {finished['status']}，{finished['current_step']}")
+        return True
+
+    def stop(self, *_):
+        """收到 SIGTERM/SIGINT 后执行完当前任务再退出"""
+        print("收到停止信号，当前任务结束后退出")
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # 启动时验证（SQLite 为创建）表结构；Web 服务不在启动时连接数据库
+        self.db.init_db()
+        self.jobs.verify_schema()
+        if self.run_on_start:
+            self.enqueue_scheduled()
+        print(f"\n后台刷新 worker 已启动（{self.jobs.owner}），每天{self.plan.refresh_time}后至少抓取一次，"
+              f"采样间隔 {self.plan.min_interval:g}~{self.plan.max_interval:g} 秒，"
+              f"每 {self.poll_interval:g} 秒检查一次任务队列")
+
+        try:
+            while not self._stopping:
+                self.jobs.worker_heartbeat(self.started_at)
+                next_run = self.plan_next_run()
+                if next_run and next_run[0] <= datetime.now():
+                    self.enqueue_scheduled()
+                if not self.run_pending_job():
+                    time.sleep(self.poll_interval)
+        finally:
+            self.jobs.worker_exit()
+            print("后台刷新 worker 已退出")
+
+
+if __name__ == '__main__':
+    RefreshWorker().run()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+基准测试：Database 各方法和 API 路由在大规模历史下的延迟、内存和响应大小
+使用方法：
+    python benchmarks/bench_database.py                          # 合成默认规模的数据（2000 个楼盘 × 5 年，缓存在 data/bench/）后测试
+    python benchmarks/bench_database.py --projects 200 --years 1 # 小规模
+    python benchmarks/bench_database.py --db data/properties.db  # 使用已有数据库（在副本上测试）
+    python benchmarks/bench_database.py --save-baseline          # 把结果保存为基线（默认 benchmarks/baseline.json）
+    python benchmarks/bench_database.py --baseline               # 与基线比较，变慢或内存增长超过阈值时退出码为 1
+每一项记录首次调用、最快和中位延迟，tracemalloc 峰值内存，以及结果的 JSON 字节数（路由为响应字节数）和 gzip 后字节数。
+查询缓存和静态数据发布在测试中关闭，测的是存储查询和计算本身；测试在数据库副本上进行，save_record 不会改动原文件。
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+DEFAULT_BASELINE = os.path.join(project_root, 'benchmarks', 'baseline.json')
+SYNTHETIC_DIR = os.path.join(project_root, 'data', 'bench')
+
+
+def _json_size(value) -> tuple:
+    data = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    return len(data), len(gzip.compress(data, compresslevel=6))
+
+
+def measure(func, repeat: int, size_of) -> dict:
+    """首次调用、最快和中位延迟（毫秒），峰值内存（KB）和结果大小"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # 不计入日志输出
+        return _measure(func, repeat, size_of)
+
+
+def _measure(func, repeat: int, size_of) -> dict:
+    started = time.perf_counter()
+    result = func()
+    first = time.perf_counter() - started
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    size, gzip_size = size_of(result)
+    return {
+        'first_ms': round(first * 1000, 2),
+        'best_ms': round(min(timings) * 1000, 2),
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'peak_kb': round(peak / 1024, 1),
+        'bytes': size,
+        'gzip_bytes': gzip_size
+    }
+
+
+def database_cases(db):
+    """(名称, 调用) 列表，覆盖 Database 的每个公开方法"""
+    latest = db.get_latest_properties()
+    names = [row['name'] for row in latest] or db.get_property_list()
+    sample = names[len(names) // 2] if names else ''
+    latest_date = datetime.fromisoformat(db.get_latest_record()['timestamp']).date()
+    month_ago = (latest_date - timedelta(days=30)).isoformat()
+    first_date = db.get_all_records()[0]['timestamp'][:10]
+    snapshot = {
+        'total_projects': len(latest),
+        'total_available_units': sum(row['available_units'] for row in latest),
+        'properties': [{'name': row['name'], 'available_units': row['available_units']} for row in latest]
+    }
+    return [
+        ('get_all_records', db.get_all_records),
+        ('get_all_records(30d)', lambda: db.get_all_records(start=month_ago)),
+        ('get_latest_record', db.get_latest_record),
+        ('get_latest_record(include_details)', lambda: db.get_latest_record(include_details=True)),
+        ('get_property_list', db.get_property_list),
+        ('get_projects', db.get_projects),
+        ('get_property_history', lambda: db.get_property_history(sample)),
+        ('get_property_history(30d)', lambda: db.get_property_history(sample, start=month_ago)),
+        ('get_property_history(limit=100)', lambda: db.get_property_history(sample, limit=100)),
+        ('get_records_series(week)', lambda: db.get_records_series('week')),
+        ('get_records_series(max_points=200)', lambda: db.get_records_series(max_points=200)),
+        ('get_property_series(month)', lambda: db.get_property_series(sample, 'month')),
+        ('get_property_series(day, max_points=200)', lambda: db.get_property_series(sample, 'day', 200)),
+        ('get_latest_properties', db.get_latest_properties),
+        ('get_sales_speed_ranking(30d)', lambda: db.get_sales_speed_ranking(month_ago, latest_date.isoformat())),
+        ('get_sales_speed_ranking(all)', lambda: db.get_sales_speed_ranking(first_date, latest_date.isoformat())),
+        ('get_properties_history(20)', lambda: db.get_properties_history(names[:20])),
+        ('get_properties_history(all)', lambda: db.get_properties_history(None)),
+        ('get_properties_history(all, columnar)', lambda: db.get_properties_history(None, columnar=True)),
+        # 最后执行：写入今天的快照（每次重复都替换同一天）
+        ('save_record', lambda: db.save_record(snapshot['total_available_units'], snapshot['total_projects'], snapshot)),
+    ], sample, month_ago, latest_date.isoformat()
+
+
+def route_cases(sample: str, month_ago: str, latest_date: str):
+    from urllib.parse import quote
+    return [
+        '/api/records',
+        '/api/latest',
+        '/api/latest?include=details',
+        '/api/properties',
+        '/api/projects',
+        f'/api/property/{quote(sample)}',
+        '/api/records?resolution=week',
+        f'/api/records?start={month_ago}',
+        f'/api/property/{quote(sample)}?start={month_ago}',
+        f'/api/property/{quote(sample)}?limit=100',
+        f'/api/property/{quote(sample)}?resolution=month',
+        f'/api/property/{quote(sample)}?max_points=200',
+        '/api/properties/latest',
+        '/api/properties/history?names=all',
+        '/api/properties/history?names=all&format=columnar',
+        f'/api/ranking/speed?start={month_ago}&end={latest_date}',
+        '/api/analytics/totals',
+        '/api/analytics/deltas',
+        '/api/analytics/top?by=sold&limit=25',
+        '/api/analytics/velocity?window=7',
+        f'/api/analytics/velocity?name={quote(sample)}&window=7',
+    ]
+
+
+def run(db_path: str, repeat: int) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='zhuhaibay-bench-')
+    try:
+        copy_path = os.path.join(work_dir, 'bench.db')
+        shutil.copy(db_path, copy_path)
+        # 必须在导入 backend 之前设置
+        os.environ.update({
+            'DB_BACKEND': 'sqlite',
+            'DB_PATH': copy_path,
+            'QUERY_CACHE_SIZE': '0',
+            'PUBLISH_STATIC': '0',
+            'JOBS_DB_PATH': os.path.join(work_dir, 'jobs.db'),
+            'QUERY_CACHE_GENERATION_PATH': os.path.join(work_dir, '.cache_generation'),
+        })
+        os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        import backend.api as api
+
+        results = {}
+        cases, sample, month_ago, latest_date = database_cases(api.db)
+        for name, func in cases:
+            results[f'db:{name}'] = measure(func, repeat, _json_size)
+            print(_format_row(f'db:{name}', results[f'db:{name}']))
+
+        client = api.app.test_client()
+
+        def response_size(response):
+            data = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f'状态码 {response.status_code}: {data[:200]!r}')
+            return len(data), len(gzip.compress(data, compresslevel=6))
+
+        for path in route_cases(sample, month_ago, latest_date):
+            results[f'api:{path}'] = measure(lambda: client.get(path), repeat, response_size)
+            print(_format_row(f'api:{path}', results[f'api:{path}']))
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _format_row(name: str, row: dict) -> str:
+    return (f"{name[:58]:58s} 首次 {row['first_ms']:9.1f} ms  最快 {row['best_ms']:9.1f} ms  "
+            f"中位 {row['median_ms']:9.1f} ms  内存 {row['peak_kb']:9.0f} KB  "
+            f"{row['bytes'] / 1024:8.0f} KB（gzip {row['gzip_bytes'] / 1024:6.0f} KB）")
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """返回回归列表：中位延迟或峰值内存超过基线 (1 + threshold) 倍，且延迟差大于 min_delta_ms"""
+    regressions = []
+    for name, row in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        if row['median_ms'] > base['median_ms'] * (1 + threshold) and row['median_ms'] - base['median_ms'] > min_delta_ms:
+            regressions.append(f"{name}: 中位延迟 {base['median_ms']} → {row['median_ms']} ms")
+        if row['peak_kb'] > base['peak_kb'] * (1 + threshold) and row['peak_kb'] - base['peak_kb'] > 64:
+            regressions.append(f"{name}: 峰值内存 {base['peak_kb']} → {row['peak_kb']} KB")
+        if row['bytes'] != base['bytes']:
+            print(f"  注意 {name}: 结果大小 {base['bytes']} → {row['bytes']} 字节（输出内容有变化）")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database 和 API 路由的大规模基准测试')
+    parser.add_argument('--db', help='使用已有的 SQLite 数据库（默认生成合成数据）')
+    parser.add_argument('--projects', type=int, default=2000, help='合成数据的楼盘数（默认 2000）')
+    parser.add_argument('--years', type=float, default=5, help='合成数据的年数（默认 5）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数（默认 5）')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE, help='与基线文件比较')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='把结果保存为基线文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定回归的增幅（默认 0.2，即 20%%）')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='延迟差小于此值时不算回归（默认 2 ms）')
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = args.db
+        scale = {'db': os.path.basename(args.db)}
+    else:
+        from benchmarks.synthetic import generate
+        db_path = os.path.join(SYNTHETIC_DIR, f'synthetic-{args.projects}x{args.years:g}y-s{args.seed}.db')
+        scale = {'projects': args.projects, 'years': args.years, 'seed': args.seed}
+        # 合成数据截至昨天；日期变化后重新生成，使“最近 30 天”等范围的数据量保持一致
+        marker = db_path + '.date'
+        today = date.today().isoformat()
+        if not os.path.exists(db_path) or not os.path.exists(marker) or open(marker).read() != today:
+            print(f"正在生成合成数据 {db_path} ...")
+            stats = generate(db_path, args.projects, args.years, args.seed)
+            with open(marker, 'w') as f:
+                f.write(today)
+            print(f"  {stats['projects']} 个楼盘，{stats['snapshots']} 次快照，{stats['details']} 条明细，耗时 {stats['seconds']} 秒")
+
+    print(f"数据库: {db_path}（{os.path.getsize(db_path) / 1024 / 1024:.1f} MB），每项重复 {args.repeat} 次\n")
+    results = run(db_path, args.repeat)
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'scale': scale,
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != scale:
+            print(f"\n注意：基线的数据规模 {baseline.get('scale')} 与本次 {scale} 不同")
+        print(f"\n与基线比较（{args.baseline}，{baseline.get('created_at')}）:")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for line in regressions:
+            print(f"  ✗ {line}")
+        if regressions:
+            exit_code = 1
+        else:
+            print("  ✓ 没有超过阈值的回归")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n已保存基线: {args.save_baseline}")
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
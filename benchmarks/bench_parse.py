@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+基准测试：比较 HTML 列表页的两种解析方式（BeautifulSoup 完整文档树 vs 流式 house-info 提取）
+使用方法：
+    python benchmarks/bench_parse.py                     # 使用合成的大页面（默认 5000 个楼盘）
+    python benchmarks/bench_parse.py --blocks 20000
+    python benchmarks/bench_parse.py page1.html page2.html   # 使用保存下来的真实页面
+每个页面都会先校验两种方式的解析结果完全一致，再分别计时。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from bs4 import BeautifulSoup
+from backend.scraper import PropertyScraper
+
+# 与真实页面结构一致的单个楼盘块，夹杂脚本、注释和实体
+BLOCK_TEMPLATE = '''
+<div class="house-info clearfix">
+  <div class="house-info-title">
+    <a href="/presale/{index}" class="overflow" title="{name}">{name}</a>
+    <!-- 预售证号 -->
+    <span class="tag">预售&nbsp;{index}</span>
+  </div>
+  <div class="house-info-main">
+    <table>
+      <tr><td>总套数：</td><td>{total}</td><td>已售：</td><td>{sold}</td></tr>
+      <tr><td>待售：</td><td>{available}</td><td>均价&lt;元/㎡&gt;</td><td>{price}</td></tr>
+    </table>
+    <script>var row = "{index}";</script>
+  </div>
+</div>
+'''
+
+# 会被名称过滤掉的垃圾数据
+JUNK_NAMES = ['20230040466', '/', '3栋', '440403004001GB00024', 'B区地下室（车位分割）']
+
+
+def synthesize_page(blocks: int, seed: int = 0) -> str:
+    """生成包含 blocks 个楼盘块的列表页"""
+    rng = random.Random(seed)
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>预售列表</title>',
+             '<style>.house-info{margin:0}</style></head><body><div class="list">']
+    for index in range(blocks):
+        name = rng.choice(JUNK_NAMES) if rng.random() < 0.05 else f'楼盘{index}号 花园'
+        total = rng.randint(50, 2000)
+        available = rng.randint(0, total)
+        parts.append(BLOCK_TEMPLATE.format(
+            index=index, name=name, total=total, sold=total - available,
+            available=available, price=rng.randint(15000, 60000)
+        ))
+    parts.append('<br><img src="/footer.png"></div></body></html>')
+    return ''.join(parts)
+
+
+def parse_bs4(scraper: PropertyScraper, html: str):
+    return scraper.parse_properties({'html': html, 'soup': BeautifulSoup(html, 'html.parser')})
+
+
+def parse_fast(scraper: PropertyScraper, html: str):
+    return scraper.parse_properties({'html': html})
+
+
+def best_time(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较 HTML 列表页解析方式的速度')
+    parser.add_argument('pages', nargs='*', help='保存下来的列表页 HTML 文件')
+    parser.add_argument('--blocks', type=int, default=5000, help='未指定页面时合成页面的楼盘块数')
+    parser.add_argument('--repeat', type=int, default=5, help='每种方式重复次数（取最快一次）')
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf-8') as f:
+                pages.append((path, f.read()))
+    else:
+        pages = [(f'合成页面（{args.blocks} 个楼盘）', synthesize_page(args.blocks))]
+
+    scraper = PropertyScraper()
+    for label, html in pages:
+        expected = parse_bs4(scraper, html)
+        actual = parse_fast(scraper, html)
+        if actual != expected:
+            print(f"✗ {label}: 解析结果不一致（bs4 {len(expected)} 条，fast {len(actual)} 条）")
+            sys.exit(1)
+
+        bs4_time = best_time(lambda: parse_bs4(scraper, html), args.repeat)
+        fast_time = best_time(lambda: parse_fast(scraper, html), args.repeat)
+        print(f"{label}: {len(html) / 1024:.0f} KB，解析出 {len(expected)} 个楼盘（结果一致）")
+        print(f"  bs4 : {bs4_time * 1000:8.1f} ms")
+        print(f"  fast: {fast_time * 1000:8.1f} ms  ({bs4_time / fast_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
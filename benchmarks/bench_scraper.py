@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+基准测试：对回放服务器端到端地运行 fetch_page、parse_properties 和 fetch_all_properties
+使用方法：
+    python benchmarks/bench_scraper.py                                   # 合成 5000 个楼盘，JSON 和 HTML 两种格式
+    python benchmarks/bench_scraper.py --projects 20000 --page-sizes 500,1000,5000
+    python benchmarks/bench_scraper.py --latency-ms 150 --jitter-ms 100 --error-rate 0.05 --workers 8
+    python benchmarks/bench_scraper.py --capture data/captures/json     # 回放 replay.py capture 录制的页面
+每一项记录首次、最快和中位耗时，以及 tracemalloc 峰值内存（抓取程序进程内，回放服务器在子进程中运行）。
+fetch_all_properties 分别测无状态的完整抓取和保存状态后的条件请求（全部页面 304）。
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.replay import CapturedPages, ReplayProcess, SyntheticPages
+from backend.scraper import PropertyScraper
+
+
+@contextlib.contextmanager
+def _quiet():
+    """不输出（也不计入）抓取日志"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """首次、最快和中位耗时（毫秒），峰值内存（KB）；setup 在每次调用前执行，不计时"""
+    with _quiet():
+        timings = []
+        for _ in range(repeat + 1):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    first, rest = timings[0], timings[1:]
+    return {
+        'first_ms': round(first * 1000, 2),
+        'best_ms': round(min(rest) * 1000, 2),
+        'median_ms': round(statistics.median(rest) * 1000, 2),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def _format_row(name: str, row: dict, extra: str = '') -> str:
+    return (f"  {name:34s} 首次 {row['first_ms']:9.1f} ms  最快 {row['best_ms']:9.1f} ms  "
+            f"中位 {row['median_ms']:9.1f} ms  内存 {row['peak_kb']:9.0f} KB  {extra}")
+
+
+def bench(server: ReplayProcess, page_size: int, args, state_dir: str) -> dict:
+    """对一个回放服务器运行各项测试"""
+    state_path = os.path.join(state_dir, f'state-{server.port}-{page_size}.json')
+    os.environ['SCRAPER_STATE_PATH'] = state_path
+    scraper = PropertyScraper(server.url)
+    scraper.page_size = page_size
+    scraper.max_workers = args.workers
+    scraper.backoff_base = args.backoff
+    scraper.html_parser = args.html_parser
+
+    def clear_state():
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        scraper._state = None
+
+    results = {}
+    clear_state()
+    results['fetch_page(1)'] = measure(lambda: scraper.fetch_page(1), args.repeat, clear_state)
+
+    with _quiet():
+        page = scraper.fetch_page(1)
+    if not page:
+        raise RuntimeError('第 1 页抓取失败')
+    fresh = lambda: {k: v for k, v in page.items() if k != 'house_blocks'}  # 去掉缓存的 house-info 块
+    results['parse_properties(第 1 页)'] = measure(lambda: scraper.parse_properties(fresh()), args.repeat)
+
+    server.reset()
+    results['fetch_all_properties'] = measure(scraper.fetch_all_properties, args.repeat, clear_state)
+    full_stats = server.stats()
+
+    with _quiet():
+        result = scraper.fetch_all_properties()
+        if result:
+            scraper.commit_state(result)
+    server.reset()
+    results['fetch_all_properties(304)'] = measure(scraper.fetch_all_properties, args.repeat)
+    conditional_stats = server.stats()
+
+    runs = args.repeat + 2  # 首次 + 重复 + tracemalloc
+    print(_format_row('fetch_page(1)', results['fetch_page(1)']))
+    print(_format_row('parse_properties(第 1 页)', results['parse_properties(第 1 页)'],
+                      f"{len(scraper.parse_properties(fresh()))} 个楼盘"))
+    print(_format_row('fetch_all_properties', results['fetch_all_properties'],
+                      f"{result['total_projects'] if result else 0} 个楼盘，每次 {full_stats['requests'] / runs:.1f} 个请求、"
+                      f"{full_stats['bytes_sent'] / runs / 1024:.0f} KB，状态码 {full_stats['status']}"))
+    print(_format_row('fetch_all_properties(304)', results['fetch_all_properties(304)'],
+                      f"状态码 {conditional_stats['status']}"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抓取程序的端到端基准测试（回放服务器）')
+    parser.add_argument('--capture', help='回放录制的目录（默认使用合成页面）')
+    parser.add_argument('--projects', type=int, default=5000, help='合成页面的楼盘数（默认 5000）')
+    parser.add_argument('--formats', default='json,html', help='合成页面的格式（默认 json,html）')
+    parser.add_argument('--page-sizes', default='1000', help='每页条数，逗号分隔（回放录制时使用录制的条数）')
+    parser.add_argument('--workers', type=int, default=4, help='并发请求的页数（默认 4）')
+    parser.add_argument('--html-parser', choices=('fast', 'bs4'), default='fast')
+    parser.add_argument('--latency-ms', type=float, default=0, help='回放服务器每次请求的固定延迟')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='额外的随机延迟上限')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回 503 的比例（0-1）')
+    parser.add_argument('--backoff', type=float, default=0.05, help='重试的退避基础秒数（默认 0.05）')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数（默认 3）')
+    args = parser.parse_args()
+
+    options = {
+        'latency': args.latency_ms / 1000,
+        'jitter': args.jitter_ms / 1000,
+        'error_rate': args.error_rate
+    }
+    if args.capture:
+        source = CapturedPages(args.capture)
+        scenarios = [(f'录制页面 {args.capture}（{source.format}）', source, [source.count or 1000])]
+    else:
+        page_sizes = [int(size) for size in args.page_sizes.split(',')]
+        scenarios = [(f'合成 {args.projects} 个楼盘（{data_format}）', SyntheticPages(args.projects, data_format), page_sizes)
+                     for data_format in args.formats.split(',')]
+
+    print(f"并发 {args.workers}，延迟 {args.latency_ms:g}+{args.jitter_ms:g} ms，错误率 {args.error_rate:g}，每项重复 {args.repeat} 次")
+    with tempfile.TemporaryDirectory() as state_dir:
+        for label, source, page_sizes in scenarios:
+            with ReplayProcess(source, **options) as server:
+                for page_size in page_sizes:
+                    print(f"\n{label}，每页 {page_size} 条:")
+                    bench(server, page_size, args, state_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+基准测试：Web 进程的启动耗时（每次在新的子进程中导入 wsgi，和 gunicorn worker 启动时一样）
+使用方法：
+    python benchmarks/bench_startup.py                      # SQLite（data/properties.db 的副本）和无法连接的 Supabase 两种场景
+    python benchmarks/bench_startup.py --repeat 10 --importtime   # 同时列出导入耗时较长的模块
+    python benchmarks/bench_startup.py --db /tmp/synthetic.db
+每个场景记录：进程总耗时、导入 wsgi 的耗时、第一个 /health 请求、第一个查询数据库的请求（/api/latest）、
+已加载的模块数和峰值内存（RSS）。Supabase 场景指向一个没有服务的端口，用来确认导入和 /health 不依赖网络。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# 在子进程中执行：导入 wsgi，依次发出 /health 和第一个查询请求，输出一行 JSON
+PROBE = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from wsgi import app
+imported = time.perf_counter()
+client = app.test_client()
+health = client.get('/health')
+health_done = time.perf_counter()
+first = client.get('/api/latest')
+first_done = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'health_ms': (health_done - imported) * 1000,
+    'first_query_ms': (first_done - health_done) * 1000,
+    'health_status': health.status_code,
+    'first_query_status': first.status_code,
+    'modules': len(sys.modules),
+    'supabase_loaded': 'supabase' in sys.modules,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+}}))
+'''
+
+METRICS = ('process_ms', 'import_ms', 'health_ms', 'first_query_ms')
+
+
+def run_probe(env: dict, importtime: bool = False) -> tuple:
+    """在新进程中运行一次，返回 (测量结果, -X importtime 输出)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE.format(root=project_root)]
+    started = time.perf_counter()
+    completed = subprocess.run(command, env=env, capture_output=True, text=True, timeout=300)
+    process_ms = (time.perf_counter() - started) * 1000
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"子进程失败（退出码 {completed.returncode}）:\n{completed.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    result['process_ms'] = process_ms
+    return result, completed.stderr
+
+
+def top_imports(importtime_output: str, min_ms: float = 5.0, max_depth: int = 3) -> list:
+    """-X importtime 输出中累计耗时不少于 min_ms 的模块 [(毫秒, 缩进的模块名)]，父模块在前"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative.strip().isdigit() and depth <= max_depth and int(cumulative) >= min_ms * 1000:
+            rows.append((int(cumulative) / 1000, '  ' * depth + name.strip()))
+    return rows[::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Web 进程启动耗时')
+    parser.add_argument('--db', default=os.path.join(project_root, 'data', 'properties.db'),
+                        help='SQLite 场景使用的数据库（在副本上测试，默认 data/properties.db）')
+    parser.add_argument('--repeat', type=int, default=5, help='每个场景启动的次数（默认 5）')
+    parser.add_argument('--importtime', action='store_true', help='列出导入耗时较长的模块')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='zhuhaibay-startup-')
+    try:
+        base_env = {key: value for key, value in os.environ.items()
+                    if not key.startswith(('PROFILE_', 'PROMETHEUS_'))}
+        base_env.update({
+            'PUBLISH_STATIC': '0',
+            'JOBS_DB_PATH': os.path.join(work_dir, 'jobs.db'),
+            'QUERY_CACHE_GENERATION_PATH': os.path.join(work_dir, '.cache_generation'),
+        })
+        scenarios = []
+        if os.path.exists(args.db):
+            db_copy = os.path.join(work_dir, 'properties.db')
+            shutil.copy(args.db, db_copy)
+            scenarios.append(('SQLite', dict(base_env, DB_BACKEND='sqlite', DB_PATH=db_copy)))
+        else:
+            print(f"没有找到 {args.db}，跳过 SQLite 场景")
+        # 没有服务监听的端口：连接会立即被拒绝
+        scenarios.append(('Supabase（无法连接）', dict(base_env, DB_BACKEND='supabase', SUPABASE_URL='http://127.0.0.1:9')))
+
+        for label, env in scenarios:
+            results = [run_probe(env)[0] for _ in range(args.repeat)]
+            last = results[-1]
+            print(f"\n{label}: 启动 {args.repeat} 次，{last['modules']} 个模块，峰值内存 {last['maxrss_mb']:.0f} MB，"
+                  f"已导入 supabase: {'是' if last['supabase_loaded'] else '否'}，"
+                  f"/health {last['health_status']}，/api/latest {last['first_query_status']}")
+            for metric in METRICS:
+                values = [result[metric] for result in results]
+                print(f"  {metric:16s} 中位 {statistics.median(values):8.1f} ms  最快 {min(values):8.1f} ms")
+            if args.importtime:
+                _, output = run_probe(env, importtime=True)
+                print("  导入耗时（累计，不少于 5 ms）:")
+                for ms, name in top_imports(output):
+                    print(f"    {ms:8.1f} ms  {name}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
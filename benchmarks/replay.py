@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+抓取的录制与回放：离线测试 PropertyScraper 的抓取、解析和刷新吞吐
+使用方法：
+    python benchmarks/replay.py capture data/captures/json                 # 从线上站点录制每页的原始响应
+    python benchmarks/replay.py capture data/captures/html --accept html   # 以 HTML 的 Accept 头录制
+    python benchmarks/replay.py serve --capture data/captures/json --port 8000
+    python benchmarks/replay.py serve --projects 20000 --format html --latency-ms 200 --error-rate 0.05
+serve 启动后把 SCRAPER_BASE_URL 设为打印出的地址即可让抓取程序使用回放服务器。
+回放服务器可以回放录制的页面，也可以按请求的 count 生成合成页面（JSON 或 HTML）；
+支持固定延迟和抖动、按比例返回错误状态码，以及按内容哈希的 ETag/304。
+GET /__stats 返回请求数、状态码和发送字节数，GET /__reset 清零。
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from benchmarks.bench_parse import BLOCK_TEMPLATE, JUNK_NAMES
+
+PAGE_FILE = re.compile(r'page-(\d+)\.(json|html)')
+
+CONTENT_TYPES = {
+    'json': 'application/json; charset=utf-8',
+    'html': 'text/html; charset=utf-8'
+}
+
+EMPTY_PAGES = {
+    'json': b'{"data": []}',
+    'html': b'<!DOCTYPE html><html><body><div class="list"></div></body></html>'
+}
+
+
+class CapturedPages:
+    """录制的页面：按页码原样返回，请求的 count 必须与录制时一致"""
+
+    def __init__(self, directory: str):
+        self.pages: Dict[int, Tuple[bytes, str]] = {}
+        self.count = None
+        for filename in sorted(os.listdir(directory)):
+            match = PAGE_FILE.fullmatch(filename)
+            if not match:
+                continue
+            start, extension = int(match.group(1)), match.group(2)
+            with open(os.path.join(directory, filename), 'rb') as f:
+                self.pages[start] = (f.read(), extension)
+            meta_path = os.path.join(directory, f'page-{start:04d}.meta.json')
+            if self.count is None and os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    self.count = json.load(f).get('count')
+        if not self.pages:
+            raise ValueError(f'{directory} 中没有录制的页面（page-NNNN.json / page-NNNN.html）')
+        self.format = self.pages[min(self.pages)][1]
+
+    def render(self, start: int, count: int) -> Tuple[int, bytes, str]:
+        if self.count is not None and count != self.count:
+            return 400, f'录制时每页 {self.count} 条，请设置 SCRAPER_PAGE_SIZE={self.count}'.encode('utf-8'), 'text/plain; charset=utf-8'
+        body, extension = self.pages.get(start, (EMPTY_PAGES[self.format], self.format))
+        return 200, body, CONTENT_TYPES[extension]
+
+
+class SyntheticPages:
+    """合成的楼盘列表：按请求的 start/count 切片，JSON 带总条数，HTML 与真实页面结构一致（不带总条数）"""
+
+    def __init__(self, projects: int = 5000, data_format: str = 'json', seed: int = 0):
+        rng = random.Random(seed)
+        self.format = data_format
+        self.items = []
+        for index in range(projects):
+            total = rng.randint(50, 2000)
+            available = rng.randint(0, total)
+            self.items.append({
+                'index': index,
+                'name': rng.choice(JUNK_NAMES) if rng.random() < 0.05 else f'楼盘{index}号 花园',
+                'total': total,
+                'available': available,
+                'price': rng.randint(15000, 60000),
+                'developer': f'开发商{rng.randint(1, 300)}',
+                'district': rng.choice(['香洲区', '金湾区', '斗门区', '横琴'])
+            })
+
+    def render(self, start: int, count: int) -> Tuple[int, bytes, str]:
+        items = self.items[(start - 1) * count:start * count]
+        if self.format == 'json':
+            body = json.dumps({
+                'total': len(self.items),
+                'data': [{
+                    'projectName': item['name'],
+                    'availableUnits': item['available'],
+                    'totalUnits': item['total'],
+                    'developer': item['developer'],
+                    'district': item['district']
+                } for item in items]
+            }, ensure_ascii=False).encode('utf-8')
+        else:
+            parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>预售列表</title></head><body><div class="list">']
+            parts.extend(BLOCK_TEMPLATE.format(
+                index=item['index'], name=item['name'], total=item['total'],
+                sold=item['total'] - item['available'], available=item['available'], price=item['price']
+            ) for item in items)
+            parts.append('</div></body></html>')
+            body = ''.join(parts).encode('utf-8')
+        return 200, body, CONTENT_TYPES[self.format]
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """回放服务器；页面内容在首次请求后缓存，服务端不在计时中占用太多时间"""
+
+    daemon_threads = True
+
+    def __init__(self, source, port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, etag: bool = True, seed: int = 0):
+        super().__init__(('127.0.0.1', port), ReplayHandler)
+        self.source = source
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.etag = etag
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._rendered: Dict[Tuple[int, int], Tuple[int, bytes, str, str]] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_sent': 0, 'status': {}}
+
+    def record(self, status: int, size: int):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_sent'] += size
+            key = str(status)
+            self.stats['status'][key] = self.stats['status'].get(key, 0) + 1
+
+    def page(self, start: int, count: int) -> Tuple[int, bytes, str, str]:
+        key = (start, count)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            status, body, content_type = self.source.render(start, count)
+            rendered = (status, body, content_type, f'"{hashlib.sha1(body).hexdigest()}"')
+            self._rendered[key] = rendered
+        return rendered
+
+    def delay_and_fail(self) -> Tuple[float, bool]:
+        """本次请求的延迟秒数和是否返回错误"""
+        with self._lock:
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            return delay, self._rng.random() < self.error_rate
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，与真实站点一致地复用会话
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', headers: Optional[Dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        self.server.record(status, len(body))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/__stats':
+            body = json.dumps(self.server.stats).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if url.path == '/__reset':
+            self.server.reset_stats()
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        query = parse_qs(url.query)
+        try:
+            start = int(query['start'][0])
+            count = int(query['count'][0])
+        except (KeyError, ValueError):
+            self._send(400, '缺少 start / count 参数'.encode('utf-8'), {'Content-Type': 'text/plain; charset=utf-8'})
+            return
+
+        delay, fail = self.server.delay_and_fail()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send(self.server.error_status)
+            return
+
+        status, body, content_type, etag = self.server.page(start, count)
+        if status != 200:
+            self._send(status, body, {'Content-Type': content_type})
+            return
+        headers = {'Content-Type': content_type}
+        if self.server.etag:
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', {'ETag': etag})
+                return
+        self._send(200, body, headers)
+
+
+def _serve(source, options: Dict, port_queue):
+    server = ReplayServer(source, **options)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+class ReplayProcess:
+    """在子进程中运行回放服务器，使服务端不与被测的抓取程序争用 GIL，也不计入其内存分配"""
+
+    def __init__(self, source, **options):
+        context = multiprocessing.get_context()
+        port_queue = context.Queue()
+        self.process = context.Process(target=_serve, args=(source, options, port_queue), daemon=True)
+        self.process.start()
+        self.port = port_queue.get(timeout=30)
+        self.url = f'http://127.0.0.1:{self.port}/presalelist'
+
+    def _get(self, path: str) -> bytes:
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.port}{path}', timeout=10) as response:
+            return response.read()
+
+    def stats(self) -> Dict:
+        return json.loads(self._get('/__stats'))
+
+    def reset(self):
+        self._get('/__reset')
+
+    def close(self):
+        self.process.terminate()
+        self.process.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def capture(directory: str, accept: str = 'json', base_url: Optional[str] = None) -> Optional[Dict]:
+    """抓取一次并保存每页的原始响应（不写数据库，不使用也不更新条件请求的状态）"""
+    os.environ['SCRAPER_CAPTURE_DIR'] = directory
+    with tempfile.TemporaryDirectory() as state_dir:
+        os.environ['SCRAPER_STATE_PATH'] = os.path.join(state_dir, 'state.json')
+        from backend.scraper import PropertyScraper
+        scraper = PropertyScraper(base_url)
+        if accept == 'html':
+            scraper.headers['Accept'] = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+        return scraper.fetch_all_properties()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='录制和回放抓取的原始响应')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    capture_parser = commands.add_parser('capture', help='从线上站点（或 --base-url）录制每页的原始响应')
+    capture_parser.add_argument('directory', help='保存录制结果的目录')
+    capture_parser.add_argument('--accept', choices=('json', 'html'), default='json', help='请求的 Accept 类型')
+    capture_parser.add_argument('--base-url', help='抓取地址（默认 SCRAPER_BASE_URL 或线上站点）')
+
+    serve_parser = commands.add_parser('serve', help='启动回放服务器')
+    serve_parser.add_argument('--capture', help='回放录制的目录（默认使用合成页面）')
+    serve_parser.add_argument('--projects', type=int, default=5000, help='合成页面的楼盘数（默认 5000）')
+    serve_parser.add_argument('--format', choices=('json', 'html'), default='json', help='合成页面的格式')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--latency-ms', type=float, default=0, help='每次请求的固定延迟')
+    serve_parser.add_argument('--jitter-ms', type=float, default=0, help='额外的随机延迟上限')
+    serve_parser.add_argument('--error-rate', type=float, default=0, help='返回错误状态码的比例（0-1）')
+    serve_parser.add_argument('--error-status', type=int, default=503)
+    serve_parser.add_argument('--no-etag', action='store_true', help='不返回 ETag（不支持条件请求）')
+    args = parser.parse_args()
+
+    if args.command == 'capture':
+        result = capture(args.directory, args.accept, args.base_url)
+        if not result:
+            print("录制失败")
+            sys.exit(1)
+        print(f"已录制到 {args.directory}: {result['total_projects']} 个楼盘")
+        return
+
+    source = CapturedPages(args.capture) if args.capture else SyntheticPages(args.projects, args.format)
+    server = ReplayServer(
+        source, port=args.port, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, error_status=args.error_status, etag=not args.no_etag
+    )
+    print(f"回放服务器已启动: SCRAPER_BASE_URL=http://127.0.0.1:{server.server_port}/presalelist")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
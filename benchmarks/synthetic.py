@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+合成数据：生成与 data/properties.db 相同格式的 SQLite 数据库，用于在大规模历史下做基准测试
+使用方法：
+    python benchmarks/synthetic.py data/bench.db                        # 默认 2000 个楼盘 × 5 年每日快照
+    python benchmarks/synthetic.py /tmp/small.db --projects 200 --years 1
+    python benchmarks/synthetic.py /tmp/bench.db --details-mode delta    # 同时生成 delta 模式的 property_changes
+楼盘在不同日期上市，每天以一定概率卖出几套、偶尔加推，卖完一段时间后从列表中消失；
+约 3% 的楼盘与其他楼盘同名（同一项目的多个预售证）。同样的参数和种子生成的数据完全相同。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.storage import SQLITE_BACKFILL_PROJECTS, SQLITE_SCHEMA, SQLiteBackend
+
+
+def _project_names(count: int, rng: random.Random):
+    names = []
+    for index in range(count):
+        if names and rng.random() < 0.03:
+            names.append(rng.choice(names))  # 同一项目的另一个预售证
+        else:
+            names.append(f'合成楼盘{index:04d}号')
+    return names
+
+
+def generate(path: str, projects: int = 2000, years: float = 5, seed: int = 0,
+             end: date = None, snapshots: int = 1, details_mode: str = 'full') -> dict:
+    """生成数据库文件（已存在时覆盖），返回 {'snapshots', 'details', 'projects', 'seconds'}
+
+    快照为截至 end（默认昨天）的每日快照；最后 snapshots 天附带完整的快照内容（property_snapshots）。
+    """
+    started = time.perf_counter()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    rng = random.Random(seed)
+    end = end or date.today() - timedelta(days=1)
+    days = max(1, int(years * 365))
+    first_day = end - timedelta(days=days - 1)
+
+    names = _project_names(projects, rng)
+    # 每个楼盘：上市日、剩余套数、每天卖出的概率、卖完后还留在列表中的天数
+    launch = [0 if rng.random() < 0.3 else rng.randint(0, days - 1) for _ in range(projects)]
+    units = [rng.randint(50, 2000) for _ in range(projects)]
+    sell_rate = [rng.uniform(0.05, 0.6) for _ in range(projects)]
+    linger = [rng.randint(7, 60) for _ in range(projects)]
+    sold_out_day = [None] * projects
+
+    storage = SQLiteBackend(path, details_mode='full')
+    storage.verify_schema()
+    conn = storage.conn
+    # 批量写入时先去掉维度表触发器，写完后一次回填
+    conn.execute('DROP TRIGGER IF EXISTS trg_property_projects')
+    conn.execute('DELETE FROM property_projects')
+
+    detail_count = 0
+    with conn:
+        for day_index in range(days):
+            day = first_day + timedelta(days=day_index)
+            timestamp = f'{day.isoformat()}T09:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.{rng.randint(0, 999999):06d}'
+            rows = []
+            for i in range(projects):
+                if day_index < launch[i]:
+                    continue
+                if sold_out_day[i] is not None and day_index - sold_out_day[i] > linger[i]:
+                    continue
+                if units[i] > 0 and rng.random() < sell_rate[i]:
+                    units[i] = max(0, units[i] - rng.randint(1, 6))
+                elif rng.random() < 0.002:
+                    units[i] += rng.randint(20, 300)  # 加推
+                    sold_out_day[i] = None
+                if units[i] == 0 and sold_out_day[i] is None:
+                    sold_out_day[i] = day_index
+                rows.append((timestamp, names[i], units[i]))
+
+            record = {
+                'timestamp': timestamp,
+                'available_units': sum(row[2] for row in rows),
+                'total_projects': len(rows),
+                'details': None
+            }
+            if day_index >= days - snapshots:
+                record['details'] = {
+                    'total_projects': len(rows),
+                    'total_available_units': record['available_units'],
+                    'properties': [{'name': name, 'available_units': value} for _, name, value in rows]
+                }
+            storage._insert_record(record)
+            conn.executemany(
+                'INSERT INTO property_details (timestamp, property_name, available_units) VALUES (?, ?, ?)', rows
+            )
+            detail_count += len(rows)
+        conn.execute(SQLITE_BACKFILL_PROJECTS)
+    # 恢复触发器（其余表和索引已存在）
+    conn.executescript(SQLITE_SCHEMA)
+    conn.execute('ANALYZE')
+    conn.close()
+    storage._local.conn = None
+
+    if details_mode == 'delta':
+        # 由 delta 模式的首次迁移生成 property_changes
+        SQLiteBackend(path, details_mode='delta').verify_schema()
+
+    return {
+        'snapshots': days,
+        'details': detail_count,
+        'projects': len(set(names)),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成的楼盘历史数据库')
+    parser.add_argument('path', help='输出的 SQLite 文件')
+    parser.add_argument('--projects', type=int, default=2000, help='楼盘数（默认 2000）')
+    parser.add_argument('--years', type=float, default=5, help='每日快照的年数（默认 5）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--snapshots', type=int, default=1, help='最后几天附带完整快照内容（默认 1）')
+    parser.add_argument('--details-mode', choices=('full', 'delta'), default='full')
+    args = parser.parse_args()
+
+    stats = generate(args.path, args.projects, args.years, args.seed,
+                     snapshots=args.snapshots, details_mode=args.details_mode)
+    size = os.path.getsize(args.path) / 1024 / 1024
+    print(f"已生成 {args.path}: {stats['projects']} 个楼盘，{stats['snapshots']} 次快照，"
+          f"{stats['details']} 条明细，{size:.1f} MB，耗时 {stats['seconds']} 秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+gunicorn 配置（gunicorn 启动时自动读取当前目录下的 gunicorn.conf.py）
+
+多个 worker 进程的 Prometheus 指标写入 PROMETHEUS_MULTIPROC_DIR（默认 data/prometheus），
+/metrics 汇总该目录中所有进程的指标。后台 worker（backend/worker.py）和 refresh_data.py 使用同一个默认目录。
+"""
+import os
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(project_root, 'data', 'prometheus'))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def on_starting(server):
+    """启动时清理已退出进程留下的指标文件（仍在运行的进程，如同一主机上的后台 worker，其文件保留）"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        pid = filename.rsplit('.', 1)[0].rsplit('_', 1)[-1]
+        if filename.endswith('.db') and (not pid.isdigit() or not _pid_alive(int(pid))):
+            os.remove(os.path.join(directory, filename))
+
+
+def child_exit(server, worker):
+    """worker 退出后把它的 live 类 gauge 标记为失效"""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,6 +3,8 @@
 命令行工具：刷新房产数据
 使用方法：
     python refresh_data.py
+    python refresh_data.py --publish-only   # 不抓取，只用数据库中已有的数据重新发布静态数据
+    python refresh_data.py --profile        # 用 cProfile 剖析本次刷新，结果写入 data/profiles
 """
 import sys
 import os
@@ -13,47 +15,61 @@ project_root = os.path.dirname(os.path.abspath(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from backend.scraper import PropertyScraper
+# 与 gunicorn.conf.py 相同的 Prometheus 多进程目录：须在导入 prometheus_client（backend.metrics）之前设置，
+# 抓取等指标才会写入该目录并汇总到同一台主机上 Web 服务的 /metrics
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(project_root, 'data', 'prometheus'))
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
 from backend.database import Database
+from backend.jobs import create_registry
+from backend.publish import SnapshotPublisher
+from backend.refresh import run_refresh_job
 
 def main():
-    """主函数：抓取并保存数据"""
+    """主函数：抓取并保存数据（与后台 worker 执行同一套刷新流程）"""
     print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始刷新数据...")
     print("=" * 60)
     
+    jobs = None
+    job = None
     try:
         # 初始化
-        scraper = PropertyScraper()
         db = Database()
+        db.init_db()
         
-        # 抓取数据
-        print("正在抓取房产数据...")
-        result = scraper.fetch_all_properties()
+        if '--publish-only' in sys.argv[1:]:
+            manifest = SnapshotPublisher().publish(db)
+            if not manifest:
+                print("❌ 静态数据发布失败")
+                sys.exit(1)
+            print(f"✅ 静态数据已发布: {manifest['version']}")
+            sys.exit(0)
         
-        if not result:
-            print("❌ 数据抓取失败")
+        # 在任务登记表中登记，保证与 Web 服务、后台 worker 不会同时刷新（会接手排队中的任务）
+        jobs = create_registry(db)
+        job, created = jobs.start('cli')
+        if not created:
+            print(f"❌ 已有刷新任务 {job['id']} 正在运行（{job['owner']}），请稍后再试")
+            job = None
             sys.exit(1)
         
-        units = result['total_available_units']
-        projects = result['total_projects']
-        
-        print(f"✅ 数据抓取成功: {projects} 个项目，共 {units} 套")
-        
-        # 保存数据
-        print("正在保存数据到 Supabase...")
-        success = db.save_record(units, projects, result)
-        
-        if success:
-            print(f"✅ 数据保存成功: {projects} 个项目，共 {units} 套")
-            print("=" * 60)
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 刷新完成")
-            sys.exit(0)
-        else:
-            print("❌ 数据保存失败")
+        finished = run_refresh_job(job['id'], jobs, db, SnapshotPublisher(),
+                                   profile=True if '--profile' in sys.argv[1:] else None)
+        print("=" * 60)
+        if not finished or finished['status'] != 'succeeded':
+            print(f"❌ 刷新失败: {finished['error'] if finished else '未知错误'}")
             sys.exit(1)
+        
+        result = finished['result'] or {}
+        note = '（数据未变化）' if result.get('unchanged') else ''
+        print(f"✅ {result.get('projects')} 个项目，共 {result.get('units')} 套")
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 刷新完成{note}")
+        sys.exit(0)
             
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断操作")
+        if job is not None:
+            jobs.finish(job['id'], error='用户中断操作', step='任务已中断')
         sys.exit(1)
     except Exception as e:
         print(f"\n❌ 发生错误: {e}")
@@ -63,4 +79,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-
@@ -30,3 +30,477 @@ ON property_records(timestamp);
 CREATE INDEX IF NOT EXISTS idx_property_details_timestamp 
 ON property_details(timestamp);
 
+
+-- 快照内容（完整抓取结果）：zlib 压缩的 JSON（base64 文本），只在需要时按 record_id 读取，
+-- property_records.details 不再写入（旧数据仍可读取）
+CREATE TABLE IF NOT EXISTS property_snapshots (
+    record_id BIGINT PRIMARY KEY REFERENCES property_records(id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_property_snapshots_timestamp
+ON property_snapshots(timestamp);
+
+
+-- 楼盘维度表：每个楼盘一行，记录首次/最近出现时间和最新待售套数
+-- 由 property_details 的插入/删除触发器维护（delta 模式由 replace_daily_snapshot_delta 维护），楼盘列表接口只需读取这张小表
+CREATE TABLE IF NOT EXISTS property_projects (
+    property_name TEXT PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    latest_units INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION upsert_property_project() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO property_projects AS p (property_name, first_seen, last_seen, latest_units, updated_at)
+    VALUES (NEW.property_name, NEW.timestamp, NEW.timestamp, NEW.available_units, CURRENT_TIMESTAMP)
+    ON CONFLICT (property_name) DO UPDATE SET
+        first_seen = LEAST(p.first_seen, EXCLUDED.first_seen),
+        latest_units = CASE WHEN EXCLUDED.last_seen >= p.last_seen THEN EXCLUDED.latest_units ELSE p.latest_units END,
+        last_seen = GREATEST(p.last_seen, EXCLUDED.last_seen),
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_property_projects ON property_details;
+CREATE TRIGGER trg_property_projects
+AFTER INSERT ON property_details
+FOR EACH ROW EXECUTE FUNCTION upsert_property_project();
+
+-- 删除明细（按天替换快照）后按剩余数据重新计算涉及的楼盘，没有剩余数据的楼盘从维度表删除
+CREATE OR REPLACE FUNCTION refresh_property_projects() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM property_projects p
+    WHERE p.property_name IN (SELECT property_name FROM removed_details)
+      AND NOT EXISTS (SELECT 1 FROM property_details d WHERE d.property_name = p.property_name);
+
+    UPDATE property_projects p SET
+        first_seen = m.first_seen,
+        last_seen = m.last_seen,
+        latest_units = l.available_units,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (SELECT DISTINCT property_name FROM removed_details) r
+    CROSS JOIN LATERAL (
+        SELECT MIN(d.timestamp) AS first_seen, MAX(d.timestamp) AS last_seen
+        FROM property_details d WHERE d.property_name = r.property_name
+    ) m
+    CROSS JOIN LATERAL (
+        SELECT d.available_units FROM property_details d
+        WHERE d.property_name = r.property_name
+        ORDER BY d.timestamp DESC, d.id DESC LIMIT 1
+    ) l
+    WHERE p.property_name = r.property_name;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_property_projects_delete ON property_details;
+CREATE TRIGGER trg_property_projects_delete
+AFTER DELETE ON property_details
+REFERENCING OLD TABLE AS removed_details
+FOR EACH STATEMENT EXECUTE FUNCTION refresh_property_projects();
+
+-- 从已有历史数据回填维度表（可重复执行）
+INSERT INTO property_projects (property_name, first_seen, last_seen, latest_units)
+SELECT DISTINCT ON (property_name)
+       property_name,
+       MIN(timestamp) OVER (PARTITION BY property_name),
+       MAX(timestamp) OVER (PARTITION BY property_name),
+       available_units
+FROM property_details
+ORDER BY property_name, timestamp DESC, id DESC
+ON CONFLICT (property_name) DO NOTHING;
+
+-- 按天替换快照：在一个事务中删除当天已有数据并写入新快照（save_record 一次 RPC 调用）；p_append 时保留当天已有数据
+-- 返回写入行数，以及与上一次快照相比变化/未变的行数
+DROP FUNCTION IF EXISTS replace_daily_snapshot(TEXT, INTEGER, INTEGER, JSONB, JSONB);
+DROP FUNCTION IF EXISTS replace_daily_snapshot(TEXT, INTEGER, INTEGER, TEXT, JSONB);
+CREATE OR REPLACE FUNCTION replace_daily_snapshot(
+    p_timestamp TEXT,
+    p_available_units INTEGER,
+    p_total_projects INTEGER,
+    p_payload TEXT,
+    p_properties JSONB,
+    p_append BOOLEAN DEFAULT FALSE
+) RETURNS JSONB AS $$
+DECLARE
+    v_day_start TEXT := substr(p_timestamp, 1, 10) || 'T00:00:00';
+    v_day_end TEXT := to_char(substr(p_timestamp, 1, 10)::date + 1, 'YYYY-MM-DD') || 'T00:00:00';
+    v_record_id BIGINT;
+    v_written INTEGER;
+    v_removed INTEGER;
+    v_changed INTEGER;
+    v_unchanged INTEGER;
+BEGIN
+    IF p_append THEN
+        -- 日内采样（INTRADAY_SAMPLES）：替换范围为空，只追加新快照
+        v_day_end := v_day_start;
+    END IF;
+
+    DELETE FROM property_records WHERE timestamp >= v_day_start AND timestamp < v_day_end;
+    DELETE FROM property_details WHERE timestamp >= v_day_start AND timestamp < v_day_end;
+    GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+    -- 删除当天数据后，剩余的最新快照即为上一次快照的状态；与 delta 模式相同，同名楼盘按出现顺序编号 slot 后比较
+    WITH snapshot_rows AS (
+        SELECT e.item->>'property_name' AS property_name,
+               ROW_NUMBER() OVER (PARTITION BY e.item->>'property_name' ORDER BY e.ord) AS slot,
+               (e.item->>'available_units')::INTEGER AS available_units
+        FROM jsonb_array_elements(p_properties) WITH ORDINALITY AS e(item, ord)
+    ), previous_rows AS (
+        SELECT d.property_name,
+               ROW_NUMBER() OVER (PARTITION BY d.property_name ORDER BY d.id) AS slot,
+               d.available_units
+        FROM property_details d
+        WHERE d.timestamp = (SELECT MAX(timestamp) FROM property_details)
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE p.available_units IS NOT DISTINCT FROM s.available_units),
+        COUNT(*) FILTER (WHERE p.available_units IS DISTINCT FROM s.available_units)
+    INTO v_unchanged, v_changed
+    FROM snapshot_rows s
+    LEFT JOIN previous_rows p ON p.property_name = s.property_name AND p.slot = s.slot;
+
+    INSERT INTO property_records (timestamp, available_units, total_projects, details)
+    VALUES (p_timestamp, p_available_units, p_total_projects, NULL)
+    RETURNING id INTO v_record_id;
+
+    IF p_payload IS NOT NULL THEN
+        INSERT INTO property_snapshots (record_id, timestamp, encoding, payload)
+        VALUES (v_record_id, p_timestamp, 'zlib-json', p_payload);
+    END IF;
+
+    INSERT INTO property_details (timestamp, property_name, available_units)
+    SELECT p_timestamp, x.property_name, x.available_units
+    FROM jsonb_to_recordset(p_properties) AS x(property_name TEXT, available_units INTEGER);
+    GET DIAGNOSTICS v_written = ROW_COUNT;
+
+    RETURN jsonb_build_object(
+        'record_id', v_record_id,
+        'written', v_written,
+        'changed', v_changed,
+        'unchanged', v_unchanged,
+        'removed', v_removed
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- 变化记录表（DETAILS_STORAGE=delta 时代替 property_details）：
+-- 只在楼盘待售套数与上次存储值不同时写一行，available_units 为 NULL 表示楼盘从列表中消失；
+-- 同名楼盘（同一项目的多个预售证）按在快照中的出现顺序用 slot 区分
+CREATE TABLE IF NOT EXISTS property_changes (
+    id BIGSERIAL PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    property_name TEXT NOT NULL,
+    slot INTEGER NOT NULL DEFAULT 0,
+    available_units INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_property_changes_name
+ON property_changes(property_name, slot, timestamp);
+
+CREATE INDEX IF NOT EXISTS idx_property_changes_timestamp
+ON property_changes(timestamp);
+
+-- 每个 (楼盘, slot) 的最后一条变化，即最新快照中的状态
+CREATE OR REPLACE VIEW property_current_state AS
+SELECT DISTINCT ON (property_name, slot) property_name, slot, timestamp, available_units
+FROM property_changes
+ORDER BY property_name, slot, timestamp DESC, id DESC;
+
+-- delta 模式的按天替换快照：删除当天已有数据，与上次状态比较后只写入变化行，并更新维度表
+-- （首次启用时由应用把 property_details 的历史压缩写入 property_changes）
+DROP FUNCTION IF EXISTS replace_daily_snapshot_delta(TEXT, INTEGER, INTEGER, JSONB, JSONB);
+DROP FUNCTION IF EXISTS replace_daily_snapshot_delta(TEXT, INTEGER, INTEGER, TEXT, JSONB);
+CREATE OR REPLACE FUNCTION replace_daily_snapshot_delta(
+    p_timestamp TEXT,
+    p_available_units INTEGER,
+    p_total_projects INTEGER,
+    p_payload TEXT,
+    p_properties JSONB,
+    p_append BOOLEAN DEFAULT FALSE
+) RETURNS JSONB AS $$
+DECLARE
+    v_day_start TEXT := substr(p_timestamp, 1, 10) || 'T00:00:00';
+    v_day_end TEXT := to_char(substr(p_timestamp, 1, 10)::date + 1, 'YYYY-MM-DD') || 'T00:00:00';
+    v_record_id BIGINT;
+    v_written INTEGER;
+    v_removed INTEGER;
+    v_changed INTEGER;
+    v_unchanged INTEGER;
+BEGIN
+    IF p_append THEN
+        -- 日内采样（INTRADAY_SAMPLES）：替换范围为空，只追加新快照
+        v_day_end := v_day_start;
+    END IF;
+
+    DELETE FROM property_records WHERE timestamp >= v_day_start AND timestamp < v_day_end;
+    DELETE FROM property_changes WHERE timestamp >= v_day_start AND timestamp < v_day_end;
+    GET DIAGNOSTICS v_removed = ROW_COUNT;
+
+    CREATE TEMP TABLE snapshot_rows ON COMMIT DROP AS
+    SELECT e.item->>'property_name' AS property_name,
+           (ROW_NUMBER() OVER (PARTITION BY e.item->>'property_name' ORDER BY e.ord) - 1)::INTEGER AS slot,
+           (e.item->>'available_units')::INTEGER AS available_units,
+           e.ord
+    FROM jsonb_array_elements(p_properties) WITH ORDINALITY AS e(item, ord);
+
+    CREATE TEMP TABLE previous_rows ON COMMIT DROP AS
+    SELECT property_name, slot, available_units
+    FROM property_current_state
+    WHERE available_units IS NOT NULL;
+
+    IF v_removed > 0 THEN
+        -- 回退维度表：只在被删除的数据中出现过的楼盘删除；不在新快照中、但被删除的数据更新过的楼盘
+        -- 回到之前最后一次出现时的状态（新快照中的楼盘在下面的 upsert 中更新）
+        DELETE FROM property_projects WHERE first_seen >= v_day_start;
+
+        WITH slot_state AS (
+            -- 每个 slot 最后一次出现的快照时间及套数：最后一条变化不为 NULL 时仍在最新快照中，
+            -- 否则为消失之前的最后一次快照
+            SELECT c.property_name, c.slot,
+                   CASE WHEN c.available_units IS NOT NULL
+                        THEN (SELECT MAX(r.timestamp) FROM property_records r)
+                        ELSE (SELECT MAX(r.timestamp) FROM property_records r WHERE r.timestamp < c.timestamp)
+                   END AS seen_at,
+                   COALESCE(c.available_units, (
+                       SELECT v.available_units FROM property_changes v
+                       WHERE v.property_name = c.property_name AND v.slot = c.slot
+                         AND v.timestamp < c.timestamp AND v.available_units IS NOT NULL
+                       ORDER BY v.timestamp DESC, v.id DESC LIMIT 1
+                   )) AS available_units
+            FROM property_current_state c
+            JOIN property_projects p ON p.property_name = c.property_name
+            WHERE p.last_seen >= v_day_start
+              AND NOT EXISTS (SELECT 1 FROM snapshot_rows s WHERE s.property_name = c.property_name)
+        ), project_state AS (
+            -- 同一时间的同名楼盘以最后一个 slot 为准
+            SELECT DISTINCT ON (property_name) property_name, seen_at, available_units
+            FROM slot_state
+            WHERE seen_at IS NOT NULL
+            ORDER BY property_name, seen_at DESC, slot DESC
+        )
+        UPDATE property_projects p SET
+            last_seen = s.seen_at,
+            latest_units = s.available_units,
+            updated_at = CURRENT_TIMESTAMP
+        FROM project_state s
+        WHERE p.property_name = s.property_name;
+    END IF;
+
+    SELECT
+        COUNT(*) FILTER (WHERE p.available_units IS NOT DISTINCT FROM s.available_units),
+        COUNT(*) FILTER (WHERE p.available_units IS DISTINCT FROM s.available_units)
+    INTO v_unchanged, v_changed
+    FROM snapshot_rows s
+    LEFT JOIN previous_rows p ON p.property_name = s.property_name AND p.slot = s.slot;
+
+    INSERT INTO property_records (timestamp, available_units, total_projects, details)
+    VALUES (p_timestamp, p_available_units, p_total_projects, NULL)
+    RETURNING id INTO v_record_id;
+
+    IF p_payload IS NOT NULL THEN
+        INSERT INTO property_snapshots (record_id, timestamp, encoding, payload)
+        VALUES (v_record_id, p_timestamp, 'zlib-json', p_payload);
+    END IF;
+
+    INSERT INTO property_changes (timestamp, property_name, slot, available_units)
+    SELECT p_timestamp, s.property_name, s.slot, s.available_units
+    FROM snapshot_rows s
+    LEFT JOIN previous_rows p ON p.property_name = s.property_name AND p.slot = s.slot
+    WHERE p.available_units IS DISTINCT FROM s.available_units
+    UNION ALL
+    SELECT p_timestamp, p.property_name, p.slot, NULL
+    FROM previous_rows p
+    WHERE NOT EXISTS (
+        SELECT 1 FROM snapshot_rows s WHERE s.property_name = p.property_name AND s.slot = p.slot
+    );
+    GET DIAGNOSTICS v_written = ROW_COUNT;
+
+    -- 与 upsert_property_project 触发器相同的规则，同名楼盘以最后一条为准
+    INSERT INTO property_projects AS p (property_name, first_seen, last_seen, latest_units, updated_at)
+    SELECT DISTINCT ON (s.property_name) s.property_name, p_timestamp, p_timestamp, s.available_units, CURRENT_TIMESTAMP
+    FROM snapshot_rows s
+    ORDER BY s.property_name, s.ord DESC
+    ON CONFLICT (property_name) DO UPDATE SET
+        first_seen = LEAST(p.first_seen, EXCLUDED.first_seen),
+        latest_units = CASE WHEN EXCLUDED.last_seen >= p.last_seen THEN EXCLUDED.latest_units ELSE p.latest_units END,
+        last_seen = GREATEST(p.last_seen, EXCLUDED.last_seen),
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN jsonb_build_object(
+        'record_id', v_record_id,
+        'written', v_written,
+        'changed', v_changed,
+        'unchanged', v_unchanged,
+        'removed', v_removed
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- 刷新任务登记表（JOBS_BACKEND=supabase，见 backend/jobs.py）：不同主机上的 Web 服务、后台 worker 和命令行共享同一个任务队列
+-- 同一时间最多一个 queued、一个 running 任务（部分唯一索引保证）；入队、认领和心跳超时处理由下面的函数
+-- 在同一个咨询锁内完成，任何主机重复触发的刷新都会合并到已有的任务
+CREATE TABLE IF NOT EXISTS refresh_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    trigger TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 1,
+    current_step TEXT,
+    error TEXT,
+    result TEXT,
+    created_at TEXT,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    heartbeat_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_jobs_running ON refresh_jobs(status) WHERE status = 'running';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_refresh_jobs_queued ON refresh_jobs(status) WHERE status = 'queued';
+
+-- 任务的进度事件（步骤、分页进度、日志），id 全局递增，供 /api/refresh/events 按 Last-Event-ID 续传
+CREATE TABLE IF NOT EXISTS refresh_events (
+    id BIGSERIAL PRIMARY KEY,
+    job_id BIGINT,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_events_job ON refresh_events(job_id, id);
+
+-- 在线的后台 worker（定期写心跳），Web 服务据此判断是否有 worker 在线
+CREATE TABLE IF NOT EXISTS refresh_workers (
+    owner TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    heartbeat_at DOUBLE PRECISION NOT NULL
+);
+
+-- 心跳超时的 running 任务标记为失败，返回 {'expired': 被标记的任务或 NULL}
+-- 时间由调用方传入（p_now 为 ISO 时间，p_clock 为 Unix 秒），与任务心跳使用同一种时钟
+CREATE OR REPLACE FUNCTION expire_stale_refresh_job(
+    p_now TEXT,
+    p_clock DOUBLE PRECISION,
+    p_stale_after DOUBLE PRECISION
+) RETURNS JSONB AS $$
+DECLARE
+    v_job refresh_jobs;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_jobs'));
+    UPDATE refresh_jobs SET
+        status = 'failed',
+        error = '任务心跳超时（' || owner || ' 可能已退出）',
+        current_step = '任务已中断',
+        end_time = p_now
+    WHERE status = 'running' AND p_clock - heartbeat_at > p_stale_after
+    RETURNING * INTO v_job;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('expired', NULL);
+    END IF;
+    RETURN jsonb_build_object('expired', to_jsonb(v_job));
+END;
+$$ LANGUAGE plpgsql;
+
+-- 任务入队（p_run_now 时由调用方立即执行）：已有排队中或正在运行的任务时合并到该任务（requests + 1），
+-- 立即执行时直接接手排队中的任务；返回 {'job', 'created', 'expired'}
+CREATE OR REPLACE FUNCTION submit_refresh_job(
+    p_trigger TEXT,
+    p_owner TEXT,
+    p_run_now BOOLEAN,
+    p_keep_jobs INTEGER,
+    p_now TEXT,
+    p_clock DOUBLE PRECISION,
+    p_stale_after DOUBLE PRECISION
+) RETURNS JSONB AS $$
+DECLARE
+    v_expired JSONB;
+    v_job refresh_jobs;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_jobs'));
+    v_expired := expire_stale_refresh_job(p_now, p_clock, p_stale_after)->'expired';
+
+    SELECT * INTO v_job FROM refresh_jobs WHERE status IN ('queued', 'running') ORDER BY id LIMIT 1;
+    IF FOUND AND p_run_now AND v_job.status = 'queued' THEN
+        UPDATE refresh_jobs SET
+            requests = requests + 1,
+            status = 'running',
+            owner = p_owner,
+            current_step = '初始化任务',
+            start_time = p_now,
+            heartbeat_at = p_clock
+        WHERE id = v_job.id
+        RETURNING * INTO v_job;
+        RETURN jsonb_build_object('job', to_jsonb(v_job), 'created', TRUE, 'expired', v_expired);
+    END IF;
+    IF FOUND THEN
+        UPDATE refresh_jobs SET requests = requests + 1 WHERE id = v_job.id RETURNING * INTO v_job;
+        RETURN jsonb_build_object('job', to_jsonb(v_job), 'created', FALSE, 'expired', v_expired);
+    END IF;
+
+    INSERT INTO refresh_jobs (trigger, status, owner, current_step, created_at, start_time, heartbeat_at)
+    VALUES (
+        p_trigger,
+        CASE WHEN p_run_now THEN 'running' ELSE 'queued' END,
+        p_owner,
+        CASE WHEN p_run_now THEN '初始化任务' ELSE '排队等待执行' END,
+        p_now, p_now, p_clock
+    )
+    RETURNING * INTO v_job;
+    -- 只保留最近几个任务的进度事件
+    DELETE FROM refresh_events WHERE job_id <= v_job.id - p_keep_jobs;
+    RETURN jsonb_build_object('job', to_jsonb(v_job), 'created', TRUE, 'expired', v_expired);
+END;
+$$ LANGUAGE plpgsql;
+
+-- 认领最早的排队任务（p_job_id 不为空时只认领该任务）并置为 running；
+-- 已有任务在运行或没有排队任务时 job 为 NULL；返回 {'job', 'expired'}
+CREATE OR REPLACE FUNCTION claim_refresh_job(
+    p_job_id BIGINT,
+    p_owner TEXT,
+    p_now TEXT,
+    p_clock DOUBLE PRECISION,
+    p_stale_after DOUBLE PRECISION
+) RETURNS JSONB AS $$
+DECLARE
+    v_expired JSONB;
+    v_job refresh_jobs;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('refresh_jobs'));
+    v_expired := expire_stale_refresh_job(p_now, p_clock, p_stale_after)->'expired';
+
+    IF EXISTS (SELECT 1 FROM refresh_jobs WHERE status = 'running') THEN
+        RETURN jsonb_build_object('job', NULL, 'expired', v_expired);
+    END IF;
+    UPDATE refresh_jobs SET
+        status = 'running',
+        owner = p_owner,
+        current_step = '初始化任务',
+        start_time = p_now,
+        heartbeat_at = p_clock
+    WHERE id = (
+        SELECT id FROM refresh_jobs
+        WHERE status = 'queued' AND (p_job_id IS NULL OR id = p_job_id)
+        ORDER BY id LIMIT 1
+    )
+    RETURNING * INTO v_job;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('job', NULL, 'expired', v_expired);
+    END IF;
+    RETURN jsonb_build_object('job', to_jsonb(v_job), 'expired', v_expired);
+END;
+$$ LANGUAGE plpgsql;
+
+-- 按 (触发方式, 状态) 统计任务数、已结束任务的总耗时秒数和最近一次结束时间（/metrics）
+CREATE OR REPLACE VIEW refresh_job_stats AS
+SELECT trigger, status, COUNT(*) AS count,
+       SUM(EXTRACT(EPOCH FROM (end_time::timestamp - start_time::timestamp)))::DOUBLE PRECISION AS duration,
+       MAX(end_time) AS last_end_time
+FROM refresh_jobs
+GROUP BY trigger, status;
@@ -0,0 +1,44 @@
+"""
+pytest 公共配置：项目根目录加入 sys.path，提供临时目录中的 SQLite 存储
+运行方法（项目根目录）：python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.storage import DETAILS_MODES, SQLiteBackend
+
+
+@pytest.fixture(params=DETAILS_MODES)
+def storage(tmp_path, request):
+    """full 和 delta 两种明细存储方式各运行一次"""
+    return SQLiteBackend(str(tmp_path / 'properties.db'), details_mode=request.param)
+
+
+def save_snapshot(storage, timestamp, rows, append=False):
+    """与 save_record 相同地替换 timestamp 当天的快照（append 时只追加），rows 为 [(楼盘名称, 套数)]"""
+    day = timestamp[:10]
+    day_start, day_end = (timestamp, timestamp) if append else (f'{day}T00:00:00', f'{day}T23:59:59.999999')
+    record = {'timestamp': timestamp, 'available_units': sum(units for _, units in rows), 'total_projects': len(rows)}
+    detail_rows = [{'timestamp': timestamp, 'property_name': name, 'available_units': units} for name, units in rows]
+    return storage.replace_day(day_start, day_end, record, detail_rows)
+
+
+@pytest.fixture(scope='session')
+def api(tmp_path_factory):
+    """backend.api 模块：数据库、任务登记表和发布目录都在临时目录中（模块只导入一次，环境变量需在导入前设置）"""
+    directory = tmp_path_factory.mktemp('api')
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'DB_PATH': str(directory / 'properties.db'),
+        'JOBS_DB_PATH': str(directory / 'jobs.db'),
+        'PUBLISH_DIR': str(directory / 'published'),
+        'REFRESH_EXECUTOR': 'worker'
+    })
+    from backend import api as module
+    return module
@@ -0,0 +1,144 @@
+"""分析接口：/api/analytics/* 的结果与直接按 get_properties_history 计算的结果一致"""
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.database import Database
+from backend.publish import SnapshotPublisher
+from conftest import save_snapshot
+
+# C 在 3 月 3 日缺失，D 从 3 月 3 日开始出现；3 月 5 日的快照在晚上，天数需要向上取整
+SNAPSHOTS = [
+    ('2025-03-01T09:00:00', [('A', 100), ('B', 50), ('C', 20)]),
+    ('2025-03-02T09:00:00', [('A', 95), ('B', 50), ('C', 18)]),
+    ('2025-03-03T09:00:00', [('A', 90), ('B', 48), ('D', 30)]),
+    ('2025-03-05T21:00:00', [('A', 80), ('B', 40), ('C', 10), ('D', 25)]),
+    ('2025-03-06T09:00:00', [('A', 78), ('B', 41), ('C', 10), ('D', 20)]),
+]
+
+RANGES = [(None, None), ('2025-03-02', '2025-03-05'), ('2025-03-03', '2025-03-03')]
+
+
+@pytest.fixture
+def client(api, tmp_path, monkeypatch):
+    db = Database(backend='sqlite', db_path=str(tmp_path / 'properties.db'))
+    for timestamp, rows in SNAPSHOTS:
+        save_snapshot(db.storage, timestamp, rows)
+    monkeypatch.setattr(api, 'db', db)
+    monkeypatch.setattr(api, 'publisher', SnapshotPublisher(root=str(tmp_path / 'public')))
+    return api.app.test_client(), db
+
+
+def query(start, end, **params):
+    params.update(start=start, end=end)
+    return '&'.join(f'{key}={value}' for key, value in params.items() if value is not None)
+
+
+def fetch(client, path, start, end, **params):
+    response = client.get(f'{path}?{query(start, end, **params)}')
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def units_by_timestamp(db):
+    """{楼盘: {快照时间: 套数}}，同名楼盘按快照求和"""
+    series = {}
+    for name, points in db.get_properties_history(None).items():
+        values = series.setdefault(name, {})
+        for point in points:
+            values[point['timestamp']] = values.get(point['timestamp'], 0) + point['available_units']
+    return series
+
+
+def in_range(timestamp, start, end):
+    day = timestamp[:10]
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+def elapsed_days(earlier, later):
+    seconds = (datetime.fromisoformat(later) - datetime.fromisoformat(earlier)).total_seconds()
+    return max(1, math.ceil(seconds / 86400))
+
+
+def expected_deltas(db, start, end):
+    result = []
+    for name, values in sorted(units_by_timestamp(db).items()):
+        timestamps = sorted(ts for ts in values if in_range(ts, start, end))
+        if len(timestamps) < 2:
+            continue
+        first, last = values[timestamps[0]], values[timestamps[-1]]
+        sold = first - last
+        days = elapsed_days(timestamps[0], timestamps[-1])
+        result.append({
+            'name': name, 'start_units': first, 'end_units': last, 'sold': sold, 'days': days,
+            'speed': math.floor(sold / days + 0.5), 'ratio': round(sold / first, 4) if first > 0 else 0.0
+        })
+    return result
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+def test_totals_match_history(client, start, end):
+    client, db = client
+    series = units_by_timestamp(db)
+    timestamps = sorted({ts for values in series.values() for ts in values})
+    totals = [sum(values.get(ts, 0) for values in series.values()) for ts in timestamps]
+    expected = [
+        {
+            'date': ts[:10],
+            'timestamp': ts,
+            'available_units': totals[j],
+            'projects': sum(ts in values for values in series.values()),
+            'change': totals[j] - totals[j - 1] if j else None
+        }
+        for j, ts in enumerate(timestamps) if in_range(ts, start, end)
+    ]
+    assert fetch(client, '/api/analytics/totals', start, end) == expected
+
+
+@pytest.mark.parametrize('start,end', RANGES)
+def test_deltas_match_history(client, start, end):
+    client, db = client
+    assert fetch(client, '/api/analytics/deltas', start, end) == expected_deltas(db, start, end)
+
+
+@pytest.mark.parametrize('by', ['sold', 'speed', 'ratio'])
+@pytest.mark.parametrize('start,end', RANGES)
+def test_top_matches_history(client, start, end, by):
+    client, db = client
+    candidates = [item for item in expected_deltas(db, start, end) if item['sold'] > 0]
+    expected = sorted(candidates, key=lambda item: (-item[by], item['name']))[:2]
+    assert fetch(client, '/api/analytics/top', start, end, by=by, limit=2) == expected
+
+
+@pytest.mark.parametrize('name', [None, 'A', 'C'])
+@pytest.mark.parametrize('start,end', RANGES)
+def test_velocity_matches_history(client, start, end, name):
+    client, db = client
+    series = units_by_timestamp(db)
+    timestamps = sorted({ts for values in series.values() for ts in values})
+    if name is None:
+        units = {ts: sum(values.get(ts, 0) for values in series.values()) for ts in timestamps}
+    else:
+        units = series[name]
+    window = 2
+
+    expected = []
+    for j, ts in enumerate(timestamps):
+        if not in_range(ts, start, end):
+            continue
+        # 窗口起点：时间不早于 window 天前的第一次快照
+        cutoff = datetime.fromisoformat(ts) - timedelta(days=window)
+        base = next(b for b in timestamps if datetime.fromisoformat(b) >= cutoff)
+        velocity = None
+        if base != ts and base in units and ts in units:
+            velocity = round((units[base] - units[ts]) / elapsed_days(base, ts), 2)
+        expected.append({'date': ts[:10], 'available_units': units.get(ts), 'velocity': velocity})
+    assert fetch(client, '/api/analytics/velocity', start, end, name=name, window=window) == expected
+
+
+def test_velocity_unknown_property_is_404(client):
+    client, _ = client
+    response = client.get('/api/analytics/velocity?name=不存在')
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
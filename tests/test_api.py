@@ -0,0 +1,22 @@
+"""API：刷新进度事件流"""
+import threading
+
+
+def test_event_stream_is_capped_per_worker(api, monkeypatch):
+    monkeypatch.setattr(api, 'sse_slots', threading.BoundedSemaphore(1))
+    client = api.app.test_client()
+
+    # 没有正在运行的任务：发送当前状态后结束，关闭响应时释放名额
+    response = client.get('/api/refresh/events')
+    assert response.status_code == 200
+    assert 'event: status' in response.get_data(as_text=True)
+    response.close()
+
+    assert api.sse_slots.acquire(blocking=False)
+    try:
+        response = client.get('/api/refresh/events')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(int(api.SSE_MAX_DURATION))
+        assert response.get_json()['success'] is False
+    finally:
+        api.sse_slots.release()
@@ -0,0 +1,25 @@
+"""查询缓存：其他主机保存数据后按数据库中的代数清空"""
+from backend.cache import QueryCache
+
+
+def test_cache_follows_generation_source():
+    source = {'record_id': 1}
+    cache = QueryCache(generation_source=lambda: source['record_id'], sync_interval=0)
+    hit, _, generation = cache.get('records')
+    assert not hit
+    cache.set('records', 'records', [1], generation)
+    assert cache.get('records')[:2] == (True, [1])
+
+    # 另一台主机保存了新快照：本机没有失效过缓存，也没有共享的代数文件
+    source['record_id'] = 2
+    assert cache.get('records')[0] is False
+
+
+def test_generation_source_is_polled_at_most_once_per_interval():
+    calls = []
+    cache = QueryCache(generation_source=lambda: calls.append(1) or len(calls), sync_interval=3600)
+    generation = cache.current_generation()
+    for _ in range(5):
+        cache.get('records')
+    assert len(calls) == 1
+    assert cache.current_generation() == generation
@@ -0,0 +1,81 @@
+"""Database：按游标分页的各页拼接后与不分页的结果一致，保存数据后查询缓存失效"""
+import pytest
+
+from backend.database import Database, next_cursor
+from conftest import save_snapshot
+
+DAYS = ['2025-01-30', '2025-01-31', '2025-02-01', '2025-02-02', '2025-02-03']
+
+
+@pytest.fixture(params=['full', 'delta'])
+def db(tmp_path, request):
+    db = Database(backend='sqlite', db_path=str(tmp_path / 'properties.db'), details_mode=request.param)
+    for i, day in enumerate(DAYS):
+        # 同名楼盘（多个预售证）在同一时间有两行，部分天有日内采样
+        save_snapshot(db.storage, f'{day}T09:00:00', [('A', 10 - i), ('A', 3), ('B', i)])
+        if i % 2:
+            save_snapshot(db.storage, f'{day}T15:00:00', [('A', 9 - i), ('A', 3), ('B', i + 1)], append=True)
+    return db
+
+
+def collect(fetch, limit, **params):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = fetch(limit=limit, cursor=cursor, **params)
+        rows.extend(page)
+        pages += 1
+        cursor = next_cursor(page, limit, cursor)
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 7, 100])
+def test_property_history_pages_concatenate_to_full_history(db, limit):
+    full = db.get_property_history('A')
+    assert len(full) == 2 * 7  # 5 天 + 2 次日内采样，每次两行
+    rows, pages = collect(lambda **kw: db.get_property_history('A', **kw), limit)
+    assert rows == full
+    assert pages == len(full) // limit + 1
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_record_pages_respect_the_date_range(db, limit):
+    full = db.get_all_records(start='2025-01-31', end='2025-02-02')
+    assert [row['timestamp'][:10] for row in full] == ['2025-01-31', '2025-01-31', '2025-02-01', '2025-02-02', '2025-02-02']
+    rows, _ = collect(db.get_all_records, limit, start='2025-01-31', end='2025-02-02')
+    assert rows == full
+
+
+def test_save_invalidates_cached_history_and_property_list(tmp_path, monkeypatch):
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '64')
+    db = Database(backend='sqlite', db_path=str(tmp_path / 'properties.db'))
+    save_snapshot(db.storage, '2025-01-30T09:00:00', [('A', 10), ('B', 5)])
+    assert [row['available_units'] for row in db.get_property_history('A')] == [10]
+    assert db.get_property_list() == ['A', 'B']
+    assert db.get_property_history('A') is db.get_property_history('A')  # 已缓存
+
+    assert db.save_record(12, 3, {'properties': [
+        {'name': 'A', 'available_units': 7}, {'name': 'B', 'available_units': 4}, {'name': 'C', 'available_units': 1}
+    ]})
+    assert [row['available_units'] for row in db.get_property_history('A')] == [10, 7]
+    assert db.get_property_list() == ['A', 'B', 'C']
+
+
+def test_save_with_cache_disabled_still_invalidates_other_workers(tmp_path, monkeypatch):
+    path = str(tmp_path / 'properties.db')
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '64')
+    reader = Database(backend='sqlite', db_path=path)
+    monkeypatch.setenv('QUERY_CACHE_SIZE', '0')
+    writer = Database(backend='sqlite', db_path=path)
+    assert not writer.cache.enabled
+
+    save_snapshot(writer.storage, '2025-01-30T09:00:00', [('A', 10)])
+    assert [row['available_units'] for row in reader.get_property_history('A')] == [10]
+    assert reader.get_property_list() == ['A']
+
+    # 另一个 worker（关闭了缓存）保存数据后，读取方的缓存通过共享代数文件失效
+    assert writer.save_record(8, 2, {'properties': [
+        {'name': 'A', 'available_units': 6}, {'name': 'B', 'available_units': 2}
+    ]})
+    assert [row['available_units'] for row in reader.get_property_history('A')] == [10, 6]
+    assert reader.get_property_list() == ['A', 'B']
@@ -0,0 +1,59 @@
+"""delta 模式：变化记录展开后与 full 模式的全量明细一致"""
+import random
+from operator import itemgetter
+
+from backend.storage import SQLiteBackend, _compact_details, _expand_changes
+from conftest import save_snapshot
+
+
+def random_history(seed, days=30, names=12):
+    """每天一次快照：套数随机变化，楼盘随机消失/重新出现，部分楼盘同名出现多次"""
+    rng = random.Random(seed)
+    pool = [f'楼盘{i}' for i in range(names)]
+    history = []
+    for day in range(1, days + 1):
+        rows = []
+        for name in pool:
+            if rng.random() < 0.2:
+                continue
+            for _ in range(1 + (rng.random() < 0.15)):
+                rows.append((name, rng.choice([0, 1, 2, 5, 10])))
+        rng.shuffle(rows)
+        history.append((f'2025-01-{day:02d}T09:00:00', rows))
+    return history
+
+
+def full_rows(history):
+    rows = [{'property_name': name, 'timestamp': timestamp, 'available_units': units}
+            for timestamp, snapshot in history for name, units in snapshot]
+    return sorted(rows, key=itemgetter('property_name', 'timestamp'))
+
+
+def test_compact_then_expand_is_lossless():
+    for seed in range(5):
+        history = random_history(seed)
+        snapshots = [timestamp for timestamp, _ in history]
+        detail_rows = [{'timestamp': timestamp, 'property_name': name, 'available_units': units}
+                       for timestamp, snapshot in history for name, units in snapshot]
+        changes = sorted(_compact_details(snapshots, detail_rows), key=itemgetter('property_name', 'slot', 'timestamp'))
+        assert _expand_changes(changes, snapshots) == full_rows(history)
+
+
+def test_sqlite_modes_return_the_same_data(tmp_path):
+    history = random_history(7)
+    backends = {mode: SQLiteBackend(str(tmp_path / f'{mode}.db'), details_mode=mode) for mode in ('full', 'delta')}
+    stats = {mode: [] for mode in backends}
+    for mode, backend in backends.items():
+        for timestamp, rows in history:
+            stats[mode].append(save_snapshot(backend, timestamp, rows))
+        # 重新保存最后一天
+        timestamp, rows = history[-1]
+        stats[mode].append(save_snapshot(backend, timestamp.replace('09:00', '10:00'), rows[:-2]))
+
+    full, delta = backends['full'], backends['delta']
+    assert delta.select_details() == full.select_details()
+    assert delta.select_details(['楼盘3'], '2025-01-05', '2025-01-20') == full.select_details(['楼盘3'], '2025-01-05', '2025-01-20')
+    assert delta.select_latest_details() == full.select_latest_details()
+    assert delta.select_projects() == full.select_projects()
+    for full_stats, delta_stats in zip(stats['full'], stats['delta']):
+        assert (delta_stats['changed'], delta_stats['unchanged']) == (full_stats['changed'], full_stats['unchanged'])
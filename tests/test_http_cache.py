@@ -0,0 +1,90 @@
+"""HTTP 缓存：ETag / 304、Cache-Control 和 gzip 压缩"""
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from backend.http_cache import HttpCache
+
+BIG = [{'name': f'楼盘{i}', 'available_units': i} for i in range(200)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('HTTP_CACHE_MAX_AGE', '600')
+    monkeypatch.setenv('HTTP_COMPRESS_MIN_SIZE', '1024')
+    version = {'id': 7, 'timestamp': '2025-02-01T09:30:00'}
+    app = Flask(__name__)
+    cache = HttpCache(lambda: version)
+    cache.init_app(app)
+
+    @app.route('/big')
+    @cache.conditional
+    def big():
+        return jsonify({'success': True, 'data': BIG})
+
+    @app.route('/small')
+    @cache.conditional
+    def small():
+        return jsonify({'success': True, 'data': []})
+
+    client = app.test_client()
+    client.version = version
+    return client
+
+
+def test_200_carries_validators_and_cache_control(client):
+    response = client.get('/small')
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert etag.startswith('7-') and not weak
+    assert response.last_modified is not None
+    assert response.cache_control.public and response.cache_control.must_revalidate
+    assert 0 <= response.cache_control.max_age <= 600
+    assert 'Accept-Encoding' in response.vary
+    assert 'Content-Encoding' not in response.headers  # 小于 HTTP_COMPRESS_MIN_SIZE 不压缩
+
+
+def test_gzip_response_and_304_use_the_same_etag(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['data'] == BIG
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    revalidated = client.get('/big', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+    assert revalidated.headers['Cache-Control'] == response.headers['Cache-Control']
+
+
+def test_identity_response_and_304_use_the_same_etag(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    etag = response.headers['ETag']
+    assert not etag.endswith('-gzip"')
+
+    revalidated = client.get('/big', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_if_modified_since_only(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    revalidated = client.get('/big', headers={
+        'Accept-Encoding': 'gzip', 'If-Modified-Since': response.headers['Last-Modified']
+    })
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == response.headers['ETag']
+
+
+def test_new_snapshot_changes_the_etag(client):
+    etag = client.get('/big', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    client.version.update(id=8, timestamp='2025-02-02T09:30:00')
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag and response.headers['ETag'].startswith('"8-')
+    # 不同路径（含参数）的 ETag 不同
+    assert client.get('/big?limit=1').headers['ETag'] != client.get('/big').headers['ETag']
@@ -0,0 +1,267 @@
+"""刷新任务登记表：同一时间只有一个任务"""
+import threading
+
+import os
+from types import SimpleNamespace
+
+from backend.jobs import SQLiteJobRegistry, SupabaseJobRegistry, create_registry
+from backend.storage import SupabaseBackend
+
+
+def test_concurrent_starts_produce_one_job(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    # 每个线程一个登记表实例，相当于同一台主机上的不同进程
+    registries = [SQLiteJobRegistry(path) for _ in range(8)]
+    barrier = threading.Barrier(len(registries))
+    results = []
+
+    def submit(registry):
+        barrier.wait()
+        results.append(registry.start('manual'))
+
+    threads = [threading.Thread(target=submit, args=(registry,)) for registry in registries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({job['id'] for job, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    job = registries[0].latest()
+    assert job['status'] == 'running'
+    assert job['requests'] == len(registries)
+
+
+def test_enqueue_merges_into_queued_job(tmp_path):
+    registry = SQLiteJobRegistry(str(tmp_path / 'jobs.db'))
+    first, created = registry.enqueue('manual')
+    second, merged = registry.enqueue('scheduler')
+    assert created and not merged
+    assert second['id'] == first['id']
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    """PostgREST 表的替身：只实现登记表用到的过滤、排序和写操作"""
+
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.rows = db.tables[name]
+        self.filters = []
+        self.orders = []
+        self.count = None
+        self.write = None
+
+    def select(self, columns):
+        self.columns = None if columns == '*' else [column.strip() for column in columns.split(',')]
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row[column] >= value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def insert(self, values):
+        self.write = ('insert', values)
+        return self
+
+    def update(self, values):
+        self.write = ('update', values)
+        return self
+
+    def upsert(self, values):
+        self.write = ('upsert', values)
+        return self
+
+    def delete(self):
+        self.write = ('delete', None)
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            matched = [row for row in self.rows if all(f(row) for f in self.filters)]
+            if self.write is None:
+                for column, desc in reversed(self.orders):
+                    matched.sort(key=lambda row: row[column], reverse=desc)
+                if getattr(self, 'bounds', None):
+                    matched = matched[self.bounds[0]:self.bounds[1] + 1]
+                if self.count is not None:
+                    matched = matched[:self.count]
+                return FakeResult([
+                    dict(row) if self.columns is None else {column: row[column] for column in self.columns}
+                    for row in matched
+                ])
+            action, values = self.write
+            if action == 'insert':
+                row = dict(values, id=self.db.next_id(self.name))
+                self.rows.append(row)
+                return FakeResult([dict(row)])
+            if action == 'upsert':
+                self.rows[:] = [row for row in self.rows if row['owner'] != values['owner']]
+                self.rows.append(dict(values))
+                return FakeResult([dict(values)])
+            if action == 'update':
+                for row in matched:
+                    row.update(values)
+                return FakeResult([dict(row) for row in matched])
+            self.rows[:] = [row for row in self.rows if row not in matched]
+            return FakeResult(matched)
+
+
+class FakeRpc:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return FakeResult(self.data)
+
+
+class FakeSupabase:
+    """多个主机共用的 Supabase：表在内存中，登记表函数按 supabase_schema.sql 的逻辑在一把锁内执行"""
+
+    def __init__(self):
+        self.tables = {'refresh_jobs': [], 'refresh_events': [], 'refresh_workers': []}
+        self.ids = {}
+        self.lock = threading.RLock()
+
+    def next_id(self, name):
+        self.ids[name] = self.ids.get(name, 0) + 1
+        return self.ids[name]
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+    def rpc(self, function, params):
+        with self.lock:
+            return FakeRpc(getattr(self, function)(**params))
+
+    def expire_stale_refresh_job(self, p_now, p_clock, p_stale_after):
+        for job in self.tables['refresh_jobs']:
+            if job['status'] == 'running' and p_clock - job['heartbeat_at'] > p_stale_after:
+                job.update(status='failed', error=f"任务心跳超时（{job['owner']} 可能已退出）",
+                           current_step='任务已中断', end_time=p_now)
+                return {'expired': dict(job)}
+        return {'expired': None}
+
+    def submit_refresh_job(self, p_trigger, p_owner, p_run_now, p_keep_jobs, p_now, p_clock, p_stale_after):
+        expired = self.expire_stale_refresh_job(p_now, p_clock, p_stale_after)['expired']
+        active = sorted((job for job in self.tables['refresh_jobs'] if job['status'] in ('queued', 'running')),
+                        key=lambda job: job['id'])
+        if active:
+            job = active[0]
+            job['requests'] += 1
+            if p_run_now and job['status'] == 'queued':
+                job.update(status='running', owner=p_owner, current_step='初始化任务',
+                           start_time=p_now, heartbeat_at=p_clock)
+                return {'job': dict(job), 'created': True, 'expired': expired}
+            return {'job': dict(job), 'created': False, 'expired': expired}
+        job = {
+            'id': self.next_id('refresh_jobs'), 'trigger': p_trigger,
+            'status': 'running' if p_run_now else 'queued', 'owner': p_owner, 'requests': 1,
+            'current_step': '初始化任务' if p_run_now else '排队等待执行', 'error': None, 'result': None,
+            'created_at': p_now, 'start_time': p_now, 'end_time': None, 'heartbeat_at': p_clock
+        }
+        self.tables['refresh_jobs'].append(job)
+        return {'job': dict(job), 'created': True, 'expired': expired}
+
+    def claim_refresh_job(self, p_job_id, p_owner, p_now, p_clock, p_stale_after):
+        expired = self.expire_stale_refresh_job(p_now, p_clock, p_stale_after)['expired']
+        jobs = self.tables['refresh_jobs']
+        queued = [job for job in jobs if job['status'] == 'queued' and p_job_id in (None, job['id'])]
+        if any(job['status'] == 'running' for job in jobs) or not queued:
+            return {'job': None, 'expired': expired}
+        job = queued[0]
+        job.update(status='running', owner=p_owner, current_step='初始化任务', start_time=p_now, heartbeat_at=p_clock)
+        return {'job': dict(job), 'expired': expired}
+
+
+def supabase_registry(supabase, host):
+    """连接到共用 Supabase 的登记表，owner 模拟不同主机上的进程"""
+    storage = SupabaseBackend('http://supabase.invalid', 'key')
+    storage._client, storage._client_pid = supabase, os.getpid()
+    registry = SupabaseJobRegistry(storage)
+    registry.owner = f'{host}:1'
+    return registry
+
+
+def test_supabase_registry_merges_refreshes_from_any_host():
+    supabase = FakeSupabase()
+    web_a, web_b, worker = (supabase_registry(supabase, host) for host in ('web-a', 'web-b', 'worker'))
+
+    first, created = web_a.enqueue('manual')
+    second, merged = web_b.enqueue('manual')
+    assert created and not merged
+    assert second['id'] == first['id'] and second['requests'] == 2
+
+    job = worker.claim()
+    assert job['id'] == first['id'] and job['owner'] == 'worker:1'
+    # 运行期间其他主机的刷新（包括命令行）都合并到同一个任务
+    assert web_b.enqueue('scheduler') == (web_a.get(job['id']), False)
+    assert web_a.start('cli')[1] is False
+    assert worker.claim() is None
+
+    last_id = web_b.last_id
+    worker.set_step(job['id'], '保存数据')
+    worker.finish(job['id'], result={'projects': 3})
+    events = web_a.wait(last_id, timeout=0)
+    assert [event_type for _, event_type, _ in events] == ['step', 'done']
+    assert events[-1][2]['state'] == 'succeeded'
+    assert web_b.latest()['result'] == {'projects': 3}
+
+    # 上一个任务结束后才会新建任务
+    third, created = web_b.enqueue('manual')
+    assert created and third['id'] != first['id']
+
+
+def test_supabase_registry_expires_stale_jobs():
+    supabase = FakeSupabase()
+    crashed, web = supabase_registry(supabase, 'worker'), supabase_registry(supabase, 'web')
+    job, _ = crashed.start('cli')
+    supabase.tables['refresh_jobs'][0]['heartbeat_at'] -= 2 * web.stale_after
+
+    latest = web.latest()
+    assert latest['id'] == job['id'] and latest['status'] == 'failed'
+    assert 'worker:1' in latest['error']
+    assert web.since(0)[0][-1][1] == 'done'
+    assert web.start('manual')[1] is True
+
+
+def test_create_registry_follows_storage_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('JOBS_DB_PATH', str(tmp_path / 'jobs.db'))
+    monkeypatch.delenv('JOBS_BACKEND', raising=False)
+    sqlite_db = SimpleNamespace(storage=SimpleNamespace(name='sqlite'))
+    supabase_db = SimpleNamespace(storage=SimpleNamespace(name='supabase'),
+                                  supabase_url='http://supabase.invalid', supabase_key='key')
+
+    assert isinstance(create_registry(sqlite_db), SQLiteJobRegistry)
+    assert isinstance(create_registry(supabase_db), SupabaseJobRegistry)
+    monkeypatch.setenv('JOBS_BACKEND', 'sqlite')
+    assert isinstance(create_registry(supabase_db), SQLiteJobRegistry)
@@ -0,0 +1,25 @@
+"""Prometheus 指标：后台 worker 与 gunicorn 使用同一个多进程目录"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import project_root
+
+pytest.importorskip('prometheus_client')
+
+
+@pytest.mark.parametrize('module', ['backend.worker', 'backend.scheduler'])
+def test_worker_writes_metrics_to_the_shared_directory(module):
+    env = {key: value for key, value in os.environ.items() if key != 'PROMETHEUS_MULTIPROC_DIR'}
+    code = (
+        f'import os, {module}\n'
+        'from prometheus_client import values\n'
+        "print(os.environ['PROMETHEUS_MULTIPROC_DIR'])\n"
+        "print(values.ValueClass.__qualname__)\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], cwd=project_root, env=env,
+                            capture_output=True, text=True, check=True).stdout.splitlines()
+    assert output[-2] == os.path.join(project_root, 'data', 'prometheus')
+    assert output[-1].startswith('MultiProcessValue')
@@ -0,0 +1,88 @@
+"""静态数据发布：新版本写完后才切换清单，旧版本按 PUBLISH_KEEP 清理，读接口直接返回已发布的文件"""
+import gzip
+import json
+import os
+
+import pytest
+
+from backend.database import Database
+from backend.publish import MANIFEST_NAME, SnapshotPublisher
+from conftest import save_snapshot
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(backend='sqlite', db_path=str(tmp_path / 'properties.db'))
+    save_snapshot(db.storage, '2025-02-01T09:00:00', [('A', 10), ('B', 5)])
+    return db
+
+
+def versions(root):
+    return sorted(entry for entry in os.listdir(root) if entry.startswith('v'))
+
+
+def test_publish_switches_manifest_after_writing_and_prunes(db, tmp_path):
+    root = tmp_path / 'public'
+    publisher = SnapshotPublisher(root=str(root), keep=1)
+    first = publisher.publish(db)
+    assert first and publisher.manifest()['version'] == first['version']
+
+    # 写入新版本期间，清单仍指向旧版本，旧版本的文件完整可读
+    seen = []
+    write = publisher._write
+
+    def checked_write(directory, filename, data):
+        current = json.loads((root / MANIFEST_NAME).read_text())
+        seen.append(current['version'])
+        assert os.path.exists(publisher.artifact_path('files', '/records'))
+        write(directory, filename, data)
+
+    publisher._write = checked_write
+    save_snapshot(db.storage, '2025-02-02T09:00:00', [('A', 8), ('B', 5), ('C', 2)])
+    db.cache.clear()  # save_snapshot 直接写存储，不经过 save_record 的缓存失效
+    second = publisher.publish(db)
+    publisher._write = write
+    assert set(seen) == {first['version']}
+    assert publisher.manifest()['version'] == second['version'] != first['version']
+    assert second['record_id'] == db.get_latest_record()['id']
+
+    with open(publisher.artifact_path('files', '/records'), 'rb') as f:
+        assert json.loads(f.read())['data'] == db.get_all_records()
+    with open(publisher.artifact_path('history', 'C') + '.gz', 'rb') as f:
+        assert json.loads(gzip.decompress(f.read()))['data'] == db.get_property_history('C')
+
+    # keep=1：保留当前版本和一个旧版本，没有残留的临时目录
+    assert versions(root) == sorted([first['version'], second['version']])
+    third = publisher.publish(db)
+    assert versions(root) == sorted([second['version'], third['version']])
+    assert not [entry for entry in os.listdir(root) if entry.startswith('.')]
+
+
+def test_routes_serve_published_files_without_query_parameters(api, db, tmp_path, monkeypatch):
+    publisher = SnapshotPublisher(root=str(tmp_path / 'public'))
+    monkeypatch.setattr(api, 'db', db)
+    monkeypatch.setattr(api, 'publisher', publisher)
+    client = api.app.test_client()
+    assert publisher.publish(db)
+
+    def published(section, key, suffix=''):
+        with open(publisher.artifact_path(section, key) + suffix, 'rb') as f:
+            return f.read()
+
+    assert client.get('/api/records').data == published('files', '/records')
+    assert client.get('/api/properties').data == published('files', '/properties')
+    assert client.get('/api/property/A').data == published('history', 'A')
+    response = client.get('/api/records', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.data == published('files', '/records', '.gz')
+    assert response.headers['ETag'].endswith('-gzip"')
+
+    # 带参数的请求查询数据库
+    paged = client.get('/api/records?limit=1').get_json()
+    assert paged['data'] == db.get_all_records()[:1] and 'next_cursor' in paged
+
+    # 撤下后回到数据库查询，结果相同
+    records = json.loads(published('files', '/records'))
+    publisher.unpublish()
+    assert publisher.artifact_path('files', '/records') is None
+    assert client.get('/api/records').get_json() == records
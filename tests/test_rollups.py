@@ -0,0 +1,48 @@
+"""历史曲线汇总：增量维护的 Rollup 与重新计算的结果一致"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from backend.analytics import _Matrix
+from backend.rollups import Rollup, lttb
+
+FIELDS = ('labels', 'starts', 'last', 'minimum', 'maximum', 'delta', 'carry', 'count', 'last_column')
+
+
+def assert_same_rollup(actual: Rollup, expected: Rollup):
+    for field in FIELDS:
+        np.testing.assert_array_equal(getattr(actual, field), getattr(expected, field), err_msg=field)
+
+
+def snapshots(seed, days=75):
+    """跨越多个周、月边界的快照：有新楼盘、消失的楼盘，部分天同一天保存两次"""
+    rng = random.Random(seed)
+    start = date(2025, 1, 27)
+    for day in range(days):
+        names = [f'楼盘{i}' for i in range(3 + day // 10) if rng.random() < 0.85]
+        rows = [{'property_name': name, 'available_units': rng.randint(0, 30)} for name in names]
+        timestamp = f'{start + timedelta(days=day)}T09:00:00'
+        yield timestamp, rows
+        if rng.random() < 0.2:
+            yield timestamp.replace('09:00', '15:00'), rows[:-1]
+
+
+def test_extend_matches_build():
+    for seed in range(3):
+        history = list(snapshots(seed))
+        timestamp, rows = history[0]
+        matrix = _Matrix.from_rows([dict(row, timestamp=timestamp) for row in rows])
+        for timestamp, rows in history[1:]:
+            matrix = matrix.with_snapshot(timestamp, rows)
+            for resolution, rollup in matrix.rollups.items():
+                assert_same_rollup(rollup, Rollup.build(matrix.units, matrix.dates, resolution))
+
+
+def test_lttb_keeps_endpoints_and_limits_points():
+    x = np.arange(500, dtype=np.float64)
+    y = np.sin(x / 20)
+    selected = lttb(x, y, 50)
+    assert len(selected) == 50
+    assert selected[0] == 0 and selected[-1] == 499
+    assert (np.diff(selected) > 0).all()
@@ -0,0 +1,32 @@
+"""采样计划：默认每天一次，日内加密采样需要开启"""
+from datetime import datetime
+
+from backend.sampling import SamplingPlan
+
+
+def job(job_id, status, start, end, unchanged=False):
+    return {'id': job_id, 'status': status, 'start_time': start, 'end_time': end,
+            'result': {'unchanged': unchanged} if status == 'succeeded' else None}
+
+
+HISTORY = [job(1, 'succeeded', '2025-03-01T09:01:00', '2025-03-01T09:03:00')]
+NOW = datetime(2025, 3, 1, 10, 0)
+
+
+def test_default_plan_waits_for_the_next_daily_run():
+    due, reason = SamplingPlan(refresh_time='09:00', jitter=0, intraday=False).next_run(HISTORY, NOW)
+    assert due == datetime(2025, 3, 2, 9, 0)
+    assert reason == '每日定时抓取'
+
+
+def test_intraday_plan_samples_after_a_change():
+    plan = SamplingPlan(refresh_time='09:00', min_interval=3 * 3600, jitter=0, intraday=True)
+    due, _ = plan.next_run(HISTORY, NOW)
+    assert due == datetime(2025, 3, 1, 12, 3)
+
+
+def test_failed_daily_run_is_retried_with_backoff():
+    history = [job(2, 'failed', '2025-03-02T09:00:00', '2025-03-02T09:01:00')] + HISTORY
+    plan = SamplingPlan(refresh_time='09:00', min_interval=3 * 3600, jitter=0, intraday=False)
+    due, _ = plan.next_run(history, datetime(2025, 3, 2, 9, 30))
+    assert due == datetime(2025, 3, 2, 12, 1)
@@ -0,0 +1,141 @@
+"""抓取程序：正文未变的页沿用上次的解析结果，缺页时整次抓取失败，两种 HTML 解析方式结果一致"""
+import json
+
+import pytest
+import requests
+from bs4 import BeautifulSoup
+
+from backend.scraper import PropertyScraper
+
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.status_code = 200
+        self.content = body
+        self.text = body.decode('utf-8')
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeSession:
+    """不支持条件请求的服务器：总是返回 200 和 pages[start] 的正文"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        return FakeResponse(json.dumps(self.pages[params['start']]).encode('utf-8'))
+
+
+class FailingSession(FakeSession):
+    """failing 中的页总是连接失败"""
+
+    def __init__(self, pages, failing):
+        super().__init__(pages)
+        self.failing = failing
+        self.attempts = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.attempts.append(params['start'])
+        if params['start'] in self.failing:
+            raise requests.ConnectionError(f"第 {params['start']} 页连接失败")
+        return super().get(url, params, headers, timeout)
+
+
+def json_page(*items, total=None):
+    page = {'data': [{'projectName': name, 'availableUnits': units} for name, units in items]}
+    if total is not None:
+        page['total'] = total
+    return page
+
+
+def test_unchanged_page_body_skips_parsing(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCRAPER_STATE_PATH', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('SCRAPER_PAGE_SIZE', '2')
+    pages = {1: json_page(('华发城市之心', 10), ('万科金域国际', 5)), 2: json_page(('保利天悦', 3))}
+
+    scraper = PropertyScraper(base_url='http://replay.invalid/')
+    scraper._session = FakeSession(pages)
+    first = scraper.fetch_all_properties()
+    scraper.commit_state(first)
+
+    pages[2] = json_page(('保利天悦', 2))
+    scraper = PropertyScraper(base_url='http://replay.invalid/')
+    scraper._session = FakeSession(pages)
+    parsed = []
+    original = scraper.parse_properties
+    monkeypatch.setattr(scraper, 'parse_properties', lambda data: parsed.append(data) or original(data))
+    second = scraper.fetch_all_properties()
+
+    # 第 1 页正文未变，只重新解析第 2 页
+    assert len(parsed) == 1
+    assert [(p['name'], p['available_units']) for p in second['properties']] == [
+        ('华发城市之心', 10), ('万科金域国际', 5), ('保利天悦', 2)
+    ]
+    assert second['content_hash'] != first['content_hash']
+
+
+@pytest.mark.parametrize('total', [5, None], ids=['known-total', 'unknown-total'])
+def test_failed_page_fails_the_whole_fetch(tmp_path, monkeypatch, total):
+    monkeypatch.setenv('SCRAPER_STATE_PATH', str(tmp_path / 'state.json'))
+    monkeypatch.setenv('SCRAPER_PAGE_SIZE', '2')
+    monkeypatch.setenv('SCRAPER_MAX_RETRIES', '1')
+    monkeypatch.setenv('SCRAPER_BACKOFF_BASE', '0')
+    pages = {
+        1: json_page(('华发城市之心', 10), ('万科金域国际', 5), total=total),
+        2: json_page(('保利天悦', 3), ('格力海岸', 7)),
+        3: json_page(('中海银海湾', 1)),
+    }
+
+    scraper = PropertyScraper(base_url='http://replay.invalid/')
+    scraper._session = FailingSession(pages, failing={2})
+    # 缺少第 2 页的快照不完整，不能当作最新数据保存（delta 模式会把缺失的楼盘记为消失）
+    assert scraper.fetch_all_properties() is None
+    assert scraper.session.attempts.count(2) == 2  # 重试一次后放弃
+
+
+def house(name, info, extra=''):
+    return (f'<div class="house-info{extra}"><a class="overflow" href="#">{name}</a>'
+            f'<div class="house-info-main">{info}</div></div>')
+
+
+HTML_CASES = {
+    'plain': house('华发城市之心', '<table><tr><td>待售：12</td></tr></table>'),
+    'nested-tags': house('<span>万科<b>金域</b></span>国际', '<table><tr><td>待<em>售</em>：<strong>8</strong></td></tr></table>'),
+    'nested-containers': ('<div class="house-info"><a class="overflow">外层</a>'
+                          + house('内层', '待售：3')
+                          + '<div class="house-info-main">待售：4</div></div>'),
+    'entities': house('保利&amp;天悦&nbsp;&#x4E00;期&#169;&bogus;', '待售&#65306; 5 &lt;b&gt;'),
+    'br-and-whitespace': house('\n  格力 <br> 海岸 \t', '\n<br/>待售\n  :\r\n  <br>\t 6  \n\n'),
+    'missing-name': '<div class="house-info"><div class="house-info-main">待售：7</div></div>',
+    'missing-info': '<div class="house-info"><a class="overflow">中海银海湾</a></div>',
+    'empty-name': house('', '待售：2'),
+    'extra-classes': house('时代香海彼岸', '待售：9', extra=' card') + '<div class="house-info-mainx">待售：1</div>',
+    'script-and-comment': house('招商<!-- 注释 -->臻园<script>var x = "待售：99";</script>', '<style>td{}</style>待售：<![CDATA[10]]>'),
+    'pre-whitespace': house('越秀星汇', '<pre>  </pre>待售：11'),
+    'unclosed-tags': ('<div class="house-info"><a class="overflow">华润<b>置地 <div class="house-info-main">'
+                      '<table><tr><td>待售：13<td>已售：2</table>'),
+    'stray-end-tags': '</a></div>' + house('金地</span>艺境', '待售：14</p></i>') + '</div></div>',
+    'self-closing': '<div class="house-info"/><a class="overflow">自闭合</a>' + house('仁恒滨海', '待售：15'),
+    'duplicate-class-attr': ('<div class="other" class="house-info"><a class="overflow">重复属性</a>'
+                             '<div class="house-info-main">待售：16</div></div>'),
+    'invalid-names': house('20230040466', '待售：1') + house('B区地下室（车位分割）', '待售：2'),
+    'truncated': house('珠江花城', '待售：17') + '<div class="house-info"><a class="overflow">截断的楼',
+}
+
+
+@pytest.mark.parametrize('html', HTML_CASES.values(), ids=HTML_CASES.keys())
+def test_fast_and_bs4_html_parsers_agree(html):
+    scraper = PropertyScraper(base_url='http://replay.invalid/')
+    page = f'<html><body><div class="list">{html}</div></body></html>'
+    fast = {'html': page}
+    bs4 = {'html': page, 'soup': BeautifulSoup(page, 'html.parser')}
+
+    assert scraper._house_blocks(fast) == scraper._house_blocks(bs4)
+    assert scraper._count_raw_items(fast) == scraper._count_raw_items(bs4)
+    assert scraper.parse_properties(fast) == scraper.parse_properties(bs4)
@@ -0,0 +1,34 @@
+"""存储引擎：full / delta 两种明细存储方式的行为一致"""
+from conftest import save_snapshot
+
+
+def test_replacing_a_day_rolls_back_project_dimension(storage):
+    save_snapshot(storage, '2025-01-01T08:00:00', [('A', 10), ('B', 5), ('C', 7)])
+    save_snapshot(storage, '2025-01-02T08:00:00', [('A', 9), ('B', 4), ('D', 1)])
+    # 重新保存第 2 天：B 回到第 1 天的状态，只出现在被替换快照中的 D 被删除
+    save_snapshot(storage, '2025-01-02T09:00:00', [('A', 8)])
+
+    projects = {row['property_name']: row for row in storage.select_projects()}
+    assert sorted(projects) == ['A', 'B', 'C']
+    assert projects['A']['last_seen'] == '2025-01-02T09:00:00'
+    assert projects['A']['latest_units'] == 8
+    assert projects['B']['last_seen'] == '2025-01-01T08:00:00'
+    assert projects['B']['latest_units'] == 5
+    assert projects['C']['first_seen'] == projects['C']['last_seen'] == '2025-01-01T08:00:00'
+
+
+def test_resaving_a_day_counts_changes_against_the_previous_snapshot(storage):
+    save_snapshot(storage, '2025-01-01T08:00:00', [('A', 10), ('B', 5)])
+    stats = save_snapshot(storage, '2025-01-02T08:00:00', [('A', 10), ('B', 4), ('C', 1)])
+    assert (stats['changed'], stats['unchanged'], stats['removed']) == (2, 1, 0)
+
+    # 同一天重复保存相同数据：与删除后剩余的上一次快照（第 1 天）比较
+    stats = save_snapshot(storage, '2025-01-02T09:00:00', [('A', 10), ('B', 4), ('C', 1)])
+    assert (stats['changed'], stats['unchanged']) == (2, 1)
+    assert stats['removed'] > 0
+
+
+def test_duplicate_names_are_compared_per_slot(storage):
+    save_snapshot(storage, '2025-01-01T08:00:00', [('A', 3), ('A', 7)])
+    stats = save_snapshot(storage, '2025-01-02T08:00:00', [('A', 7), ('A', 7)])
+    assert (stats['changed'], stats['unchanged']) == (1, 1)
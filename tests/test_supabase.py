@@ -0,0 +1,55 @@
+"""Supabase 存储：用内存中的 PostgREST 替身验证分页"""
+import os
+
+from backend.storage import SupabaseBackend
+
+MAX_ROWS = 1000  # PostgREST 单次请求最多返回的行数
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """只实现 select / order / range / execute，range 之外每次最多返回 MAX_ROWS 行"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.orders = []
+        self.bounds = None
+
+    def select(self, columns):
+        self.columns = [column.strip() for column in columns.split(',')]
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append(column)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda row: tuple(row[column] for column in self.orders))
+        start, end = self.bounds or (0, len(rows) - 1)
+        rows = rows[start:min(end + 1, start + MAX_ROWS)]
+        return FakeResult([{column: row[column] for column in self.columns} for row in rows])
+
+
+class FakeClient:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return FakeQuery(self.tables[name])
+
+
+def test_property_names_are_paged_past_the_row_limit():
+    names = [f'楼盘{i:04d}' for i in range(1500)]
+    rows = [{'id': i, 'property_name': names[i % len(names)]} for i in range(3 * len(names))]
+    backend = SupabaseBackend('http://supabase.invalid', 'key')
+    backend._client, backend._client_pid = FakeClient({'property_details': rows}), os.getpid()
+
+    assert sorted(backend.select_property_names()) == names